@@ -0,0 +1,161 @@
+'''
+Benchmark for the conversion of Trac wiki markup to Github Markdown.
+
+Measures how long a fresh Python takes to import the converter, then
+converts the descriptions and comments of the test CSV files (or of the CSV
+files given on the command line) several times and reports the time spent.
+A second workload consists of escaped references and bracketed links, which
+the regular expressions for Github leave to the link and escape emitters of
+the formatter::
+
+  $ python test/benchmark_conversion.py
+  $ python test/benchmark_conversion.py --repeat 50 tickets.csv comments.csv
+'''
+# Copyright (c) 2012, Thomas Aglassinger
+# All rights reserved.
+#
+# Redistribution and use in source and binary forms, with or without
+# modification, are permitted provided that the following conditions are met:
+#
+# * Redistributions of source code must retain the above copyright notice, this
+#   list of conditions and the following disclaimer.
+# * Redistributions in binary form must reproduce the above copyright notice,
+#   this list of conditions and the following disclaimer in the documentation
+#   and/or other materials provided with the distribution.
+# * Neither the name of Thomas Aglassinger nor the names of its contributors
+#   may be used to endorse or promote products derived from this software
+#   without specific prior written permission.
+#
+# THIS SOFTWARE IS PROVIDED BY THE COPYRIGHT HOLDERS AND CONTRIBUTORS 'AS IS'
+# AND ANY EXPRESS OR IMPLIED WARRANTIES, INCLUDING, BUT NOT LIMITED TO, THE
+# IMPLIED WARRANTIES OF MERCHANTABILITY AND FITNESS FOR A PARTICULAR PURPOSE
+# ARE DISCLAIMED. IN NO EVENT SHALL THE COPYRIGHT OWNER OR CONTRIBUTORS BE
+# LIABLE FOR ANY DIRECT, INDIRECT, INCIDENTAL, SPECIAL, EXEMPLARY, OR
+# CONSEQUENTIAL DAMAGES (INCLUDING, BUT NOT LIMITED TO, PROCUREMENT OF
+# SUBSTITUTE GOODS OR SERVICES; LOSS OF USE, DATA, OR PROFITS; OR BUSINESS
+# INTERRUPTION) HOWEVER CAUSED AND ON ANY THEORY OF LIABILITY, WHETHER IN
+# CONTRACT, STRICT LIABILITY, OR TORT (INCLUDING NEGLIGENCE OR OTHERWISE)
+# ARISING IN ANY WAY OUT OF THE USE OF THIS SOFTWARE, EVEN IF ADVISED OF THE
+# POSSIBILITY OF SUCH DAMAGE.
+import csv
+import optparse
+import os.path
+import subprocess
+import sys
+import time
+
+_TEST_FOLDER = os.path.dirname(os.path.abspath(__file__))
+_PROJECT_FOLDER = os.path.dirname(_TEST_FOLDER)
+sys.path.insert(0, os.path.join(_PROJECT_FOLDER, 'tracformatter'))
+
+from trac.wiki.formatter import trac_to_github
+
+_DEFAULT_CSV_PATHS = [
+    os.path.join(_TEST_FOLDER, 'test_tickets.csv'),
+    os.path.join(_TEST_FOLDER, 'test_comments.csv'),
+    os.path.join(_TEST_FOLDER, 'cutplace_tickets.csv'),
+    os.path.join(_TEST_FOLDER, 'cutplace_comments.csv'),
+]
+
+# Wiki markup exercising headings, links, inline code and code blocks.
+_SAMPLE_TEXT = u"""= Heading with ''italic'' text =
+Some '''bold''' text referring to #12, r123 and ticket:3.
+See [http://example.com/some/page?a=1 the example], [wiki:SomePage a page] and <wiki:Other>.
+Inline `code` and {{{more code}}}, escaped !#5 and !<b>.
+{{{
+#!python
+print 'hello'
+}}}
+== Sub heading ==
+{{{
+plain text
+}}}
+"""
+
+# Wiki markup reaching the link and escape emitters of the formatter.
+_EMITTER_TEXT = u"\n".join(
+    u"Escaped !#%d, !r%d and !ftp://host/file%d.txt next to [/browser/trunk/src/f%d.c file %d]. "
+    u"Also [//example.com/docs/%d docs %d] and [#anchor%d section %d]." % ((i,) * 9)
+    for i in xrange(20))
+
+
+def _textsFromCsv(csvPath):
+    '''
+    Wiki texts in the ``description`` column (tickets) or ``newvalue`` column (comments) of ``csvPath``.
+    '''
+    result = []
+    with open(csvPath, 'rb') as csvFile:
+        reader = csv.reader(csvFile)
+        header = reader.next()
+        if 'description' in header:
+            textIndex = header.index('description')
+        elif 'newvalue' in header:
+            textIndex = header.index('newvalue')
+        else:
+            textIndex = len(header) - 1
+        for row in reader:
+            if len(row) > textIndex:
+                result.append(row[textIndex].decode('utf-8'))
+    return result
+
+
+def importSeconds(repeat=5):
+    '''
+    Fastest time in seconds a fresh Python interpreter needed to import the converter out of ``repeat``
+    attempts.
+    '''
+    script = 'import time; startTime = time.time(); import trac.wiki.formatter; print time.time() - startTime'
+    environment = dict(os.environ)
+    environment['PYTHONPATH'] = os.path.join(_PROJECT_FOLDER, 'tracformatter')
+    result = None
+    for _ in xrange(repeat):
+        seconds = float(subprocess.check_output([sys.executable, '-c', script], env=environment))
+        if (result is None) or (seconds < result):
+            result = seconds
+    return result
+
+
+def benchmark(texts, repeat, rounds=5):
+    '''
+    Seconds needed to convert all ``texts`` ``repeat`` times in the fastest of ``rounds`` attempts.
+    '''
+    result = None
+    for _ in xrange(rounds):
+        startTime = time.time()
+        for _ in xrange(repeat):
+            for text in texts:
+                trac_to_github(text, None, 1)
+        seconds = time.time() - startTime
+        if (result is None) or (seconds < result):
+            result = seconds
+    return result
+
+
+def _report(name, texts, repeat, rounds):
+    duration = benchmark(texts, repeat, rounds)
+    conversionCount = len(texts) * repeat
+    print '%s: converted %d texts %d times in %.3f seconds (%.1f microseconds per text)' % (
+            name, len(texts), repeat, duration, 1000000.0 * duration / conversionCount)
+
+
+def main(argv=None):
+    if argv is None:
+        argv = sys.argv
+    parser = optparse.OptionParser(usage='%prog [options] [CSVFILE ...]')
+    parser.add_option('-r', '--repeat', default=20, type='int',
+            help='number of times to convert each text (default: %default)')
+    parser.add_option('--rounds', default=5, type='int',
+            help='number of attempts, of which the fastest is reported (default: %default)')
+    options, csvPaths = parser.parse_args(argv[1:])
+    if not csvPaths:
+        csvPaths = _DEFAULT_CSV_PATHS
+    print 'imported converter in %.3f seconds' % importSeconds()
+    texts = [_SAMPLE_TEXT]
+    for csvPath in csvPaths:
+        texts.extend(_textsFromCsv(csvPath))
+    _report('tickets', texts, options.repeat, options.rounds)
+    _report('links and escapes', [_EMITTER_TEXT], options.repeat, options.rounds)
+
+
+if __name__ == '__main__':
+    main()
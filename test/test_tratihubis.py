@@ -27,10 +27,19 @@ Tests for tratihubis.
 # CONTRACT, STRICT LIABILITY, OR TORT (INCLUDING NEGLIGENCE OR OTHERWISE)
 # ARISING IN ANY WAY OUT OF THE USE OF THIS SOFTWARE, EVEN IF ADVISED OF THE
 # POSSIBILITY OF SUCH DAMAGE.
+import array
+import binascii
 import ConfigParser
+import csv
 import github
+import hashlib
 import logging
 import os.path
+import shutil
+import struct
+import subprocess
+import sys
+import tempfile
 import unittest
 
 import tratihubis
@@ -106,6 +115,1391 @@ class UserMapTest(_HubbedTest):
                 self.hub, 'hugo: sepp, hugo: resi')
 
 
+class BodySplitTest(unittest.TestCase):
+    def _assertPartsFit(self, parts, limit):
+        for part in parts:
+            self.assertTrue(len(part) <= limit, u'part must have at most %d characters: %r' % (limit, part))
+
+    def _fenceCount(self, part):
+        return len([line for line in part.splitlines() if line.startswith(u'```')])
+
+    def testCanKeepShortBody(self):
+        self.assertEqual(tratihubis._splitBody(1, u'some text\n'), [u'some text\n'])
+
+    def testCanKeepEmptyBody(self):
+        self.assertEqual(tratihubis._splitBody(1, u''), [u''])
+
+    def testCanSplitAtParagraphs(self):
+        paragraph = u'x' * 40 + u'\n\n'
+        parts = tratihubis._splitBody(7, paragraph * 10, 200)
+        self.assertTrue(len(parts) > 1)
+        self._assertPartsFit(parts, 200)
+        self.assertEqual(parts[0], paragraph * 4)
+        self.assertTrue(parts[1].startswith(u'_Continued from trac ticket 7 (part 2)._'))
+        self.assertEqual(u''.join(parts).count(u'x'), 400)
+
+    def testCanSplitLongFence(self):
+        text = u'before\n```python\n' + u'print 1\n' * 60 + u'```\nafter\n'
+        parts = tratihubis._splitBody(1, text, 200)
+        self._assertPartsFit(parts, 200)
+        for part in parts:
+            self.assertEqual(self._fenceCount(part) % 2, 0, u'part must not end inside fence: %r' % part)
+        for part in parts[1:-1]:
+            self.assertTrue(u'```python\n' in part)
+        self.assertEqual(u''.join(parts).count(u'print 1'), 60)
+
+    def testCanMoveFenceToNextPart(self):
+        text = u'y' * 190 + u'\n```\ncode\n```\n'
+        parts = tratihubis._splitBody(1, text, 200)
+        self.assertEqual(len(parts), 2)
+        self.assertEqual(parts[0], u'y' * 190 + u'\n')
+        self.assertTrue(parts[1].endswith(u'```\ncode\n```\n'))
+
+    def testIgnoresInlineCodeAsFence(self):
+        parts = tratihubis._splitBody(1, u'```inline``` code\n' + u'z' * 10 + u'\n', 200)
+        self.assertEqual(parts, [u'```inline``` code\n' + u'z' * 10 + u'\n'])
+
+    def testCanSplitLongLine(self):
+        parts = tratihubis._splitBody(1, u'w' * 500, 200)
+        self._assertPartsFit(parts, 200)
+        self.assertEqual(u''.join(parts).count(u'w'), 500)
+
+
+class IssueRegistryTest(unittest.TestCase):
+    def testCanAddIssues(self):
+        registry = tratihubis._IssueRegistry()
+        registry.add(1, u'first', 'open')
+        registry.add(2, u'second', 'closed', 3)
+        self.assertEqual(len(registry), 2)
+        self.assertEqual(registry.title(2), u'second')
+        self.assertEqual(registry.state(1), 'open')
+        self.assertEqual(registry.state(2), 'closed')
+        self.assertEqual(registry.comments(2), 3)
+
+    def testCanAddIssuesWithGaps(self):
+        registry = tratihubis._IssueRegistry()
+        registry.add(5, u'fifth', 'open')
+        self.assertEqual(len(registry), 1)
+        self.assertTrue(5 in registry)
+        self.assertFalse(4 in registry)
+        self.assertFalse(6 in registry)
+        self.assertFalse(0 in registry)
+
+    def testCanReplaceIssue(self):
+        registry = tratihubis._IssueRegistry()
+        registry.add(1, u'old', 'open', 2)
+        registry.add(1, u'new', 'closed')
+        self.assertEqual(len(registry), 1)
+        self.assertEqual(registry.title(1), u'new')
+        self.assertEqual(registry.comments(1), 0)
+
+    def testCanUpdateStateAndComments(self):
+        registry = tratihubis._IssueRegistry()
+        registry.add(1, u'first', 'open')
+        registry.addComments(1)
+        registry.addComments(1, 2)
+        registry.close(1)
+        self.assertEqual(registry.comments(1), 3)
+        self.assertEqual(registry.state(1), 'closed')
+        self.assertTrue(registry.memorySize() > 0)
+
+
+_TICKETS_HEADER = ['id', 'type', 'owner', 'reporter', 'milestone', 'status', 'resolution', 'summary',
+        'description', 'PosixTime', 'ModifiedTime', 'freshdesk', 'keywords']
+
+
+def _createTicketsCsv(rows):
+    '''
+    Path to a temporary tickets CSV with ``rows`` below the header, which the caller has to remove.
+    '''
+    ticketsCsvFile, result = tempfile.mkstemp(suffix='.csv')
+    with os.fdopen(ticketsCsvFile, 'wb') as ticketsCsvFile:
+        writer = csv.writer(ticketsCsvFile)
+        writer.writerow(_TICKETS_HEADER)
+        for row in rows:
+            writer.writerow(row)
+    return result
+
+
+class TicketTableTest(unittest.TestCase):
+    def setUp(self):
+        self.ticketsCsvPath = _createTicketsCsv([
+            ['1', 'defect', ' johndoe ', 'roskakori', '1.0', 'closed', 'fixed', 'first',
+                    "some '''bold''' text", '1336000000', '1336100000', '', 'ui'],
+            ['3', 'defect', 'johndoe', 'roskakori', '1.0', 'new', '', 'third',
+                    'plain text', '1336200000', '', '17', ''],
+        ])
+
+    def tearDown(self):
+        os.remove(self.ticketsCsvPath)
+
+    def testCanReadColumns(self):
+        table = tratihubis._TicketTable(self.ticketsCsvPath)
+        self.assertEqual(len(table), 2)
+        self.assertEqual(list(table.ids), [1, 3])
+        self.assertEqual(table.column('owner'), [u'johndoe', u'johndoe'])
+        self.assertTrue(table.column('owner')[0] is table.column('owner')[1])
+        self.assertEqual(list(table.column('modifiedtime')), [1336100000, 0])
+        self.assertEqual(table.distinctValues('status'), set([u'closed', u'new']))
+
+    def testCanUseRowsLikeTicketMaps(self):
+        table = tratihubis._TicketTable(self.ticketsCsvPath)
+        for ticketId, row in tratihubis._ticketsCsvRows(self.ticketsCsvPath):
+            ticketMap = tratihubis._ticketMapFromRow(ticketId, row)
+            ticketRow = table.row(ticketId)
+            self.assertEqual(sorted(ticketRow.keys()), sorted(ticketMap.keys()))
+            for key in ticketMap.keys():
+                self.assertEqual(ticketRow[key], ticketMap[key])
+            self.assertEqual(tratihubis._issueBody(ticketRow, None), tratihubis._issueBody(ticketMap, None))
+
+    def testCanYieldPlaceholders(self):
+        table = tratihubis._TicketTable(self.ticketsCsvPath)
+        registry = tratihubis._IssueRegistry()
+        tickets = []
+        for ticket in tratihubis._tracTicketMaps(self.ticketsCsvPath, registry, table):
+            registry.add(ticket['id'], ticket['summary'], 'open')
+            tickets.append(ticket)
+        self.assertEqual([ticket['id'] for ticket in tickets], [1, 2, 3])
+        self.assertEqual(tickets[1]['type'], tratihubis.DUMMYTYPE)
+        self.assertEqual(tickets[1]['summary'], tratihubis.PLACEHOLDERTICKET['summary'])
+
+
+class CsvIndexTest(unittest.TestCase):
+    def setUp(self):
+        self.ticketsCsvPath = _createTicketsCsv([
+            ['1', 'defect', 'johndoe', 'roskakori', '', 'closed', 'fixed', 'first', 'line\n2,\n"quoted"\n',
+                '', '', '', ''],
+            ['3', 'task', 'johndoe', 'roskakori', '', 'new', '', 'third', '', '', '', '', ''],
+            ['4', 'task', 'johndoe', 'roskakori', '', 'new', '', 'fourth', '"\n"', '', '', '', ''],
+        ])
+        commentsCsvFile, self.commentsCsvPath = tempfile.mkstemp(suffix='.csv')
+        with os.fdopen(commentsCsvFile, 'wb') as commentsCsvFile:
+            writer = csv.writer(commentsCsvFile)
+            writer.writerow(['ticket', 'PosixTime', 'author', 'field', 'newvalue'])
+            writer.writerow(['1', '1000', 'johndoe', 'comment', 'first\ncomment'])
+            writer.writerow(['3', '1000', 'johndoe', 'comment', 'second'])
+            writer.writerow(['3', '1100', 'johndoe', 'status', 'closed'])
+
+    def tearDown(self):
+        for csvPath in (self.ticketsCsvPath, self.commentsCsvPath):
+            os.remove(csvPath)
+            if os.path.exists(csvPath + '.index'):
+                os.remove(csvPath + '.index')
+
+    def testCanSkipTickets(self):
+        ticketsCsvIndex = tratihubis._CsvIndex(self.ticketsCsvPath)
+        self.assertEqual(len(ticketsCsvIndex), 3)
+        self.assertEqual(ticketsCsvIndex.lastTicketId(), 4)
+        for firstTicketId, expectedTicketIds in ((0, [1, 3, 4]), (2, [3, 4]), (4, [4]), (5, [])):
+            rows = list(tratihubis._ticketsCsvRows(self.ticketsCsvPath, ticketsCsvIndex, firstTicketId))
+            self.assertEqual([ticketId for ticketId, _ in rows], expectedTicketIds)
+        self.assertEqual(rows, [])
+        _, row = list(tratihubis._ticketsCsvRows(self.ticketsCsvPath, ticketsCsvIndex, 4))[0]
+        self.assertEqual(row[8], u'"\n"')
+
+    def testCanSkipComments(self):
+        commentsCsvIndex = tratihubis._CsvIndex(self.commentsCsvPath)
+        self.assertEqual(len(commentsCsvIndex), 2)
+        commentsMap = tratihubis._createTicketToCommentsMap(self.commentsCsvPath, commentsCsvIndex, 2)
+        self.assertEqual(commentsMap.keys(), [3])
+        self.assertEqual([comment['time'] for comment in commentsMap[3]], [1000, 1100])
+
+    def testCanReuseIndex(self):
+        tratihubis._CsvIndex(self.ticketsCsvPath)
+        with open(self.ticketsCsvPath + '.index', 'rb') as indexFile:
+            indexData = indexFile.read()
+        self.assertEqual(len(tratihubis._CsvIndex(self.ticketsCsvPath)), 3)
+        with open(self.ticketsCsvPath, 'ab') as ticketsCsvFile:
+            csv.writer(ticketsCsvFile).writerow(['7', 'task', '', '', '', 'new', '', 'seventh', '', '', '', '', ''])
+        self.assertEqual(tratihubis._CsvIndex(self.ticketsCsvPath).lastTicketId(), 7)
+        with open(self.ticketsCsvPath + '.index', 'rb') as indexFile:
+            self.assertNotEqual(indexFile.read(), indexData)
+
+    def testCanRebuildTruncatedIndex(self):
+        tratihubis._CsvIndex(self.ticketsCsvPath)
+        with open(self.ticketsCsvPath + '.index', 'rb') as indexFile:
+            indexData = indexFile.read()
+        itemSize = array.array('l').itemsize
+        for cutSize in (3 * itemSize, itemSize + 1):
+            with open(self.ticketsCsvPath + '.index', 'wb') as indexFile:
+                indexFile.write(indexData[:-cutSize])
+            ticketsCsvIndex = tratihubis._CsvIndex(self.ticketsCsvPath)
+            self.assertEqual(ticketsCsvIndex.lastTicketId(), 4)
+            with open(self.ticketsCsvPath + '.index', 'rb') as indexFile:
+                self.assertEqual(indexFile.read(), indexData)
+        self.assertFalse(os.path.exists(self.ticketsCsvPath + '.index.tmp'))
+
+    def testCanRebuildIndexOfReexportInSameSecond(self):
+        os.utime(self.ticketsCsvPath, (1000000000.25, 1000000000.25))
+        tratihubis._CsvIndex(self.ticketsCsvPath)
+        with open(self.ticketsCsvPath, 'rb') as ticketsCsvFile:
+            ticketsCsvData = ticketsCsvFile.read()
+        with open(self.ticketsCsvPath, 'wb') as ticketsCsvFile:
+            ticketsCsvFile.write(ticketsCsvData.replace('\r\n3,', '\r\n2,'))
+        os.utime(self.ticketsCsvPath, (1000000000.75, 1000000000.75))
+        self.assertEqual(list(tratihubis._CsvIndex(self.ticketsCsvPath)._ids), [1, 2, 4])
+
+    def testFailsOnUnorderedTickets(self):
+        with open(self.ticketsCsvPath, 'ab') as ticketsCsvFile:
+            csv.writer(ticketsCsvFile).writerow(['2', 'task', '', '', '', 'new', '', 'second', '', '', '', '', ''])
+        self.assertRaises(tratihubis._CsvDataError, tratihubis._CsvIndex, self.ticketsCsvPath)
+
+
+class ExportValidationTest(unittest.TestCase):
+    def setUp(self):
+        self.ticketsCsvPath = _createTicketsCsv([
+            ['1', 'defect', 'johndoe', 'roskakori', '1.0', 'closed', 'fixed', 'first', 'multiple\nlines', '1000',
+                '', '', ''],
+            ['3', 'task', 'janedoe', 'roskakori', ' 1.0', 'new', '', 'third', '', 'yesterday', '', '', ''],
+            ['2', 'task', 'johndoe', 'roskakori', '', 'new', '', 'x' * 300, '', '', '', '', ''],
+            ['4', 'task', 'johndoe', 'roskakori', ''],
+        ])
+        commentsCsvFile, self.commentsCsvPath = tempfile.mkstemp(suffix='.csv')
+        with os.fdopen(commentsCsvFile, 'wb') as commentsCsvFile:
+            writer = csv.writer(commentsCsvFile)
+            writer.writerow(['ticket', 'PosixTime', 'author', 'field', 'newvalue'])
+            writer.writerow(['1', '1000', 'johndoe', 'comment', 'x' * (tratihubis.GITHUB_BODY_LIMIT + 1)])
+            writer.writerow(['7', '1000', 'johndoe', 'comment', 'lost'])
+
+    def tearDown(self):
+        os.remove(self.ticketsCsvPath)
+        os.remove(self.commentsCsvPath)
+
+    def testCanSplitIntoChunks(self):
+        chunks = list(tratihubis._csvChunks(self.ticketsCsvPath, 2))
+        self.assertEqual([firstRowIndex for _, _, firstRowIndex in chunks], [0, 2, 4])
+        self.assertEqual(sum(chunkLength for _, chunkLength, _ in chunks), os.path.getsize(self.ticketsCsvPath))
+        result = tratihubis._validatedCsvChunk(('tickets', self.ticketsCsvPath, chunks[1][0], chunks[1][1], 2))
+        self.assertEqual(result['ids'], [(2, 3), (3, 2)])
+        self.assertEqual(result['values']['milestone'], {u' 1.0': 2, u'': 3})
+
+    def testCanFindAllErrors(self):
+        errors, warnings = tratihubis.validateExports(self.ticketsCsvPath, self.commentsCsvPath,
+            userMapping='johndoe: johndoe', labelMapping='type=defect: bug, status=new: fresh, type=task: ' + 'x' * 51,
+            processCount=2)
+        ticketsCsvName = os.path.basename(self.ticketsCsvPath)
+        self.assertEqual([error.split(':')[:2] for error in errors if error.startswith(ticketsCsvName)], [
+            [ticketsCsvName, '3'], [ticketsCsvName, '3'], [ticketsCsvName, '4'], [ticketsCsvName, '4'],
+            [ticketsCsvName, '5']])
+        self.assertTrue(u'time stamp in column 10' in errors[0])
+        self.assertTrue(u'"janedoe"' in errors[1])
+        self.assertTrue(u'summary must have at most 256 characters' in errors[2])
+        self.assertTrue(u'ascending order but 2 follows 3' in errors[3])
+        self.assertTrue(u'must have 13 columns' in errors[4])
+        self.assertTrue(u'"status"' in errors[5])
+        self.assertTrue(u'"%s"' % ('x' * 51) in errors[6])
+        self.assertEqual(len(errors), 7)
+        self.assertEqual(len(warnings), 3)
+        self.assertTrue(u"u' 1.0' and u'1.0' will be merged" in warnings[0])
+        self.assertTrue(u'will be split' in warnings[1])
+        self.assertTrue(u'ticket 7 does not exist' in warnings[2])
+
+
+class AttachmentPublisherTest(unittest.TestCase):
+    def setUp(self):
+        self.tempFolder = tempfile.mkdtemp()
+        self.tracEnvPath = os.path.join(self.tempFolder, 'trac')
+        self.gitRepoPath = os.path.join(self.tempFolder, 'git')
+        subprocess.check_call(['git', 'init', '--quiet', self.gitRepoPath])
+        self.attachmentsMap = {}
+        for ticketId, filename, content in ((1, u'screen shot.png', 'png'), (1, u'log.txt', 'same'),
+                (2, u'"quoted".txt', 'same'), (3, u'missing.txt', None)):
+            self.attachmentsMap.setdefault(ticketId, []).append({
+                'id': ticketId,
+                'filename': filename,
+                'fullpath': u'http://example.com/%d/%s' % (ticketId, filename),
+            })
+            if content is not None:
+                filePath = tratihubis._attachmentFilePath(self.tracEnvPath, ticketId, filename)
+                if not os.path.exists(os.path.dirname(filePath)):
+                    os.makedirs(os.path.dirname(filePath))
+                with open(filePath, 'wb') as attachmentFile:
+                    attachmentFile.write(content)
+
+    def tearDown(self):
+        shutil.rmtree(self.tempFolder)
+
+    def _branchFiles(self):
+        return subprocess.check_output(['git', 'ls-tree', '-r', '-z', '--name-only',
+            tratihubis.ATTACHMENTS_BRANCH], cwd=self.gitRepoPath).rstrip('\0').split('\0')
+
+    def testCanPublishAttachments(self):
+        self.assertEqual(tratihubis.publishAttachments(self.tracEnvPath, self.gitRepoPath, self.attachmentsMap,
+            pretend=False), (3, 2))
+        self.assertEqual(self._branchFiles(), ['1/log.txt', '1/screen shot.png', '2/"quoted".txt'])
+        subprocess.check_call(['git', 'cat-file', '-e', '%s:1/screen shot.png' % tratihubis.ATTACHMENTS_BRANCH],
+            cwd=self.gitRepoPath)
+
+    def testCanPublishAgain(self):
+        tratihubis.publishAttachments(self.tracEnvPath, self.gitRepoPath, self.attachmentsMap, pretend=False)
+        del self.attachmentsMap[2]
+        tratihubis.publishAttachments(self.tracEnvPath, self.gitRepoPath, self.attachmentsMap, pretend=False)
+        self.assertEqual(self._branchFiles(), ['1/log.txt', '1/screen shot.png'])
+        commitCount = subprocess.check_output(['git', 'rev-list', '--count', tratihubis.ATTACHMENTS_BRANCH],
+            cwd=self.gitRepoPath)
+        self.assertEqual(commitCount.strip(), '2')
+
+    def _branchHead(self):
+        return subprocess.check_output(['git', 'rev-parse', tratihubis.ATTACHMENTS_BRANCH], cwd=self.gitRepoPath)
+
+    def testCanSkipUnchangedAttachments(self):
+        tratihubis.scanAttachments(self.tracEnvPath, self.attachmentsMap)
+        tratihubis.publishAttachments(self.tracEnvPath, self.gitRepoPath, self.attachmentsMap, pretend=False)
+        head = self._branchHead()
+        originalPopen = subprocess.Popen
+        commands = []
+
+        def recordingPopen(command, *arguments, **keywords):
+            commands.append(command[1])
+            return originalPopen(command, *arguments, **keywords)
+
+        subprocess.Popen = recordingPopen
+        try:
+            self.assertEqual(tratihubis.publishAttachments(self.tracEnvPath, self.gitRepoPath,
+                self.attachmentsMap, pretend=False), (2, 2))
+        finally:
+            subprocess.Popen = originalPopen
+        self.assertNotIn('fast-import', commands)
+        self.assertEqual(self._branchHead(), head)
+
+    def testCanPublishChangedAttachments(self):
+        tratihubis.publishAttachments(self.tracEnvPath, self.gitRepoPath, self.attachmentsMap, pretend=False)
+        with open(tratihubis._attachmentFilePath(self.tracEnvPath, 1, u'log.txt'), 'wb') as attachmentFile:
+            attachmentFile.write('changed')
+        self.assertEqual(tratihubis.publishAttachments(self.tracEnvPath, self.gitRepoPath, self.attachmentsMap,
+            pretend=False), (3, 3))
+        self.assertEqual(self._branchFiles(), ['1/log.txt', '1/screen shot.png', '2/"quoted".txt'])
+        logContent = subprocess.check_output(['git', 'show', '%s:1/log.txt' % tratihubis.ATTACHMENTS_BRANCH],
+            cwd=self.gitRepoPath)
+        self.assertEqual(logContent, 'changed')
+
+    def testCanScanAttachments(self):
+        manifestPath = os.path.join(self.tempFolder, 'manifest.csv')
+        tratihubis.scanAttachments(self.tracEnvPath, self.attachmentsMap, manifestPath, threadCount=2)
+        screenShot, log = self.attachmentsMap[1]
+        quoted = self.attachmentsMap[2][0]
+        missing = self.attachmentsMap[3][0]
+        self.assertEqual(screenShot['size'], 3)
+        self.assertEqual(screenShot['sha1'], hashlib.sha1('png').hexdigest())
+        self.assertIs(quoted['duplicateOf'], log)
+        self.assertEqual(quoted['fullpath'], u'http://example.com/1/log.txt')
+        self.assertIsNone(missing['size'])
+        with open(manifestPath, 'rb') as manifestFile:
+            rows = list(csv.reader(manifestFile))
+        self.assertEqual(rows[0], ['ticket', 'filename', 'size', 'sha1', 'missing', 'duplicate_of'])
+        self.assertEqual(rows[3][4:], ['no', '1/log.txt'])
+        self.assertEqual(rows[4][2:], ['', '', 'yes', ''])
+
+    def testCanPublishScannedAttachments(self):
+        tratihubis.scanAttachments(self.tracEnvPath, self.attachmentsMap)
+        self.assertEqual(tratihubis.publishAttachments(self.tracEnvPath, self.gitRepoPath, self.attachmentsMap,
+            pretend=False), (2, 2))
+        self.assertEqual(self._branchFiles(), ['1/log.txt', '1/screen shot.png'])
+
+    def testCanShowAttachmentSizes(self):
+        tratihubis.scanAttachments(self.tracEnvPath, self.attachmentsMap)
+        for attachment in self.attachmentsMap[1] + self.attachmentsMap[3]:
+            attachment.update(author=u'johndoe', date=u'2012-01-01')
+        ticketMap = {'id': 1, 'description': u'', 'type': u'task', 'reporter': u'', 'owner': u'',
+            'createdtime': u'', 'modifiedtime': u'', 'freshdesk': u''}
+        body = tratihubis._issueBody(ticketMap, self.attachmentsMap[1] + self.attachmentsMap[3])
+        self.assertIn(u'[log.txt](http://example.com/1/log.txt) on 2012-01-01 (4 bytes)\n', body)
+        self.assertIn(u'[missing.txt](http://example.com/3/missing.txt) on 2012-01-01 (missing)\n', body)
+
+
+class _OfflineHub(object):
+    '''
+    Stand-in for `github.Github` that never runs into the rate limit.
+    '''
+    rate_limiting = (5000, 5000)
+
+
+class _LabeledRepo(object):
+    '''
+    Offline stand-in for a Github repository that only has labels.
+    '''
+    def __init__(self, labelNames):
+        self._labels = [tratihubis._FakeLabel(labelName) for labelName in labelNames]
+
+    def get_labels(self):
+        return self._labels
+
+
+class ProvisioningTest(unittest.TestCase):
+    def setUp(self):
+        self._hub = tratihubis._hub
+        tratihubis._hub = _OfflineHub()
+        self.repo = _LabeledRepo(['bug'])
+        self.ticketsCsvPath = _createTicketsCsv([
+            ['1', 'defect', 'johndoe', 'roskakori', '1.0', 'closed', 'fixed', 'first', '', '', '', '', 'ui'],
+            ['2', 'task', 'johndoe', 'roskakori', ' 2.0 ', 'new', '', 'second', '', '', '', '', ''],
+            ['3', 'task', 'johndoe', 'roskakori', '', 'new', '', 'third', '', '', '', '', ''],
+        ])
+
+    def tearDown(self):
+        tratihubis._hub = self._hub
+        os.remove(self.ticketsCsvPath)
+
+    def testCanCollectMissingLabels(self):
+        transformations = tratihubis._LabelTransformations(self.repo, 'type=defect: bug, type=task: chore',
+                'ui, db', strict=False)
+        self.assertEqual(transformations.missingLabelNames, set(['chore', 'ui', 'db']))
+        self.assertEqual(transformations.labelNameFor('type', 'task'), 'chore')
+        transformations.addLabel(tratihubis._FakeLabel('chore'))
+        self.assertEqual(transformations.missingLabelNames, set(['ui', 'db']))
+        self.assertEqual(transformations.labelFor('type', 'task').name, 'chore')
+
+    def testCanProvideUsedMilestonesAndLabels(self):
+        transformations = tratihubis._LabelTransformations(self.repo,
+                'type=defect: bug, type=task: chore, resolution=wontfix: wontfix', 'ui, db', strict=False)
+        milestones = {u'1.0': tratihubis._FakeMilestone(1, u'1.0')}
+        tratihubis._provisionMilestonesAndLabels(self.repo, self.ticketsCsvPath, None, milestones,
+                transformations, pretend=True)
+        self.assertEqual(sorted(milestones.keys()), [u'1.0', u'2.0'])
+        self.assertEqual(milestones[u'2.0'].number, 2)
+        # Labels no ticket needs remain missing.
+        self.assertEqual(transformations.missingLabelNames, set(['wontfix', 'db']))
+
+
+class _RecordingGraphQLClient(object):
+    '''
+    Stand-in for `tratihubis._GraphQLClient` that remembers queries and resolves all ids.
+    '''
+    def __init__(self):
+        self.queries = []
+
+    def execute(self, query):
+        self.queries.append(query)
+        if query.startswith('query'):
+            aliases = [line.split(':')[0].strip() for line in query.splitlines() if '{ id }' in line]
+            return {'repository': dict((alias, {'id': 'ID_' + alias}) for alias in aliases)}
+        return {}
+
+
+class IssueMutationBatchTest(unittest.TestCase):
+    def setUp(self):
+        self._hub = tratihubis._hub
+        tratihubis._hub = _OfflineHub()
+        self.client = _RecordingGraphQLClient()
+
+    def tearDown(self):
+        tratihubis._hub = self._hub
+
+    def testCanSendOperationsInOrder(self):
+        batch = tratihubis._IssueMutationBatch(self.client, 'roskakori', 'tratihubis', 10)
+        batch.setIssueId(1, 'ID_known')
+        batch.addLabels(2, ['bug'])
+        batch.close(1)
+        batch.close(2)
+        self.assertEqual(self.client.queries, [])
+        batch.flush()
+        self.assertEqual(len(batch), 0)
+        self.assertEqual(batch.requestCount, 2)
+        lookup, mutation = self.client.queries
+        self.assertTrue('i2: issue(number: 2)' in lookup)
+        self.assertTrue('l0: label(name: "bug")' in lookup)
+        self.assertFalse('issue(number: 1)' in lookup)
+        mutationLines = [line.strip() for line in mutation.splitlines()[1:-1]]
+        self.assertEqual(mutationLines, [
+            'm0: addLabelsToLabelable(input: {labelableId: "ID_i2", labelIds: ["ID_l0"]}) { clientMutationId }',
+            'm1: closeIssue(input: {issueId: "ID_known"}) { clientMutationId }',
+            'm2: closeIssue(input: {issueId: "ID_i2"}) { clientMutationId }',
+        ])
+
+    def testCanFlushFullBatch(self):
+        batch = tratihubis._IssueMutationBatch(self.client, 'roskakori', 'tratihubis', 2)
+        for issueNumber in range(1, 6):
+            batch.setIssueId(issueNumber, 'ID_%d' % issueNumber)
+            batch.close(issueNumber)
+        self.assertEqual(len(self.client.queries), 2)
+        self.assertEqual(len(batch), 1)
+        batch.flush()
+        self.assertEqual(len(self.client.queries), 3)
+
+    def testCanFlushNothing(self):
+        batch = tratihubis._IssueMutationBatch(self.client, 'roskakori', 'tratihubis')
+        batch.flush()
+        self.assertEqual(self.client.queries, [])
+
+
+class _PagingGraphQLClient(object):
+    '''
+    Stand-in for `tratihubis._GraphQLClient` that serves issues in pages of 2.
+    '''
+    def __init__(self, issueCount, pullRequestNumbers=()):
+        self.pages = {'issues': [], 'pullRequests': []}
+        issueNumbers = [number for number in range(1, issueCount + 1) if number not in pullRequestNumbers]
+        for connection, numbers in (('issues', issueNumbers), ('pullRequests', list(pullRequestNumbers))):
+            for pageStart in range(0, max(1, len(numbers)), 2):
+                pageNumbers = numbers[pageStart:pageStart + 2]
+                self.pages[connection].append({
+                    'pageInfo': {
+                        'hasNextPage': pageStart + 2 < len(numbers),
+                        'endCursor': 'cursor%d' % (pageStart + 2),
+                    },
+                    'nodes': [{
+                        'number': number,
+                        'title': u'issue %d' % number,
+                        'state': 'CLOSED' if number % 2 else 'OPEN',
+                        'comments': {'totalCount': number},
+                    } for number in pageNumbers],
+                })
+        self.queries = []
+
+    def execute(self, query):
+        self.queries.append(query)
+        connection = 'pullRequests' if 'pullRequests(' in query else 'issues'
+        pageIndex = 0
+        if 'after: "cursor' in query:
+            pageIndex = int(query.split('after: "cursor')[1].split('"')[0]) // 2
+        return {
+            'repository': {connection: self.pages[connection][pageIndex]},
+            'rateLimit': {'cost': 1, 'remaining': 4999},
+        }
+
+
+class _NamedRepo(object):
+    full_name = 'roskakori/tratihubis'
+
+
+class GraphQLIssueReaderTest(unittest.TestCase):
+    def setUp(self):
+        self._hub = tratihubis._hub
+        tratihubis._hub = _OfflineHub()
+
+    def tearDown(self):
+        tratihubis._hub = self._hub
+
+    def testCanReadAllIssues(self):
+        client = _PagingGraphQLClient(5, [4])
+        registry = tratihubis._createIssueMapUsingGraphQL(_NamedRepo(), client)
+        self.assertEqual(len(registry), 5)
+        self.assertEqual(registry.title(4), u'issue 4')
+        self.assertEqual(registry.state(3), 'closed')
+        self.assertEqual(registry.state(4), 'open')
+        self.assertEqual(registry.comments(5), 5)
+        self.assertEqual(len(client.queries), 3)
+
+    def testCanStopAfterHighestTicket(self):
+        client = _PagingGraphQLClient(9)
+        registry = tratihubis._createIssueMapUsingGraphQL(_NamedRepo(), client, 3)
+        self.assertEqual(len(registry), 4)
+        self.assertEqual(len([query for query in client.queries if 'issues(' in query]), 2)
+
+
+class _CommentedIssue(object):
+    def __init__(self, number, state):
+        self.number = number
+        self.state = state
+        self.comments = []
+
+    def create_comment(self, body):
+        self.comments.append(body)
+
+    def edit(self, state):
+        self.state = state
+
+
+class _IssuedRepo(object):
+    def __init__(self, states):
+        self.issues = dict((number, _CommentedIssue(number, state)) for number, state in states.items())
+
+    def get_issue(self, number):
+        return self.issues[number]
+
+
+class _RecordingIssueMutations(object):
+    def __init__(self):
+        self.closedNumbers = []
+
+    def close(self, number):
+        self.closedNumbers.append(number)
+
+
+class DeltaSyncTest(unittest.TestCase):
+    def setUp(self):
+        self._hub = tratihubis._hub
+        tratihubis._hub = _OfflineHub()
+        self.ticketsCsvPath = _createTicketsCsv([
+            ['1', 'defect', 'johndoe', 'roskakori', '', 'closed', 'fixed', 'first', '', '1000', '1500', '', ''],
+            ['2', 'task', 'johndoe', 'roskakori', '', 'reopened', '', 'second', '', '1000', '2500', '', ''],
+            ['3', 'task', 'johndoe', 'roskakori', '', 'closed', 'fixed', 'third', '', '1000', '2600', '', ''],
+            ['4', 'task', 'johndoe', 'roskakori', '', 'new', '', 'fourth', '', '2700', '2700', '', ''],
+        ])
+        journalFile, self.journalPath = tempfile.mkstemp(suffix='.journal')
+        os.close(journalFile)
+        os.remove(self.journalPath)
+        self.comments = {
+            2: [self._comment(2, 1200, u'old'), self._comment(2, 2400, u'new')],
+            3: [self._comment(3, 2600, u'newer')],
+        }
+        self.issues = tratihubis._IssueRegistry()
+        for number, state in ((1, 'closed'), (2, 'closed'), (3, 'open'), (4, 'open')):
+            self.issues.add(number, u'issue %d' % number, state)
+        self.repo = _IssuedRepo({1: 'closed', 2: 'closed', 3: 'open', 4: 'open'})
+
+    def tearDown(self):
+        tratihubis._hub = self._hub
+        os.remove(self.ticketsCsvPath)
+        if os.path.exists(self.journalPath):
+            os.remove(self.journalPath)
+
+    def _comment(self, ticketId, time, body):
+        return {'id': ticketId, 'time': time, 'date': u'', 'author': u'johndoe', 'type': u'comment',
+            'body': body, 'padding': u' '}
+
+    def _sync(self, journal, columnar=False):
+        ticketTable = tratihubis._TicketTable(self.ticketsCsvPath) if columnar else None
+        changedTickets = tratihubis._changedTicketMaps(self.ticketsCsvPath, ticketTable, 2000)
+        tratihubis._syncChangedTickets(self.repo, changedTickets, self.issues, self.comments, 2000, journal,
+            None, pretend=False)
+
+    def testCanFindHighWaterMark(self):
+        self.assertEqual(tratihubis._highWaterMark(self.ticketsCsvPath, None, self.comments), 2700)
+        self.assertEqual(tratihubis._highWaterMark(self.ticketsCsvPath, None, {1: [self._comment(1, 3000, u'')]}),
+            3000)
+
+    def _readTicketIds(self):
+        '''
+        List to which the id of every row read from a CSV file is appended from now on.
+        '''
+        result = []
+        unicodeCsvReaderNext = tratihubis._UnicodeCsvReader.next
+
+        def recordingNext(reader):
+            row = unicodeCsvReaderNext(reader)
+            result.append(row[0])
+            return row
+
+        tratihubis._UnicodeCsvReader.next = recordingNext
+        self.addCleanup(setattr, tratihubis._UnicodeCsvReader, 'next', unicodeCsvReaderNext)
+        return result
+
+    def testCanResumeWithoutReadingMigratedRows(self):
+        ticketsCsvIndex = tratihubis._CsvIndex(self.ticketsCsvPath)
+        self.addCleanup(os.remove, ticketsCsvIndex.indexPath)
+        journal = tratihubis._MigrationJournal(self.journalPath)
+        self.assertEqual(tratihubis._highWaterMark(self.ticketsCsvPath, None, self.comments, journal), 2700)
+        readTicketIds = self._readTicketIds()
+        self.assertEqual(tratihubis._highWaterMark(self.ticketsCsvPath, None, self.comments,
+            tratihubis._MigrationJournal(self.journalPath)), 2700)
+        self.assertEqual(readTicketIds, [])
+        issueMutations = _RecordingIssueMutations()
+        tratihubis._closeIssuesMissedBefore(self.ticketsCsvPath, None, self.issues, issueMutations,
+            ticketsCsvIndex)
+        self.assertEqual(issueMutations.closedNumbers, [3])
+        self.assertEqual(readTicketIds, ['3'])
+
+    def testCanFindChangedTickets(self):
+        for ticketTable in (None, tratihubis._TicketTable(self.ticketsCsvPath)):
+            changedTicketIds = [ticketMap['id'] for ticketMap in
+                tratihubis._changedTicketMaps(self.ticketsCsvPath, ticketTable, 2000)]
+            self.assertEqual(changedTicketIds, [2, 3, 4])
+
+    def testCanSyncChangedTickets(self):
+        journal = tratihubis._MigrationJournal(self.journalPath)
+        self._sync(journal)
+        self.assertEqual(len(self.repo.issues[2].comments), 1)
+        self.assertTrue(u'new' in self.repo.issues[2].comments[0])
+        self.assertEqual(self.repo.issues[2].state, 'open')
+        self.assertEqual(self.issues.state(2), 'open')
+        self.assertEqual(self.repo.issues[3].state, 'closed')
+        # The last issue is left to the regular migration.
+        self.assertEqual(self.repo.issues[4].comments, [])
+        self.assertEqual(tratihubis._MigrationJournal(self.journalPath).get('syncedTickets'), [2, 3])
+
+    def testCanResumeInterruptedSync(self):
+        journal = tratihubis._MigrationJournal(self.journalPath)
+        journal.update(syncedTickets=[2])
+        self._sync(journal, columnar=True)
+        self.assertEqual(self.repo.issues[2].comments, [])
+        self.assertEqual(self.repo.issues[2].state, 'open')
+        self.assertEqual(len(self.repo.issues[3].comments), 1)
+
+    def testCanResumeInterruptedComments(self):
+        self.comments[2].append(self._comment(2, 2450, u'newest'))
+        issue = self.repo.issues[2]
+
+        def createCommentAndFail(body):
+            if issue.comments:
+                raise IOError('connection lost')
+            issue.comments.append(body)
+
+        issue.create_comment = createCommentAndFail
+        self.assertRaises(IOError, self._sync, tratihubis._MigrationJournal(self.journalPath))
+        self.assertEqual(tratihubis._MigrationJournal(self.journalPath).get('syncedComments'), {'2': [1, 1]})
+        del issue.create_comment
+        self._sync(tratihubis._MigrationJournal(self.journalPath))
+        self.assertEqual(len(issue.comments), 2)
+        self.assertTrue(u'new' in issue.comments[0])
+        self.assertTrue(u'newest' in issue.comments[1])
+        self.assertEqual(tratihubis._MigrationJournal(self.journalPath).get('syncedComments'), {})
+
+    def testCanConvertOnlyAddedComments(self):
+        convertedTexts = []
+        convertWikiToMd = tratihubis._convertWikiToMd
+
+        def recordingConvertWikiToMd(text, currentTicket):
+            convertedTexts.append(text)
+            return convertWikiToMd(text, currentTicket)
+
+        tratihubis._convertWikiToMd = recordingConvertWikiToMd
+        try:
+            self._sync(tratihubis._MigrationJournal(self.journalPath))
+        finally:
+            tratihubis._convertWikiToMd = convertWikiToMd
+        self.assertEqual(convertedTexts, [u'new', u'newer'])
+
+
+class _StoredComment(object):
+    def __init__(self, body):
+        self.body = body
+
+
+class _StoredIssue(object):
+    def __init__(self, number, title, state, body, commentBodies):
+        self.number = number
+        self.title = title
+        self.state = state
+        self.body = body
+        self.commentBodies = list(commentBodies)
+
+    @property
+    def comments(self):
+        return len(self.commentBodies)
+
+    def get_comments(self):
+        return [_StoredComment(commentBody) for commentBody in self.commentBodies]
+
+
+class _StoredRepo(object):
+    '''
+    Offline stand-in for a Github repository that counts how often each issue was fetched.
+    '''
+    def __init__(self):
+        self.issues = {}
+        self.changedIssueNumbers = []
+        self.fetchedIssueNumbers = []
+
+    def get_issue(self, number):
+        self.fetchedIssueNumbers.append(number)
+        if number not in self.issues:
+            raise github.UnknownObjectException(404, {'message': 'Not Found'})
+        return self.issues[number]
+
+    def get_issues(self, state, since):
+        return [self.issues[number] for number in self.changedIssueNumbers]
+
+
+class VerificationTest(unittest.TestCase):
+    def setUp(self):
+        self._hub = tratihubis._hub
+        tratihubis._hub = _OfflineHub()
+        self.ticketsCsvPath = _createTicketsCsv([
+            ['1', 'defect', 'johndoe', 'roskakori', '', 'closed', 'fixed', 'first', 'some text', '1000', '1500',
+                '', ''],
+            ['3', 'task', 'johndoe', 'roskakori', '', 'new', '', 'third', '', '1000', '2500', '', ''],
+        ])
+        journalFile, self.journalPath = tempfile.mkstemp(suffix='.journal')
+        os.close(journalFile)
+        os.remove(self.journalPath)
+        self.repo = _StoredRepo()
+        self.repo.issues[1] = _StoredIssue(1, u'first', 'closed',
+            tratihubis._issueBody(tratihubis._ticketMapFromRow(1, self._ticketRow(1)), None) + u'  \r\n', [])
+        self.repo.issues[2] = _StoredIssue(2, u'placeholder', 'closed',
+            tratihubis._issueBody(tratihubis._placeholderTicketMap(2), None), [])
+        self.repo.issues[3] = _StoredIssue(3, u'third', 'open',
+            tratihubis._issueBody(tratihubis._ticketMapFromRow(3, self._ticketRow(3)), None), [])
+
+    def tearDown(self):
+        tratihubis._hub = self._hub
+        os.remove(self.ticketsCsvPath)
+        if os.path.exists(self.journalPath):
+            os.remove(self.journalPath)
+
+    def _ticketRow(self, ticketId):
+        for rowTicketId, row in tratihubis._ticketsCsvRows(self.ticketsCsvPath):
+            if rowTicketId == ticketId:
+                return row
+
+    def testCanVerifyMigratedIssues(self):
+        self.assertEqual(tratihubis.verifyMigration(self.repo, self.ticketsCsvPath), [])
+
+    def testCanDetectMismatches(self):
+        self.repo.issues[3].state = 'closed'
+        self.repo.issues[3].commentBodies.append(u'unexpected')
+        del self.repo.issues[2]
+        _, reportPath = tempfile.mkstemp(suffix='.csv')
+        try:
+            mismatches = tratihubis.verifyMigration(self.repo, self.ticketsCsvPath, columnar=True,
+                reportPath=reportPath)
+            with open(reportPath, 'rb') as reportFile:
+                reportRows = list(csv.reader(reportFile))
+        finally:
+            os.remove(reportPath)
+        self.assertEqual([mismatch[:2] for mismatch in mismatches],
+            [(2, u'issue'), (3, 'state'), (3, 'comments'), (3, 'commentBodies')])
+        self.assertEqual(reportRows[0], ['issue', 'field', 'expected', 'actual'])
+        self.assertEqual(reportRows[2], ['3', 'state', 'open', 'closed'])
+
+    def testCanFetchOnlyIssuesChangedSincePreviousVerification(self):
+        journal = tratihubis._MigrationJournal(self.journalPath)
+        tratihubis.verifyMigration(self.repo, self.ticketsCsvPath, journal=journal)
+        self.assertEqual(sorted(self.repo.fetchedIssueNumbers), [1, 2, 3])
+        self.repo.fetchedIssueNumbers = []
+        self.repo.issues[3].title = u'changed'
+        self.repo.changedIssueNumbers = [3]
+        mismatches = tratihubis.verifyMigration(self.repo, self.ticketsCsvPath,
+            journal=tratihubis._MigrationJournal(self.journalPath))
+        self.assertEqual(self.repo.fetchedIssueNumbers, [3])
+        self.assertEqual(mismatches, [(3, 'title', u'third', u'changed')])
+
+    def testCanPauseForEachPageOfComments(self):
+        events = []
+        issue = self.repo.issues[3]
+        issue.commentBodies = [u'comment %d' % commentIndex for commentIndex in xrange(65)]
+
+        def pagedComments():
+            for commentBody in issue.commentBodies:
+                events.append('comment')
+                yield _StoredComment(commentBody)
+
+        issue.get_comments = pagedComments
+        apiPauseIfNeeded = tratihubis._apiPauseIfNeeded
+        tratihubis._apiPauseIfNeeded = lambda: events.append('pause')
+        try:
+            digest = tratihubis._fetchedIssueDigest(self.repo, 3)
+        finally:
+            tratihubis._apiPauseIfNeeded = apiPauseIfNeeded
+        self.assertEqual(digest['comments'], 65)
+        self.assertEqual(events, ['pause', 'pause'] + ['comment'] * 30 + ['pause'] + ['comment'] * 30 + ['pause']
+            + ['comment'] * 5)
+
+
+class _RecordingIssueImporter(object):
+    '''
+    Stand-in for `tratihubis._IssueImporter` that imports into a `_StoredRepo`.
+    '''
+    def __init__(self, repo):
+        self.repo = repo
+
+    def submit(self, title, body):
+        issueNumber = len(self.repo.issues) + 1
+        self.repo.issues[issueNumber] = _StoredIssue(issueNumber, title, 'closed', body, [])
+        return u'https://api.github.com/repos/roskakori/tratihubis/import/issues/%d' % issueNumber
+
+    def waitUntilImported(self, statusUrls):
+        return [long(statusUrl.rsplit('/', 1)[1]) for statusUrl in statusUrls]
+
+
+class PlaceholderTest(unittest.TestCase):
+    def setUp(self):
+        self._hub = tratihubis._hub
+        tratihubis._hub = _OfflineHub()
+        journalFile, self.journalPath = tempfile.mkstemp(suffix='.journal')
+        os.close(journalFile)
+        os.remove(self.journalPath)
+
+    def tearDown(self):
+        tratihubis._hub = self._hub
+        if os.path.exists(self.journalPath):
+            os.remove(self.journalPath)
+
+    def testCanFindPlaceholderRuns(self):
+        self.assertEqual(tratihubis._placeholderRuns([1, 2, 5, 6, 9], 0), {3: 4, 7: 8})
+        self.assertEqual(tratihubis._placeholderRuns([1, 2, 5, 6, 9], 6), {7: 8})
+        self.assertEqual(tratihubis._placeholderRuns([3], 0), {1: 2})
+        self.assertEqual(tratihubis._placeholderRuns([1, 2, 3], 0), {})
+
+    def testCanImportPlaceholders(self):
+        repo = _StoredRepo()
+        repo.issues[1] = _StoredIssue(1, u'first', 'open', u'', [])
+        journal = tratihubis._MigrationJournal(self.journalPath)
+        tratihubis._importPlaceholders(_RecordingIssueImporter(repo), 2, 4, journal, pretend=False)
+        self.assertEqual(sorted(repo.issues), [1, 2, 3, 4])
+        self.assertEqual(repo.issues[3].state, 'closed')
+        self.assertEqual(repo.issues[3].title, u'placeholder')
+        tratihubis._rememberPlaceholders(journal, 5, 5)
+        tratihubis._rememberPlaceholders(journal, 7, 7)
+        journal = tratihubis._MigrationJournal(self.journalPath)
+        self.assertEqual(journal.get('placeholders'), [[2, 5], [7, 7]])
+        self.assertEqual(journal.get('pendingImports'), [])
+
+    def testCanRejectImportOutOfOrder(self):
+        repo = _StoredRepo()
+        self.assertRaises(Exception, tratihubis._importPlaceholders, _RecordingIssueImporter(repo), 2, 3, None,
+            False)
+
+    def testCanCloseOpenPlaceholders(self):
+        journal = tratihubis._MigrationJournal(self.journalPath)
+        journal.update(placeholders=[[2, 3]])
+        issues = tratihubis._IssueRegistry()
+        issues.add(1, u'first', 'open')
+        issues.add(2, u'placeholder', 'closed')
+        issues.add(3, u'placeholder', 'open')
+        batch = tratihubis._IssueMutationBatch(_RecordingGraphQLClient(), 'roskakori', 'tratihubis')
+        tratihubis._closePlaceholdersMissedBefore(None, journal, issues, batch, pretend=False)
+        self.assertEqual(len(batch), 1)
+        self.assertEqual(issues.state(3), 'closed')
+        self.assertEqual(issues.state(1), 'open')
+
+
+_GIT_SVN_UUID = '4ab0a1a2-7d3c-4f6e-9bc5-0123456789ab'
+
+
+def _createGitSvnRepo(gitRepoPath, svnRevisions):
+    '''
+    Git repository at ``gitRepoPath`` with one commit on the trunk for each of the ``svnRevisions``, as
+    created by git-svn. The result is the list of sha ids of the commits.
+    '''
+    environment = dict(os.environ, GIT_AUTHOR_NAME='johndoe', GIT_AUTHOR_EMAIL='johndoe@example.com',
+        GIT_COMMITTER_NAME='johndoe', GIT_COMMITTER_EMAIL='johndoe@example.com')
+    subprocess.check_call(['git', 'init', '--quiet', gitRepoPath])
+    result = []
+    for svnRevision in svnRevisions:
+        message = 'change r%d\n\ngit-svn-id: svn://example.com/project/trunk@%d %s' % (
+            svnRevision, svnRevision, _GIT_SVN_UUID)
+        subprocess.check_call(['git', 'commit', '--quiet', '--allow-empty', '-m', message], cwd=gitRepoPath,
+            env=environment)
+        result.append(subprocess.check_output(['git', 'rev-parse', 'HEAD'], cwd=gitRepoPath).strip())
+    return result
+
+
+class GitRevisionTest(unittest.TestCase):
+    def setUp(self):
+        from trac.wiki import formatter
+        self.formatter = formatter
+        self.formatter.set_svn_cache(None)
+        self.gitRepoPath = tempfile.mkdtemp()
+        self.shas = _createGitSvnRepo(self.gitRepoPath, [2, 5])
+
+    def tearDown(self):
+        self.formatter.set_svn_cache(None)
+        self.formatter._gitpath = None
+        shutil.rmtree(self.gitRepoPath)
+
+    def testCanLinkSvnRevisions(self):
+        currentFolder = os.getcwd()
+        self.assertEqual(self.formatter.trac_to_github(u'r5 and r3', self.gitRepoPath).strip(),
+            u'[r5](../commit/%s) and r3' % self.shas[1])
+        self.assertEqual(os.getcwd(), currentFolder)
+
+    def testCanCheckObjects(self):
+        storage = self.formatter._git_storage(self.gitRepoPath)
+        self.assertEqual(storage.cat_file_check(self.shas[0])[0], 'commit')
+        self.assertEqual(storage.cat_file_check('0' * 40), None)
+        self.assertEqual(storage.get_svn_revs(), {'2': self.shas[0], '5': self.shas[1]})
+
+    def _writeRevMap(self, revisionsAndShas):
+        revMapFolder = os.path.join(self.gitRepoPath, '.git', 'svn', 'refs', 'remotes', 'origin', 'trunk')
+        if not os.path.isdir(revMapFolder):
+            os.makedirs(revMapFolder)
+        with open(os.path.join(revMapFolder, '.rev_map.' + _GIT_SVN_UUID), 'wb') as revMapFile:
+            for svnRevision, sha in revisionsAndShas:
+                revMapFile.write(struct.pack('>I', svnRevision) + binascii.unhexlify(sha))
+
+    def testCanReadGitSvnRevMap(self):
+        revisionsAndShas = [(2, self.shas[0]), (5, self.shas[1]), (7, self.shas[0]), (8, '0' * 40)]
+        self._writeRevMap(revisionsAndShas)
+        storage = self.formatter._git_storage(self.gitRepoPath)
+        self.assertEqual(storage.get_svn_commit(5), self.shas[1])
+        self.assertEqual(storage.get_svn_commit('7'), self.shas[0])
+        self.assertEqual(storage.get_svn_commit(8), None)
+        self.assertEqual(storage.get_svn_commit(3), None)
+        self.assertEqual(storage.get_svn_commit(9), None)
+        self._writeRevMap(revisionsAndShas + [(9, self.shas[1])])
+        self.assertEqual(storage.get_svn_commit(9), self.shas[1])
+
+    def testCanRelinkHeadingsAfterSvnCacheReset(self):
+        self._writeRevMap([(2, self.shas[0])])
+        self.assertEqual(self.formatter.trac_to_github(u'= Fixed in r5 =', self.gitRepoPath).strip(),
+            u'# Fixed in r5')
+        self._writeRevMap([(2, self.shas[0]), (5, self.shas[1])])
+        self.formatter.set_svn_cache(None)
+        self.assertEqual(self.formatter.trac_to_github(u'= Fixed in r5 =', self.gitRepoPath).strip(),
+            u'# Fixed in [r5](../commit/%s)' % self.shas[1])
+
+    def testCanShareSvnCache(self):
+        svnCachePath = os.path.join(self.gitRepoPath, 'svncache.db')
+        self.formatter.set_svn_cache(svnCachePath)
+        self.assertEqual(self.formatter.trac_to_github(u'r5 and r7', self.gitRepoPath).strip(),
+            u'[r5](../commit/%s) and r7' % self.shas[1])
+        gitDirPath = os.path.join(self.gitRepoPath, '.git')
+        foundRevisions = []
+
+        def findCommit(svnRevision):
+            foundRevisions.append(svnRevision)
+            return self.shas[0]
+
+        cache = self.formatter.SvnRevisionCache(svnCachePath, gitDirPath, self.shas[1])
+        self.assertEqual(cache.get('5', findCommit), self.shas[1])
+        self.assertEqual(cache.get(7, findCommit), None)
+        self.assertEqual(foundRevisions, [])
+        cache.close()
+        cache = self.formatter.SvnRevisionCache(svnCachePath, gitDirPath, self.shas[1], negative_ttl=0)
+        self.assertEqual(cache.get(7, findCommit), self.shas[0])
+        self.assertEqual(cache.get(7, findCommit), self.shas[0])
+        self.assertEqual(foundRevisions, [7])
+        cache.close()
+        cache = self.formatter.SvnRevisionCache(svnCachePath, gitDirPath, self.shas[0])
+        self.assertEqual(cache.get(5, findCommit), self.shas[0])
+        self.assertEqual(foundRevisions, [7, 5])
+        cache.close()
+
+
+class RevCacheTest(unittest.TestCase):
+    def setUp(self):
+        self.tempFolder = tempfile.mkdtemp()
+        self.gitRepoPath = os.path.join(self.tempFolder, 'git')
+        self.revCachePath = os.path.join(self.tempFolder, 'revcache')
+        self.shas = _createGitSvnRepo(self.gitRepoPath, [1, 2, 3])
+
+    def tearDown(self):
+        shutil.rmtree(self.tempFolder)
+
+    def _storage(self, revCachePath=None, compact=False):
+        from tracopt.versioncontrol.git import PyGIT
+        return PyGIT.Storage(os.path.join(self.gitRepoPath, '.git'), logging.getLogger('test'),
+            rev_cache_path=revCachePath, compact_rev_cache=compact)
+
+    def _assertSameGraph(self, storage):
+        expectedCommits = self._storage().get_commits()
+        actualCommits = storage.get_commits()
+        self.assertEqual(sorted(actualCommits), sorted(expectedCommits))
+        for sha, (children, parents, _, rheads) in expectedCommits.iteritems():
+            actualChildren, actualParents, _, actualRheads = actualCommits[sha]
+            self.assertEqual((set(actualChildren), actualParents, set(actualRheads)),
+                (set(children), parents, set(rheads)))
+
+    def testCanExtendRevCache(self):
+        storage = self._storage(self.revCachePath)
+        self.assertEqual(storage.youngest_rev(), self.shas[-1])
+        self.shas.extend(_createGitSvnRepo(self.gitRepoPath, [4, 5]))
+        self.assertTrue(storage.sync())
+        self.assertEqual(storage.youngest_rev(), self.shas[-1])
+        self.assertEqual(storage.hist_prev_revision(self.shas[-1]), self.shas[-2])
+        self.assertEqual(storage.hist_next_revision(self.shas[2]), self.shas[3])
+        self.assertEqual(storage.hist_next_revision(self.shas[-1]), None)
+        self._assertSameGraph(storage)
+
+    def testCanReuseStoredRevCache(self):
+        self._storage(self.revCachePath).get_commits()
+        self.shas.extend(_createGitSvnRepo(self.gitRepoPath, [4]))
+        subprocess.check_call(['git', 'branch', 'stable', self.shas[1]], cwd=self.gitRepoPath)
+        storage = self._storage(self.revCachePath)
+        # Commits added to a stored cache get ordinals below the ones of the stored commits.
+        self.assertEqual(storage.get_commits()[self.shas[-1]][2], 0)
+        self.assertEqual(storage.shortrev(self.shas[-1]), self.shas[-1][:7])
+        self._assertSameGraph(storage)
+
+    def testCanMoveBranchesOfStoredRevCache(self):
+        for branch, sha in (('stable', self.shas[1]), ('old', self.shas[0])):
+            subprocess.check_call(['git', 'branch', branch, sha], cwd=self.gitRepoPath)
+        self._storage(self.revCachePath).get_commits()
+        self.shas.extend(_createGitSvnRepo(self.gitRepoPath, [4]))
+        subprocess.check_call(['git', 'branch', '--quiet', '--force', 'stable', self.shas[2]], cwd=self.gitRepoPath)
+        subprocess.check_call(['git', 'branch', '--quiet', '--delete', 'old'], cwd=self.gitRepoPath)
+        subprocess.check_call(['git', 'branch', 'new', self.shas[0]], cwd=self.gitRepoPath)
+        storage = self._storage(self.revCachePath)
+        self.assertEqual(storage.get_commits()[self.shas[-1]][2], 0)
+        self._assertSameGraph(storage)
+
+    def testCanRebuildRevCacheOfOtherFormat(self):
+        from tracopt.versioncontrol.git import PyGIT
+        for compact, otherCompact in ((False, True), (True, False)):
+            self._storage(self.revCachePath, compact).get_commits()
+            self.shas.extend(_createGitSvnRepo(self.gitRepoPath, [len(self.shas) + 1]))
+            storage = self._storage(self.revCachePath, otherCompact)
+            self.assertEqual(isinstance(storage.get_commits(), PyGIT.CommitGraph), otherCompact)
+            self.assertEqual(storage.youngest_rev(), self.shas[-1])
+            self._assertSameGraph(storage)
+
+    def testCanRebuildRewrittenRevCache(self):
+        self._storage(self.revCachePath).get_commits()
+        subprocess.check_call(['git', 'reset', '--quiet', '--hard', self.shas[0]], cwd=self.gitRepoPath)
+        storage = self._storage(self.revCachePath)
+        self.assertEqual(sorted(storage.get_commits()), [self.shas[0]])
+
+    def testCanUseCompactGraph(self):
+        environment = dict(os.environ, GIT_AUTHOR_NAME='johndoe', GIT_AUTHOR_EMAIL='johndoe@example.com',
+            GIT_COMMITTER_NAME='johndoe', GIT_COMMITTER_EMAIL='johndoe@example.com')
+        for command in (['checkout', '--quiet', '-b', 'stable', self.shas[0]],
+                ['commit', '--quiet', '--allow-empty', '-m', 'fix'],
+                ['checkout', '--quiet', 'master'],
+                ['merge', '--quiet', '--no-ff', '-m', 'merge', 'stable']):
+            subprocess.check_call(['git'] + command, cwd=self.gitRepoPath, env=environment)
+        storage = self._storage(compact=True)
+        expectedStorage = self._storage()
+        self._assertSameGraph(storage)
+        for sha in expectedStorage.all_revs():
+            self.assertEqual(storage.get_commits()[sha][2], expectedStorage.get_commits()[sha][2])
+            self.assertEqual(storage.shortrev(sha), expectedStorage.shortrev(sha))
+            self.assertEqual(storage.fullrev(sha[:5]), sha)
+            self.assertEqual(storage.hist_prev_revision(sha), expectedStorage.hist_prev_revision(sha))
+            self.assertEqual(set(storage.get_branch_contains(sha)), set(expectedStorage.get_branch_contains(sha)))
+        self.assertEqual(storage.fullrev('0' * 40), None)
+        self.assertFalse('0' * 40 in storage.get_commits())
+
+    def testCanExtendCompactGraph(self):
+        self._storage(self.revCachePath, compact=True).get_commits()
+        self.shas.extend(_createGitSvnRepo(self.gitRepoPath, [4, 5]))
+        storage = self._storage(self.revCachePath, compact=True)
+        self.assertEqual(storage.youngest_rev(), self.shas[-1])
+        self.assertEqual(storage.oldest_rev(), self.shas[0])
+        self._assertSameGraph(storage)
+
+
+class LRUCacheTest(unittest.TestCase):
+    def setUp(self):
+        from tracopt.versioncontrol.git import PyGIT
+        self.PyGIT = PyGIT
+
+    def testCanEvictLeastRecentlyUsed(self):
+        cache = self.PyGIT.LRUCache(2)
+        cache['a'] = 1
+        cache['b'] = 2
+        self.assertEqual(cache.get('a'), 1)
+        cache['c'] = 3
+        self.assertFalse('b' in cache)
+        self.assertEqual(cache.get('b'), None)
+        self.assertEqual(sorted(key for key in 'abc' if key in cache), ['a', 'c'])
+        stats = cache.stats()
+        self.assertEqual((stats['size'], stats['hits'], stats['misses'], stats['evictions']), (2, 1, 1, 1))
+
+    def testCanBoundBytes(self):
+        cache = self.PyGIT.LRUCache(10, max_bytes=5)
+        cache['a'] = 'xx'
+        cache['b'] = 'yyy'
+        cache['a'] = 'zzz'
+        self.assertEqual(len(cache), 1)
+        self.assertEqual(cache.get('a'), 'zzz')
+        self.assertEqual(cache.stats()['bytes'], 3)
+
+    def testCanBoundOnlyBytes(self):
+        for cache in (self.PyGIT.LRUCache(max_bytes=5), self.PyGIT.LRUCache(0, max_bytes=5)):
+            for key in 'abcde':
+                cache[key] = 'x'
+            self.assertEqual(cache.get('a'), 'x')
+            cache['f'] = 'x'
+            self.assertEqual(sorted(key for key in 'abcdef' if key in cache), ['a', 'c', 'd', 'e', 'f'])
+        cache = self.PyGIT.LRUCache()
+        for key in range(1000):
+            cache[key] = key
+        self.assertEqual(len(cache), 1000)
+        self.assertEqual(cache.stats()['evictions'], 0)
+
+    def testCanCountStorageLookups(self):
+        tempFolder = tempfile.mkdtemp()
+        try:
+            shas = _createGitSvnRepo(tempFolder, [1])
+            storage = self.PyGIT.Storage(os.path.join(tempFolder, '.git'), logging.getLogger('test'))
+            storage.read_commit(shas[0])
+            storage.read_commit(shas[0])
+            self.assertEqual(storage.get_obj_size(shas[0]), storage.get_obj_size(shas[0]))
+            for name, stats in storage.get_cache_stats():
+                self.assertEqual((stats['hits'], stats['misses']), (1, 1), name)
+        finally:
+            shutil.rmtree(tempFolder)
+
+
+class GitBatchTest(unittest.TestCase):
+    def setUp(self):
+        from tracopt.versioncontrol.git import PyGIT
+        self.gitRepoPath = tempfile.mkdtemp()
+        self.environment = dict(os.environ, GIT_AUTHOR_NAME='johndoe', GIT_AUTHOR_EMAIL='johndoe@example.com',
+            GIT_COMMITTER_NAME='johndoe', GIT_COMMITTER_EMAIL='johndoe@example.com')
+        subprocess.check_call(['git', 'init', '--quiet', self.gitRepoPath])
+        self.shas = []
+        for changes in ([('docs/read me.txt', 'hello\n'), ('setup.py', 'print 1\n' * 20)],
+                [('docs/read me.txt', 'hello world\n'), ('src/main.py', '')],
+                [('docs/read me.txt', None), ('docs/readme.txt', 'hello world\n')]):
+            self.shas.append(self._commit(changes))
+        self.storage = PyGIT.Storage(os.path.join(self.gitRepoPath, '.git'), logging.getLogger('test'),
+            git_fs_encoding='utf-8')
+
+    def tearDown(self):
+        shutil.rmtree(self.gitRepoPath)
+
+    def _dated(self):
+        # Distinct commit times so that the order of the history does not depend on how git walks it.
+        date = '%d +0000' % (1300000000 + len(self.shas) * 60)
+        return dict(self.environment, GIT_AUTHOR_DATE=date, GIT_COMMITTER_DATE=date)
+
+    def _commit(self, changes):
+        for path, content in changes:
+            filePath = os.path.join(self.gitRepoPath, path)
+            if content is None:
+                os.remove(filePath)
+            else:
+                if not os.path.exists(os.path.dirname(filePath)):
+                    os.makedirs(os.path.dirname(filePath))
+                with open(filePath, 'wb') as changedFile:
+                    changedFile.write(content)
+        subprocess.check_call(['git', 'add', '--all', '.'], cwd=self.gitRepoPath)
+        subprocess.check_call(['git', 'commit', '--quiet', '-m', 'change'], cwd=self.gitRepoPath,
+            env=self._dated())
+        return subprocess.check_output(['git', 'rev-parse', 'HEAD'], cwd=self.gitRepoPath).strip()
+
+    def _merge(self, branchChanges):
+        for command in (['checkout', '--quiet', '-b', 'stable', self.shas[0]], ['checkout', '--quiet', 'master'],
+                ['merge', '--quiet', '--no-ff', '-m', 'merge', 'stable']):
+            if command[-1] == 'master':
+                self.shas.append(self._commit(branchChanges))
+            subprocess.check_call(['git'] + command, cwd=self.gitRepoPath, env=self._dated())
+        self.shas.append(subprocess.check_output(['git', 'rev-parse', 'HEAD'], cwd=self.gitRepoPath).strip())
+
+    def testCanGetLastChanges(self):
+        self._merge([('src/tool.py', 'print 2\n')])
+        paths = [u'', u'docs', u'docs/', u'docs/read me.txt', u'docs/readme.txt', u'setup.py', u'src',
+            u'src/tool.py', u'missing']
+        for sha in self.shas:
+            lastChanges = self.storage.last_changes(sha, paths)
+            self.assertEqual(lastChanges, dict((path, self.storage.last_change(sha, path)) for path in paths))
+        self.assertEqual(self.storage.last_changes(self.shas[-1], [u'src/tool.py', u'docs/']),
+            {u'src/tool.py': self.shas[3], u'docs/': self.shas[2]})
+
+    def testCanGetHistories(self):
+        self._merge([('src/tool.py', 'print 2\n')])
+        paths = [u'docs', u'docs/read me.txt', u'setup.py', u'src/', u'missing']
+        for limit in (None, 1, 2):
+            histories = self.storage.histories(self.shas[-1], paths, limit)
+            self.assertEqual(histories, dict((path, self.storage.history(self.shas[-1], path, limit))
+                for path in paths))
+        self.assertEqual(self.storage.histories(self.shas[-1], [u''])[u''],
+            self.storage.history(self.shas[-1], u''))
+
+    def testCanListTrees(self):
+        requests = [(sha, path) for sha in self.shas
+            for path in (u'', u'docs', u'docs/', u'docs/read me.txt', u'setup.py', u'missing', u'/src/')]
+        results = list(self.storage.ls_trees(requests))
+        self.assertEqual([request for request, _ in results], requests)
+        for (sha, path), entries in results:
+            self.assertEqual(entries, self.storage.ls_tree(sha, path), (sha, path))
+
+    def testCanDiffTrees(self):
+        requests = [(None, self.shas[0]), (self.shas[0], self.shas[1]), (self.shas[1], self.shas[2]),
+            (self.shas[0], self.shas[2]), (self.shas[2], self.shas[2])]
+        for findRenames in (False, True):
+            for path in (u'', u'docs'):
+                results = list(self.storage.diff_trees(requests, path, findRenames))
+                self.assertEqual([request for request, _ in results], requests)
+                for (tree1, tree2), changes in results:
+                    self.assertEqual(changes, list(self.storage.diff_tree(tree1, tree2, path, findRenames)))
+
+
+class CommitIndexTest(unittest.TestCase):
+    def setUp(self):
+        self.tempFolder = tempfile.mkdtemp()
+        self.gitRepoPath = os.path.join(self.tempFolder, 'git')
+        self.indexPath = os.path.join(self.tempFolder, 'commits.json')
+        subprocess.check_call(['git', 'init', '--quiet', self.gitRepoPath])
+        self.shas = [self._commit(message) for message in ('fixes #3', 'refs #3 and ticket:5, see #3', 'cleanup')]
+
+    def tearDown(self):
+        shutil.rmtree(self.tempFolder)
+
+    def _commit(self, message):
+        environment = dict(os.environ, GIT_AUTHOR_NAME='johndoe', GIT_AUTHOR_EMAIL='johndoe@example.com',
+            GIT_COMMITTER_NAME='johndoe', GIT_COMMITTER_EMAIL='johndoe@example.com')
+        subprocess.check_call(['git', 'commit', '--quiet', '--allow-empty', '-m', message], cwd=self.gitRepoPath,
+            env=environment)
+        return subprocess.check_output(['git', 'rev-parse', 'HEAD'], cwd=self.gitRepoPath).strip()
+
+    def testCanIndexCommits(self):
+        commitIndex = tratihubis._CommitIndex(self.gitRepoPath, self.indexPath)
+        self.assertEqual(commitIndex.commits(3), self.shas[:2])
+        self.assertEqual(commitIndex.commits(5), self.shas[1:2])
+        self.assertEqual(commitIndex.commits(4), [])
+        self.assertEqual(len(commitIndex), 2)
+
+    def testCanRebuildIndexOnNewCommits(self):
+        tratihubis._CommitIndex(self.gitRepoPath, self.indexPath)
+        sha = self._commit('close #4')
+        self.assertEqual(tratihubis._CommitIndex(self.gitRepoPath, self.indexPath).commits(4), [sha])
+
+    def testCanLinkCommits(self):
+        ticketMap = {'id': 3, 'description': u'', 'type': u'task', 'reporter': u'', 'owner': u'',
+            'createdtime': u'', 'modifiedtime': u'', 'freshdesk': u''}
+        body = tratihubis._issueBody(ticketMap, None, self.shas[:1])
+        self.assertTrue(body.endswith(u'\n***\n* referenced by commit [%s](../commit/%s)\n'
+            % (self.shas[0][:7], self.shas[0])))
+
+
+class HeadingTest(unittest.TestCase):
+    def testCanComputeGithubAnchor(self):
+        from trac.wiki.formatter import github_anchor
+        self.assertEqual(github_anchor(u'Some **bold** [link](http://example.com) text!'), u'some-bold-link-text')
+        self.assertEqual(github_anchor(u'  Caf\xe9 - 2nd_try  '), u'caf\xe9---2nd_try')
+
+    def testCanTrackUniqueAnchors(self):
+        from StringIO import StringIO
+        from trac.wiki.formatter import Formatter
+        formatter = Formatter(track_anchors=True)
+        formatter.format(u'= Some **bold** text =\n= Some bold text =\n= Some bold text =\n= Other =#Custom\n',
+            StringIO())
+        self.assertEqual(formatter.anchors, [u'some-bold-text', u'some-bold-text-1', u'some-bold-text-2', u'Custom'])
+        self.assertEqual(Formatter().anchors, None)
+
+    def testCanSkipTakenAnchorSuffixes(self):
+        from StringIO import StringIO
+        from trac.wiki.formatter import Formatter
+        formatter = Formatter(track_anchors=True)
+        formatter.format(u'= Intro =#intro-2\n= Intro =\n= Intro =\n= Intro =\n= Intro-1 =\n', StringIO())
+        self.assertEqual(formatter.anchors, [u'intro-2', u'intro', u'intro-1', u'intro-3', u'intro-1-1'])
+
+    def testCanOutlineUniqueAnchors(self):
+        from StringIO import StringIO
+        from trac.wiki.formatter import OutlineFormatter
+        formatter = OutlineFormatter()
+        formatter.format(u'= Intro =\n= Intro =\n', StringIO())
+        self.assertEqual(formatter.anchors, [u'intro', u'intro-1'])
+
+
+class GithubProcessorTest(unittest.TestCase):
+    def setUp(self):
+        from trac.wiki import formatter
+        self.formatter = formatter
+
+    def testCanShareProcessors(self):
+        self.assertTrue(self.formatter.get_processor('python') is self.formatter.get_processor('python'))
+        self.assertFalse(self.formatter.get_processor('madeUp') is self.formatter.get_processor('madeUp'))
+        self.assertFalse('madeUp' in self.formatter._processors)
+
+    def testCanMapFenceLanguages(self):
+        for name, fence in (('python', 'python'), ('text/x-python', 'python'), ('sh', 'bash'), ('madeUp', '')):
+            self.assertEqual(self.formatter.trac_to_github(u'{{{\n#!%s\nx = 1\n}}}' % name),
+                u'```%s\nx = 1\n```\n' % fence)
+
+    def testCanCheckInlineProcessors(self):
+        htmlProcessor = self.formatter.get_processor('html')
+        self.assertTrue(htmlProcessor.is_inline(u'<span class="x">'))
+        self.assertFalse(htmlProcessor.is_inline(u'<div class="x">'))
+        self.assertTrue(self.formatter.get_processor('comment').is_inline(u''))
+        self.assertFalse(self.formatter.get_processor('python').is_inline(u''))
+        self.assertEqual(htmlProcessor.ensure_inline(u'<table><tr><td>x</td></tr></table>'),
+            u'</p><table><tr><td>x</td></tr></table><p>')
+        self.assertEqual(htmlProcessor.ensure_inline(u'x'), u'x')
+
+
+class ConverterImportTest(unittest.TestCase):
+    '''
+    Guard against the wiki converter pulling in genshi and the Trac web stack again on import.
+    '''
+    _HEAVY_MODULES = ('genshi', 'trac.mimeview', 'trac.resource', 'trac.util.html', 'trac.web', 'trac.wiki.api')
+
+    def testCanImportConverterWithoutHeavyModules(self):
+        script = 'import sys; import trac.wiki.formatter; print " ".join(sorted(sys.modules))'
+        environment = dict(os.environ)
+        environment['PYTHONPATH'] = os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))),
+                'tracformatter')
+        moduleNames = subprocess.check_output([sys.executable, '-c', script], env=environment).split()
+        self.assertTrue('trac.wiki.formatter' in moduleNames)
+        for heavyModuleName in self._HEAVY_MODULES:
+            importedHeavyModuleNames = [moduleName for moduleName in moduleNames
+                    if (moduleName == heavyModuleName) or moduleName.startswith(heavyModuleName + '.')]
+            self.assertEqual(importedHeavyModuleNames, [])
+
+
 class TratihubisTest(_RepoedTest):
     def _testCanConvertTicketsCsv(self, ticketsCsvPath, commentsCsvPath=None):
         labelMapping = 'type=defect: bug, type=enhancement: enhancement, resolution=wontfix: wontfix'
@@ -24,17 +24,10 @@ from genshi.builder import tag
 from trac import __version__
 from trac.config import BoolOption, ExtensionOption, IntOption, Option
 from trac.core import *
-from trac.util.text import CRLF, fix_eol
+from trac.util.text import CRLF, EMAIL_LOOKALIKE_PATTERN, fix_eol
 from trac.util.translation import _, deactivate, reactivate
 
 MAXHEADERLEN = 76
-EMAIL_LOOKALIKE_PATTERN = (
-        # the local part
-        r"[a-zA-Z0-9.'+_-]+" '@'
-        # the domain name part (RFC:1035)
-        '(?:[a-zA-Z0-9_-]+\.)+' # labels (but also allow '_')
-        '[a-zA-Z](?:[-a-zA-Z\d]*[a-zA-Z\d])?' # TLD
-        )
 
 
 class IEmailSender(Interface):
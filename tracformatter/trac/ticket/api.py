@@ -27,7 +27,8 @@ from trac.resource import IResourceManager
 from trac.util import Ranges, as_int
 from trac.util.text import shorten_line
 from trac.util.translation import _, N_, gettext
-from trac.wiki import IWikiSyntaxProvider, WikiParser
+from trac.wiki.api import IWikiSyntaxProvider
+from trac.wiki.parser import WikiParser
 
 
 class ITicketActionController(Interface):
@@ -40,7 +40,8 @@ from trac.web.chrome import (INavigationContributor, Chrome,
                              add_ctxtnav, add_link, add_notice, add_script,
                              add_stylesheet, add_warning, auth_link,
                              web_context)
-from trac.wiki import IWikiSyntaxProvider, WikiParser
+from trac.wiki.api import IWikiSyntaxProvider
+from trac.wiki.parser import WikiParser
 
 
 
@@ -1076,7 +1076,6 @@ def pathjoin(*args):
 # Imports for backward compatibility (at bottom to avoid circular dependencies)
 from trac.core import TracError
 from trac.util.compat import reversed
-from trac.util.html import escape, unescape, Markup, Deuglifier
 from trac.util.text import CRLF, to_utf8, shorten_line, wrap, pretty_size
 from trac.util.datefmt import pretty_timedelta, format_datetime, \
                               format_date, format_time, \
@@ -32,6 +32,14 @@ from trac.util.translation import _
 
 CRLF = '\r\n'
 
+EMAIL_LOOKALIKE_PATTERN = (
+        # the local part
+        r"[a-zA-Z0-9.'+_-]+" '@'
+        # the domain name part (RFC:1035)
+        '(?:[a-zA-Z0-9_-]+\.)+' # labels (but also allow '_')
+        '[a-zA-Z](?:[-a-zA-Z\d]*[a-zA-Z\d])?' # TLD
+        )
+
 class Empty(unicode):
     """A special tag object evaluating to the empty string"""
     __slots__ = []
@@ -18,8 +18,6 @@ from __future__ import with_statement
 import pkg_resources
 import re
 
-from genshi.builder import tag
-
 from trac.util.concurrency import ThreadLocal, threading
 from trac.util.compat import cleandoc
 
@@ -55,6 +53,7 @@ def dngettext_noop(domain, singular, plural, num, **kwargs):
 
 _param_re = re.compile(r"%\((\w+)\)(?:s|[\d]*d|\d*.?\d*[fg])")
 def _tag_kwargs(trans, kwargs):
+    from genshi.builder import tag
     trans_elts = _param_re.split(trans)
     for i in xrange(1, len(trans_elts), 2):
         trans_elts[i] = kwargs.get(trans_elts[i], '???')
@@ -49,7 +49,8 @@ from trac.web import IRequestHandler, RequestDone
 from trac.web.chrome import (Chrome, INavigationContributor, add_ctxtnav, 
                              add_link, add_script, add_stylesheet, 
                              prevnext_nav, web_context)
-from trac.wiki import IWikiSyntaxProvider, WikiParser
+from trac.wiki.api import IWikiSyntaxProvider
+from trac.wiki.parser import WikiParser
 from trac.wiki.formatter import format_to
 
 
@@ -36,7 +36,8 @@ from trac.web import IRequestHandler
 from trac.web.chrome import (Chrome, INavigationContributor, add_ctxtnav,
                              add_link, add_script, add_script_data,
                              add_stylesheet, auth_link, web_context)
-from trac.wiki import IWikiSyntaxProvider, WikiParser 
+from trac.wiki.api import IWikiSyntaxProvider
+from trac.wiki.parser import WikiParser
 
 
 class LogModule(Component):
@@ -1,5 +1,5 @@
-from trac.wiki.api import *
+# Only the parser and the formatter are imported here, as that is all
+# trac_to_github() needs. The other modules pull in genshi and the web stack;
+# import them from trac.wiki.api, trac.wiki.intertrac and trac.wiki.model.
 from trac.wiki.formatter import *
-from trac.wiki.intertrac import *
-from trac.wiki.model import *
 from trac.wiki.parser import *
@@ -18,28 +18,26 @@
 #         Christopher Lenz <cmlenz@gmx.de>
 #         Christian Boos <cboos@edgewall.org>
 
+import logging
 import re
 import os
+import time
 
 from StringIO import StringIO
+from threading import Lock
 
-from genshi.builder import tag, Element
-from genshi.core import Stream, Markup, escape
-from genshi.input import HTMLParser, ParseError
-from genshi.util import plaintext
-
+# genshi, trac.mimeview, trac.resource and trac.wiki.api are only needed by
+# the HTML processors and the link resolvers, which the conversion to
+# GitHub Markdown rarely reaches. They are imported where they are used
+# so that importing this module stays cheap.
 from trac.core import *
-from trac.mimeview import *
-from trac.resource import get_relative_resource, get_resource_url
 from trac.util import arity
 from trac.util.text import exception_to_unicode, shorten_line, to_unicode, \
                            unicode_quote, unicode_quote_plus, unquote_label
-from trac.util.html import TracHTMLSanitizer
 from trac.util.translation import _
-from trac.wiki.api import WikiSystem, parse_args, unquote_label
 from trac.wiki.parser import WikiParser, parse_processor_args
 
-__all__ = ['trac_to_github']
+__all__ = ['trac_to_github', 'set_svn_cache']
 
 
 _gitpath=None
@@ -59,8 +57,25 @@ def trac_to_github(text, gitpath=None, currentticket=None):
 
 
 def system_message(msg, text=None):
-    return tag.div(tag.strong(msg), text and tag.pre(text),
-                   class_="system-message")
+    """Render an error as Markdown: `msg` in bold, `text` as code block."""
+    if text:
+        return u"**%s**\n```\n%s\n```\n" % (msg, text)
+    return u"**%s**" % msg
+
+
+def escape_markup(text, quotes=True):
+    """Plain string version of `genshi.core.escape`.
+
+    >>> escape_markup(u'<a href="x">&</a>')
+    u'&lt;a href=&#34;x&#34;&gt;&amp;&lt;/a&gt;'
+    >>> escape_markup(u'"quoted"', False)
+    u'"quoted"'
+    """
+    text = text.replace(u'&', u'&amp;').replace(u'<', u'&lt;') \
+               .replace(u'>', u'&gt;')
+    if quotes:
+        text = text.replace(u'"', u'&#34;')
+    return text
 
 
 def split_url_into_path_query_fragment(target):
@@ -110,7 +125,16 @@ def concat_path_query_fragment(path, query, fragment=None):
         f = fragment
     return p + q + ('' if f == '#' else f)
 
+def _markup(text=''):
+    from genshi.core import Markup
+    return Markup(text)
+
+
 def _markup_to_unicode(markup):
+    if type(markup) is unicode:
+        return markup
+    from genshi.builder import Element
+    from genshi.core import Stream
     stream = None
     if isinstance(markup, Element):
         stream = markup.generate()
@@ -125,11 +149,68 @@ class ProcessorError(TracError):
     pass
 
 
+_code_block_re = re.compile('^<div(?:\s+class="([^"]+)")?>(.*)</div>$')
+_block_elem_re = re.compile(r'^\s*<(?:div|table)(?:\s+[^>]+)?>', re.I | re.M)
+
+def _html_is_inline(text):
+    """Whether the `{{{#!html ...}}}` block `text` starts with an inline
+    element."""
+    if text:
+        tag = text[1:].lstrip()
+        idx = tag.find(' ')
+        if idx > -1:
+            tag = tag[:idx]
+        return tag.lower() in ('a', 'span', 'bdo', 'img',
+                               'big', 'small', 'font',
+                               'tt', 'i', 'b', 'u', 's', 'strike',
+                               'em', 'strong', 'dfn', 'code', 'q',
+                               'samp', 'kbd', 'var', 'cite', 'abbr',
+                               'acronym', 'sub', 'sup')
+
+def _ensure_inline(text):
+    """Make the result `text` of an inline processor fit into a paragraph.
+
+    genshi is only imported if `text` is not plain unicode already.
+    """
+    content_for_span = None
+    interrupt_paragraph = False
+    is_element = False
+    if type(text) is not unicode:
+        from genshi.builder import Element
+        is_element = isinstance(text, Element)
+    if is_element:
+        tagname = text.tag.lower()
+        if tagname == 'div':
+            class_ = text.attrib.get('class', '')
+            if class_ and 'code' in class_:
+                content_for_span = text.children
+            else:
+                interrupt_paragraph = True
+        elif tagname == 'table':
+            interrupt_paragraph = True
+    else:
+        # FIXME: do something smarter for Streams
+        text = _markup_to_unicode(text)
+        match = re.match(_code_block_re, text)
+        if match:
+            if match.group(1) and 'code' in match.group(1):
+                content_for_span = match.group(2)
+            else:
+                interrupt_paragraph = True
+        elif re.match(_block_elem_re, text):
+            interrupt_paragraph = True
+    if content_for_span:
+        from genshi.builder import tag
+        text = tag.span(class_='code-block')(*content_for_span)
+    elif interrupt_paragraph:
+        text = "</p>%s<p>" % _markup_to_unicode(text)
+    return text
+
+
 class WikiProcessor(object):
 
-    _code_block_re = re.compile('^<div(?:\s+class="([^"]+)")?>(.*)</div>$')
-    _block_elem_re = re.compile(r'^\s*<(?:div|table)(?:\s+[^>]+)?>',
-                                re.I | re.M)
+    _code_block_re = _code_block_re
+    _block_elem_re = _block_elem_re
 
 
     GITHUBLANGS = set([
@@ -236,6 +317,7 @@ class WikiProcessor(object):
         
         if not self.processor:
             # Find a matching wiki macro
+            from trac.wiki.api import WikiSystem
             for macro_provider in WikiSystem(self.env).macro_providers:
                 for macro_name in macro_provider.get_macros() or []:
                     if self.name == macro_name:
@@ -267,34 +349,23 @@ class WikiProcessor(object):
     # inline checks
 
     def _html_is_inline(self, text):
-        if text:
-            tag = text[1:].lstrip()
-            idx = tag.find(' ')
-            if idx > -1:
-                tag = tag[:idx]
-            return tag.lower() in ('a', 'span', 'bdo', 'img',
-                                   'big', 'small', 'font',
-                                   'tt', 'i', 'b', 'u', 's', 'strike',
-                                   'em', 'strong', 'dfn', 'code', 'q',
-                                   'samp', 'kbd', 'var', 'cite', 'abbr',
-                                   'acronym', 'sub', 'sup')
+        return _html_is_inline(text)
     # builtin processors
 
     def _comment_processor(self, text):
         return ''
 
     def _default_processor(self, text):
-        if self.name.lower() in self.GITHUBLANGS:
-            langtoken = self.name
-        else:
-            langtoken = ''
-        return u"```%s\n%s```\n" % (langtoken, text)
+        return get_processor(self.name).process(text)
 
     def _CommitTicketReference_processor(self, text):
         # just convert the contents as normal
         return trac_to_github(text)
 
     def _html_processor(self, text):
+        from genshi.core import Stream, Markup, escape
+        from genshi.input import HTMLParser, ParseError
+        from trac.wiki.api import WikiSystem
         if WikiSystem(self.env).render_unsafe_content:
             return Markup(text)
         try:
@@ -310,11 +381,14 @@ class WikiProcessor(object):
         if "--" in text:
             return system_message(_('Error: Forbidden character sequence '
                                     '"--" in htmlcomment wiki code block'))
-        return Markup('<!--\n%s-->\n' % text)
+        return _markup('<!--\n%s-->\n' % text)
         
     def _elt_processor(self, eltname, format_to, text):
         # Note: as long as _processor_param_re is not re.UNICODE, **args is OK.
         # Also, parse_args is using strict mode when processing [[span(...)]].
+        from genshi.builder import tag
+        from genshi.core import Stream
+        from trac.wiki.api import WikiSystem
         elt = getattr(tag, eltname)(**(self.args or {}))
         if not WikiSystem(self.env).render_unsafe_content:
             sanitized_elt = getattr(tag, eltname)
@@ -338,6 +412,7 @@ class WikiProcessor(object):
         return self._elt_processor('div', format_to_html, text)
 
     def _span_processor(self, text):
+        from trac.wiki.api import parse_args
         if self.args is None:
             args, self.args = parse_args(text, strict=True)
             text = ', '.join(args)
@@ -393,7 +468,7 @@ class WikiProcessor(object):
             raise ProcessorError(_("!#%(name)s must contain at least one table"
                                    " cell (and table cells only)",
                                    name=self.name))
-        return Markup(match.group(1 if self.name == 'table' else 2))
+        return _markup(match.group(1 if self.name == 'table' else 2))
 
     def _format_row(self, env, context, text):
         if text:
@@ -428,15 +503,15 @@ class WikiProcessor(object):
                                                     text)
 
     def _mimeview_processor(self, text):
+        from trac.mimeview.api import Mimeview
         return Mimeview(self.env).render(self.formatter.context,
                                          self.name, text)
     # TODO: use convert('text/html') instead of render
 
     def process(self, text, in_paragraph=False):
         if self.error:
-            text = system_message(tag('Error: Failed to load processor ',
-                                      tag.code(self.name)),
-                                  self.error)
+            text = system_message(u'Error: Failed to load processor `%s`'
+                                  % self.name, self.error)
         else:
             text = self.processor(text)
         return text or ''
@@ -448,34 +523,103 @@ class WikiProcessor(object):
             return self.inline_check
 
     def ensure_inline(self, text):
-        content_for_span = None
-        interrupt_paragraph = False
-        if isinstance(text, Element):
-            tagname = text.tag.lower()
-            if tagname == 'div':
-                class_ = text.attrib.get('class', '')
-                if class_ and 'code' in class_:
-                    content_for_span = text.children
-                else:
-                    interrupt_paragraph = True
-            elif tagname == 'table':
-                interrupt_paragraph = True
-        else:
-            # FIXME: do something smarter for Streams
-            text = _markup_to_unicode(text)
-            match = re.match(self._code_block_re, text)
-            if match:
-                if match.group(1) and 'code' in match.group(1):
-                    content_for_span = match.group(2)
-                else:
-                    interrupt_paragraph = True
-            elif re.match(self._block_elem_re, text):
-                interrupt_paragraph = True
-        if content_for_span:
-            text = tag.span(class_='code-block')(*content_for_span)
-        elif interrupt_paragraph:
-            text = "</p>%s<p>" % _markup_to_unicode(text)
-        return text
+        return _ensure_inline(text)
+
+
+# Trac processor names (mostly MIME types and their Trac shortcuts) for
+# which GitHub uses a different fence language.
+TRAC_PROCESSOR_LANGS = {
+    'application/javascript': 'javascript',
+    'application/x-sh': 'bash',
+    'c': 'cpp',
+    'c++': 'cpp',
+    'cc': 'cpp',
+    'cfg': 'ini',
+    'hs': 'haskell',
+    'js': 'javascript',
+    'patch': 'diff',
+    'pl': 'perl',
+    'py': 'python',
+    'rb': 'ruby',
+    'sh': 'bash',
+    'text/css': 'css',
+    'text/x-c++src': 'cpp',
+    'text/x-csharp': 'cs',
+    'text/x-csrc': 'cpp',
+    'text/x-diff': 'diff',
+    'text/x-haskell': 'haskell',
+    'text/x-ini': 'ini',
+    'text/x-java': 'java',
+    'text/x-javascript': 'javascript',
+    'text/x-objc': 'objectivec',
+    'text/x-perl': 'perl',
+    'text/x-php': 'php',
+    'text/x-python': 'python',
+    'text/x-ruby': 'ruby',
+    'text/x-sh': 'bash',
+    'text/x-sql': 'sql',
+    'text/x-tex': 'tex',
+    'text/xml': 'xml',
+}
+
+# Lower case processor name -> GitHub fence language
+GITHUB_FENCE_LANGS = dict((lang, lang) for lang in WikiProcessor.GITHUBLANGS)
+GITHUB_FENCE_LANGS.update(TRAC_PROCESSOR_LANGS)
+
+
+class GithubProcessor(object):
+    """Processor producing GitHub Markdown for a `{{{#!name ... }}}` block.
+
+    Unlike `WikiProcessor`, instances only depend on the processor name and
+    are shared by all formatters, see `get_processor`.
+    """
+
+    __slots__ = ('name', 'fence', 'error', '_convert', '_inline_check')
+
+    _inline_checks = {'html': _html_is_inline,
+                      'htmlcomment': True, 'comment': True,
+                      'span': True, 'Span': True}
+
+    def __init__(self, name):
+        self.name = name
+        self.error = None
+        self.fence = GITHUB_FENCE_LANGS.get(name.lower(), '')
+        # contents of commit references are regular wiki text
+        self._convert = name == 'CommitTicketReference'
+        self._inline_check = self._inline_checks.get(name, False)
+
+    def __repr__(self):
+        return '<GithubProcessor %r>' % self.name
+
+    def process(self, text, in_paragraph=False):
+        if self._convert:
+            return trac_to_github(text) or ''
+        return u"```%s\n%s```\n" % (self.fence, text)
+
+    def is_inline(self, text):
+        if callable(self._inline_check):
+            return self._inline_check(text)
+        return self._inline_check
+
+    def ensure_inline(self, text):
+        return _ensure_inline(text)
+
+
+# Only processors with a known name are shared, so names made up in wiki
+# text cannot grow the cache.
+_processors = dict((name, GithubProcessor(name))
+                   for name in set(GITHUB_FENCE_LANGS) |
+                               set(GithubProcessor._inline_checks) |
+                               set(['default', 'CommitTicketReference',
+                                    'MacroList']))
+
+def get_processor(name):
+    """Return the `GithubProcessor` for the processor `name`, which is
+    shared unless `name` is unknown."""
+    processor = _processors.get(name)
+    if processor is None:
+        processor = GithubProcessor(name)
+    return processor
 
 
 from trac.core import Component, ComponentManager
@@ -487,7 +631,156 @@ class FakeEnvironment(Component, ComponentManager):
     def component_activated(self, comp):
         comp.env = self
 
-_svn_cache = {}        
+def _git_storage(gitpath):
+    """PyGIT storage for the git repository or work tree at `gitpath`.
+
+    The storage is shared by all formatters, so lookups reuse its git
+    processes instead of spawning one each, and the current directory is
+    left alone.
+    """
+    from tracopt.versioncontrol.git.PyGIT import StorageFactory
+    git_dir = os.path.join(gitpath, '.git')
+    if not os.path.isdir(git_dir):
+        git_dir = gitpath # bare repository
+    return StorageFactory(git_dir, logging.getLogger(__name__),
+                          weak=False).getInstance()
+
+
+# seconds after which svn revisions without git commit are looked up again
+SVN_CACHE_NEGATIVE_TTL = 3600
+
+_svn_cache_path = None
+_svn_cache_negative_ttl = SVN_CACHE_NEGATIVE_TTL
+_svn_caches = {} # SvnRevisionCache by git path
+
+
+class SvnRevisionCache(object):
+    """Git commits of the svn revisions of the repository at `git_dir`.
+
+    The commits are kept in memory and, if `path` is given, in a SQLite
+    database which any number of converting processes can share. Entries
+    are only used as long as HEAD of the repository is `head`, and those of
+    an older HEAD are dropped when the cache is opened. Revisions without
+    commit are looked up again after `negative_ttl` seconds, because git-svn
+    may have fetched them in the meantime.
+    """
+
+    def __init__(self, path, git_dir, head,
+                 negative_ttl=SVN_CACHE_NEGATIVE_TTL):
+        self.git_dir = os.path.abspath(git_dir)
+        self.head = head
+        self.negative_ttl = negative_ttl
+        self._revs = {}
+        self._lock = Lock()
+        self._db = None
+        if path:
+            import sqlite3
+            self._db = sqlite3.connect(path, timeout=60,
+                                       isolation_level=None,
+                                       check_same_thread=False)
+            self._db.execute("BEGIN IMMEDIATE")
+            try:
+                self._db.execute("""
+                    CREATE TABLE IF NOT EXISTS svn_commit (
+                        git_dir TEXT, svn_rev INTEGER, sha TEXT, head TEXT,
+                        checked REAL, PRIMARY KEY (git_dir, svn_rev))""")
+                self._db.execute("""
+                    CREATE TABLE IF NOT EXISTS svn_head (
+                        git_dir TEXT PRIMARY KEY, head TEXT)""")
+                row = self._db.execute(
+                    "SELECT head FROM svn_head WHERE git_dir=?",
+                    (self.git_dir,)).fetchone()
+                if row is None or row[0] != head:
+                    self._db.execute(
+                        "DELETE FROM svn_commit WHERE git_dir=?",
+                        (self.git_dir,))
+                    self._db.execute(
+                        "INSERT OR REPLACE INTO svn_head VALUES (?, ?)",
+                        (self.git_dir, head))
+                self._db.execute("COMMIT")
+            except:
+                self._db.execute("ROLLBACK")
+                self._db.close()
+                raise
+
+    def get(self, svn_rev, find):
+        """Sha id of the commit for `svn_rev` or None, calling
+        `find(svn_rev)` unless the result is cached.
+        """
+        svn_rev = int(svn_rev)
+        now = time.time()
+        with self._lock:
+            entry = self._revs.get(svn_rev)
+            if entry is None and self._db is not None:
+                # entries of processes still at an older HEAD are ignored
+                entry = self._db.execute(
+                    "SELECT sha, checked FROM svn_commit "
+                    "WHERE git_dir=? AND svn_rev=? AND head=?",
+                    (self.git_dir, svn_rev, self.head)).fetchone()
+            if entry is not None and \
+                    (entry[0] is not None or
+                     now - entry[1] < self.negative_ttl):
+                self._revs[svn_rev] = entry
+                return entry[0] and str(entry[0])
+        sha = find(svn_rev)
+        with self._lock:
+            self._revs[svn_rev] = (sha, now)
+            if self._db is not None:
+                self._db.execute(
+                    "INSERT OR REPLACE INTO svn_commit VALUES (?, ?, ?, ?, ?)",
+                    (self.git_dir, svn_rev, sha, self.head, now))
+        return sha
+
+    def close(self):
+        if self._db is not None:
+            self._db.close()
+            self._db = None
+
+
+def set_svn_cache(path, negative_ttl=SVN_CACHE_NEGATIVE_TTL):
+    """Keep the git commits of svn revisions in the SQLite database at
+    `path`, or only in memory if `path` is None, see `SvnRevisionCache`.
+    """
+    global _svn_cache_path, _svn_cache_negative_ttl
+    for cache in _svn_caches.values():
+        cache.close()
+    _svn_caches.clear()
+    # headings may link revisions looked up in the previous cache
+    _heading_cache.clear()
+    _svn_cache_path = path
+    _svn_cache_negative_ttl = negative_ttl
+
+def _svn_cache(gitpath):
+    cache = _svn_caches.get(gitpath)
+    if cache is None:
+        storage = _git_storage(gitpath)
+        head = storage.repo.rev_parse('--verify', 'HEAD').strip()
+        cache = SvnRevisionCache(_svn_cache_path, storage.git_dir, head,
+                                 _svn_cache_negative_ttl)
+        _svn_caches[gitpath] = cache
+    return cache
+
+
+# Markdown of heading texts, see `Formatter._format_heading`
+_heading_cache = {}
+_HEADING_CACHE_SIZE = 1000
+
+# ticket and revision references depend on the current ticket and git path
+_heading_context_re = re.compile(r'\d')
+
+_md_link_re = re.compile(r'\[([^\]]*)\]\([^)]*\)')
+_github_anchor_re = re.compile(r'[^\w\- ]+', re.UNICODE)
+
+def github_anchor(heading):
+    """Return the anchor GitHub generates for the Markdown `heading`.
+
+    >>> github_anchor(u'Some **bold** [link](http://example.com) text!')
+    u'some-bold-link-text'
+    """
+    text = _md_link_re.sub(r'\1', heading)
+    text = _github_anchor_re.sub('', text.strip().lower())
+    return text.replace(' ', '-')
+
 
 class Formatter(object):
     """Base Wiki formatter.
@@ -502,11 +795,17 @@ class Formatter(object):
     QUOTED_STRING = WikiParser.QUOTED_STRING
     LINK_SCHEME = WikiParser.LINK_SCHEME
 
-    def __init__(self):
-        """Note: `req` is still temporarily used."""
+    def __init__(self, track_anchors=False):
+        """Note: `req` is still temporarily used.
+
+        If `track_anchors` is set, the anchors of all headings are collected
+        in `anchors` and made unique within the document.
+        """
         self.env = FakeEnvironment()
         self.wikiparser = WikiParser(self.env)
-        self._anchors = {}
+        self._anchors = [] if track_anchors else None
+        self._anchor_suffixes = {} # anchor -> next suffix to try for it
+        self._oneliner = None
         self._open_tags = []
         self._safe_schemes = None            
 
@@ -607,22 +906,10 @@ class Formatter(object):
         return match
 
     def git_commit_from_svn_rev(self, svn_rev):
-        if svn_rev in _svn_cache:
-            return _svn_cache[svn_rev]
-        # Find git commit for svn revision
-        val = self._command_from_trunk([
-            'git',
-            'log',
-            '--no-color',
-            '--pretty=format:%H',
-            '--grep=git-svn-id: .*trunk@%s ' % svn_rev])[0] or None
-        _svn_cache[svn_rev] = val
-        return val
-
-    def _command_from_trunk(self, cmd):
-        os.chdir(_gitpath)
-        from subprocess import Popen, PIPE
-        return Popen(cmd, stdout=PIPE, stderr=PIPE).communicate()        
+        # Find git commit for svn revision of the trunk, from the rev_map
+        # of git-svn if possible
+        return _svn_cache(_gitpath).get(
+            svn_rev, _git_storage(_gitpath).get_svn_commit)
 
     def _indirect_tag_handler(self, match, tag):
         """Handle binary inline style tags (indirect way, 0.12)"""
@@ -670,7 +957,7 @@ class Formatter(object):
         return u"```%s```" % fullmatch.group('inline')
 
     def _inlinecode2_formatter(self, match, fullmatch):
-        return tag.tt(fullmatch.group('inline2'))
+        return u"`%s`" % fullmatch.group('inline2')
 
     # pre-0.12 public API (no longer used by Trac itself but kept for plugins)
 
@@ -764,6 +1051,8 @@ class Formatter(object):
             elif path.startswith('/'):
                 path = self.href + path
             else:
+                from trac.resource import get_relative_resource, \
+                                          get_resource_url
                 resource = get_relative_resource(self.resource, path)
                 path = get_resource_url(self.env, resource, self.href)
                 if resource.id:
@@ -773,8 +1062,8 @@ class Formatter(object):
                         target = '/' + target   # Avoid wiki page scoping
                     return self._make_link(resource.realm, target, match,
                                            label, fullmatch)
-            return tag.a(label, 
-                         href=concat_path_query_fragment(path, query, fragment))
+            return u"[%s](%s)" % (label, concat_path_query_fragment(path, query,
+                                                                fragment))
         else:
             return self._make_link(ns or 'wiki', target or '', match, label,
                                    fullmatch)
@@ -785,10 +1074,10 @@ class Formatter(object):
         if ns in self.wikiparser.link_resolvers:
             resolver = self.wikiparser.link_resolvers[ns]
             if arity(resolver) == 5:
-                return resolver(self, ns, target, escape(label, False),
+                return resolver(self, ns, target, escape_markup(label, False),
                                 fullmatch)
             else:
-                return resolver(self, ns, target, escape(label, False))
+                return resolver(self, ns, target, escape_markup(label, False))
         elif ns == "mailto":
             from trac.web.chrome import Chrome
             chrome = Chrome(self.env)
@@ -805,11 +1094,11 @@ class Formatter(object):
             if self._safe_schemes is None or ns in self._safe_schemes:
                 return self._make_ext_link(ns + ':' + target, label)
             else:
-                return escape(match)
+                return escape_markup(match)
         else:
             return self._make_intertrac_link(ns, target, label) or \
                    self._make_interwiki_link(ns, target, label) or \
-                   escape(match)
+                   escape_markup(match)
 
     def _make_intertrac_link(self, ns, target, label):
         res = self.get_intertrac_url(ns, target)
@@ -858,17 +1147,12 @@ class Formatter(object):
             return self._make_ext_link(url, label, title)
 
     def _make_ext_link(self, url, text, title=''):
-        local_url = self.env.project_url or \
-                    (self.req or self.env).abs_href.base
-        if not url.startswith(local_url):
-            return tag.a(tag.span(u'\u200b', class_="icon"), text,
-                         class_="ext-link", href=url, title=title or None)
-        else:
-            return tag.a(text, href=url, title=title or None)
+        if title:
+            return u'[%s](%s "%s")' % (text, url, title.replace(u'"', u"'"))
+        return u"[%s](%s)" % (text, url)
 
     def _make_mail_link(self, url, text, title=''):
-        return tag.a(tag.span(u'\u200b', class_="icon"), text,
-                     class_="mail-link", href=url, title=title or None)
+        return self._make_ext_link(url, text, title)
 
     # Anchors
     
@@ -897,12 +1181,12 @@ class Formatter(object):
             if name.lower() == 'br' or name == '?':
                 macro = None
             else:
-                macro = WikiProcessor(self, (name, name[:-1])[macrolist])
+                macro = get_processor((name, name[:-1])[macrolist])
                 if macro.error:
                     macro = False
             if macro is not False:
                 if macrolist:
-                    macro = WikiProcessor(self, 'MacroList')
+                    macro = get_processor('MacroList')
                 return self._macro_formatter(match, fullmatch, macro)
         fullmatch = WikiParser._creolelink_re.match(macro_or_link)
         return self._lhref_formatter(match, fullmatch)
@@ -925,32 +1209,52 @@ class Formatter(object):
 
     # Headings
 
-    def _parse_heading(self, match, fullmatch, shorten):
-        match = match.strip()
+    @property
+    def anchors(self):
+        """Anchors of the headings formatted so far (`None` if not tracked)"""
+        return self._anchors
+
+    def _format_heading(self, htext, shorten=False):
+        """Format the inline markup of a heading text directly to Markdown"""
+        key = (htext, shorten)
+        if _heading_context_re.search(htext):
+            key += (_currentticket, _gitpath)
+        heading = _heading_cache.get(key)
+        if heading is None:
+            if self._oneliner is None:
+                self._oneliner = OneLinerFormatter()
+            out = StringIO()
+            self._oneliner.format(htext, out, shorten)
+            heading = to_unicode(out.getvalue())
+            if len(_heading_cache) >= _HEADING_CACHE_SIZE:
+                _heading_cache.clear()
+            _heading_cache[key] = heading
+        return heading
 
+    def _parse_heading(self, match, fullmatch, shorten):
         hdepth = fullmatch.group('hdepth')
         depth = len(hdepth)
-        anchor = fullmatch.group('hanchor') or ''
         htext = fullmatch.group('htext').strip()
         if htext.endswith(hdepth):
             htext = htext[:-depth]
-        heading = format_to_oneliner(self.env, None, htext, False)
-        if anchor:
-            anchor = anchor[1:]
-        else:
-            sans_markup = plaintext(heading, keeplinebreaks=False)
-            anchor = WikiParser._anchor_re.sub('', sans_markup)
-            if not anchor or anchor[0].isdigit() or anchor[0] in '.-':
-                # an ID must start with a Name-start character in XHTML
-                anchor = 'a' + anchor # keeping 'a' for backward compat
-        i = 1
-        anchor_base = anchor
-        while anchor in self._anchors:
-            anchor = anchor_base + str(i)
-            i += 1
-        self._anchors[anchor] = True
-        if shorten:
-            heading = format_to_oneliner(self.env, None, htext, True)
+        heading = self._format_heading(htext, shorten)
+        anchor = None
+        if self._anchors is not None:
+            anchor = fullmatch.group('hanchor')
+            if anchor:
+                anchor = anchor[1:]
+            else:
+                anchor = github_anchor(self._format_heading(htext)
+                                       if shorten else heading)
+            anchor_base = anchor
+            i = self._anchor_suffixes.get(anchor_base)
+            if i is not None:
+                while anchor in self._anchor_suffixes:
+                    anchor = '%s-%d' % (anchor_base, i)
+                    i += 1
+                self._anchor_suffixes[anchor_base] = i
+            self._anchor_suffixes.setdefault(anchor, 1)
+            self._anchors.append(anchor)
         return (depth, heading, anchor)
 
     def _heading_formatter(self, match, fullmatch):
@@ -1259,8 +1563,7 @@ class Formatter(object):
             if self.in_code_block == 1:
                 name = startmatch.group(2)
                 if name:
-                    args = parse_processor_args(line[startmatch.end():])
-                    self.code_processor = WikiProcessor(self, name, args)
+                    self.code_processor = get_processor(name)
                 else:
                     self.code_processor = None
                 self.code_buf = []
@@ -1268,7 +1571,7 @@ class Formatter(object):
             else:
                 self.code_buf.append(line)
                 if not self.code_processor:
-                    self.code_processor = WikiProcessor(self, 'default')
+                    self.code_processor = get_processor('default')
         elif line.strip() == WikiParser.ENDBLOCK:
             self.in_code_block -= 1
             if self.in_code_block == 0 and self.code_processor:
@@ -1292,12 +1595,10 @@ class Formatter(object):
             match = WikiParser._processor_re.match(line)
             if match:
                 self.code_prefix = match.group(1)
-                name = match.group(2)
-                args = parse_processor_args(line[match.end():])
-                self.code_processor = WikiProcessor(self, name, args)
+                self.code_processor = get_processor(match.group(2))
             else:
                 self.code_buf.append(line)
-                self.code_processor = WikiProcessor(self, 'default')
+                self.code_processor = get_processor('default')
         else:
             self.code_buf.append(line)
 
@@ -1325,7 +1626,7 @@ class Formatter(object):
             if match and not itype in self.wikiparser.helper_patterns:
                 # Check for preceding escape character '!'
                 if match[0] == '!':
-                    return escape(match[1:])
+                    return escape_markup(match[1:])
                 if itype in self.wikiparser.external_handlers:
                     external_handler = self.wikiparser.external_handlers[itype]
                     return external_handler(self, match, fullmatch)
@@ -1467,11 +1768,11 @@ class OneLinerFormatter(Formatter):
     def _indent_formatter(self, match, fullmatch):
         return match
     def _citation_formatter(self, match, fullmatch):
-        return escape(match, False)
+        return escape_markup(match, False)
     def _heading_formatter(self, match, fullmatch):
-        return escape(match, False)
+        return escape_markup(match, False)
     def _definition_formatter(self, match, fullmatch):
-        return escape(match, False)
+        return escape_markup(match, False)
     def _table_cell_formatter(self, match, fullmatch):
         return match
     def _table_row_sep_formatter(self, match, fullmatch):
@@ -1559,6 +1860,9 @@ class OutlineFormatter(Formatter):
         self.shorten = shorten
         whitespace_indent = '  '
         self.outline = []
+        if self._anchors is None:
+            self._anchors = []
+            self._anchor_suffixes = {}
         Formatter.format(self, text)
 
         if min_depth > max_depth:
@@ -1638,7 +1942,7 @@ class HtmlFormatter(object):
         out = StringIO()
         Formatter(self.env, self.context).format(self.wikidom, out,
                                                  escape_newlines)
-        return Markup(out.getvalue())
+        return _markup(out.getvalue())
 
 
 class InlineHtmlFormatter(object):
@@ -1665,7 +1969,7 @@ class InlineHtmlFormatter(object):
         # FIXME: compatibility code only for now
         out = StringIO()
         OneLinerFormatter().format(self.wikidom, out, shorten)
-        return Markup(out.getvalue())
+        return _markup(out.getvalue())
 
 
 def format_to(env, flavor, context, wikidom, **options):
@@ -1678,21 +1982,21 @@ def format_to(env, flavor, context, wikidom, **options):
 
 def format_to_html(env, context, wikidom, escape_newlines=None):
     if not wikidom:
-        return Markup()
+        return _markup()
     if escape_newlines is None:
         escape_newlines = context.get_hint('preserve_newlines', False)
     return HtmlFormatter(env, context, wikidom).generate(escape_newlines)
 
 def format_to_oneliner(env, context, wikidom, shorten=None):
     if not wikidom:
-        return Markup()
+        return _markup()
     #if shorten is None:
     #    shorten = context.get_hint('shorten_lines', False)
     return InlineHtmlFormatter(env, context, wikidom).generate(shorten)
 
 def extract_link(env, context, wikidom):
     if not wikidom:
-        return Markup()
+        return _markup()
     return LinkFormatter(env, context).match(wikidom)
 
 
@@ -1702,34 +2006,34 @@ def wiki_to_html(wikitext, env, req, db=None,
                  absurls=False, escape_newlines=False):
     """deprecated in favor of format_to_html (will be removed in 1.0)"""
     if not wikitext:
-        return Markup()
+        return _markup()
     abs_ref, href = (req or env).abs_href, (req or env).href
     from trac.web.chrome import web_context
     context = web_context(req, absurls=absurls)
     out = StringIO()
     Formatter(env, context).format(wikitext, out, escape_newlines)
-    return Markup(out.getvalue())
+    return _markup(out.getvalue())
 
 def wiki_to_oneliner(wikitext, env, db=None, shorten=False, absurls=False,
                      req=None):
     """:deprecated: in favor of format_to_oneliner (will be removed in 1.0)"""
     if not wikitext:
-        return Markup()
+        return _markup()
     abs_ref, href = (req or env).abs_href, (req or env).href
     from trac.web.chrome import web_context
     context = web_context(req, absurls=absurls)
     out = StringIO()
     OneLinerFormatter(env, context).format(wikitext, out, shorten)
-    return Markup(out.getvalue())
+    return _markup(out.getvalue())
 
 def wiki_to_outline(wikitext, env, db=None,
                     absurls=False, max_depth=None, min_depth=None, req=None):
     """:deprecated: will be removed in 1.0 and replaced by something else"""
     if not wikitext:
-        return Markup()
+        return _markup()
     abs_ref, href = (req or env).abs_href, (req or env).href
     from trac.web.chrome import web_context
     context = web_context(req, absurls=absurls)
     out = StringIO()
     OutlineFormatter(env, context).format(wikitext, out, max_depth, min_depth)
-    return Markup(out.getvalue())
+    return _markup(out.getvalue())
@@ -21,7 +21,7 @@
 import re
 
 from trac.core import *
-from trac.notification import EMAIL_LOOKALIKE_PATTERN
+from trac.util.text import EMAIL_LOOKALIKE_PATTERN
 
 
 # Trac normally does these as well:
@@ -78,6 +78,10 @@ GITHUB_CONVERTED = set([
     'shref',
     'shrefbr',
 ])
+# Rules contributed by IWikiSyntaxProviders are named 'i0', 'i1' and so on;
+# the providers only need to be looked up if any of them is converted.
+_GITHUB_CONVERTS_SYNTAX_PROVIDERS = any(re.match(r'i\d+$', name)
+                                        for name in GITHUB_CONVERTED)
 #helpers:
 """
     'hanchor',
@@ -264,14 +268,18 @@ class WikiParser(Component):
         return self._external_handlers
 
     def _prepare_rules(self):
-        from trac.wiki.api import WikiSystem
         if not self._compiled_rules:
             helper_re = re.compile(r'\?P<([a-z\d_]+)>')
             helpers = []
             handlers = {}
             syntax = [r for r in self._pre_rules if helper_re.search(r).group(1) in GITHUB_CONVERTED]
             i = 0
-            for resolver in WikiSystem(self.env).syntax_providers:
+            if _GITHUB_CONVERTS_SYNTAX_PROVIDERS:
+                from trac.wiki.api import WikiSystem
+                providers = WikiSystem(self.env).syntax_providers
+            else:
+                providers = []
+            for resolver in providers:
                 for regexp, handler in resolver.get_wiki_syntax() or []:
                     name = 'i' + str(i)
                     if name in GITHUB_CONVERTED:
@@ -14,17 +14,23 @@
 
 from __future__ import with_statement
 
+from array import array
+import binascii
 import os
 import codecs
+import cPickle
 from collections import deque
+import itertools
+import mmap
 from contextlib import contextmanager
 import cStringIO
 from functools import partial
 from operator import itemgetter
 import re
+import struct
 from subprocess import Popen, PIPE
 import sys
-from threading import Lock
+from threading import Lock, Thread
 import time
 import weakref
 
@@ -66,6 +72,53 @@ class GitErrorSha(GitError):
 
 # Helper functions
 
+def close_pipe(process):
+    """Close the input of a long-lived git `process` and terminate it."""
+    process.stdin.close()
+    terminate(process)
+    process.wait()
+
+
+def parse_tree(raw):
+    """Parse the raw content of a tree (as given by `git cat-file tree <rev>`).
+
+    Return a list of (mode, kind, sha, name) tuples like `git ls-tree`.
+    """
+    result = []
+    pos = 0
+    while pos < len(raw):
+        space = raw.index(' ', pos)
+        nul = raw.index('\0', space)
+        mode = raw[pos:space].zfill(6)
+        if mode == '040000':
+            kind = 'tree'
+        elif mode == '160000':
+            kind = 'commit' # submodule
+        else:
+            kind = 'blob'
+        result.append((mode, kind, binascii.hexlify(raw[nul + 1:nul + 21]),
+                       raw[space + 1:nul]))
+        pos = nul + 21
+    return result
+
+
+def read_nul_separated(f, block_size=65536):
+    """Iterate over the NUL separated fields of the file `f` while they are
+    read, as output by `git` commands with `-z`.
+    """
+    rest = ''
+    while True:
+        block = os.read(f.fileno(), block_size)
+        if not block:
+            break
+        fields = (rest + block).split('\0')
+        rest = fields.pop()
+        for field in fields:
+            yield field
+    if rest:
+        yield rest
+
+
 def parse_commit(raw):
     """Parse the raw content of a commit (as given by `git cat-file -p <rev>`).
 
@@ -139,11 +192,39 @@ class GitCore(object):
     def cat_file_batch(self):
         return self.__pipe('cat-file', '--batch', stdin=PIPE, stdout=PIPE)
 
+    def cat_file_batch_check(self):
+        return self.__pipe('cat-file', '--batch-check', stdin=PIPE,
+                           stdout=PIPE)
+
     def log_pipe(self, *cmd_args):
         return self.__pipe('log', stdout=PIPE, *cmd_args)
 
+    def log_stdin_pipe(self, *cmd_args):
+        return self.__pipe('log', '--stdin', stdin=PIPE, stdout=PIPE,
+                           *cmd_args)
+
+    def diff_tree_pipe(self, *cmd_args):
+        return self.__pipe('diff-tree', stdin=PIPE, stdout=PIPE, *cmd_args)
+
+    def rev_list_stdin(self, revs, *cmd_args):
+        """execute `git rev-list` with `revs` passed on standard input
+        instead of the command line, which could get too long for them
+
+        raises GitError if git fails
+        """
+        p = self.__pipe('rev-list', '--stdin', stdin=PIPE, stdout=PIPE,
+                        stderr=PIPE, *cmd_args)
+        stdout_data, stderr_data = p.communicate(''.join(rev + '\n'
+                                                         for rev in revs))
+        if p.returncode:
+            raise GitError(stderr_data.strip())
+        return stdout_data
+
     def __getattr__(self, name):
-        if name[0] == '_' or name in ['cat_file_batch', 'log_pipe']:
+        if name[0] == '_' or name in ['cat_file_batch',
+                                      'cat_file_batch_check', 'log_pipe',
+                                      'log_stdin_pipe', 'diff_tree_pipe',
+                                      'rev_list_stdin']:
             raise AttributeError, name
         return partial(self.__execute, name.replace('_','-'))
 
@@ -162,33 +243,367 @@ class GitCore(object):
         return bool(cls.__is_sha_pat.match(sha))
 
 
-class SizedDict(dict):
-    """Size-bounded dictionary with FIFO replacement strategy"""
+class LRUCache(object):
+    """Size-bounded mapping which evicts the least recently used entries
+
+    Unless `max_size` is `None` or 0, at most `max_size` entries are kept
+    and, unless `max_bytes` is `None`, at most `max_bytes` as measured by
+    calling `sizeof` for each value.
+    Lookups with `get()` refresh an entry and are counted as hits or
+    misses, see `stats()`.
+    """
+
+    # entries of the circular list in order of use, the oldest first
+    __PREV, __NEXT, __KEY, __VALUE, __BYTES = range(5)
 
-    def __init__(self, max_size=0):
-        dict.__init__(self)
+    def __init__(self, max_size=None, max_bytes=None, sizeof=len):
         self.__max_size = max_size
-        self.__key_fifo = deque()
+        self.__max_bytes = max_bytes
+        self.__sizeof = sizeof
         self.__lock = Lock()
+        self.__links = {}
+        self.__root = root = []
+        root[:] = [root, root, None, None, 0]
+        self.__bytes = 0
+        self.__hits = self.__misses = self.__evictions = 0
+
+    def __len__(self):
+        return len(self.__links)
 
-    def __setitem__(self, name, value):
+    def __contains__(self, key):
+        return key in self.__links
+
+    def get(self, key, default=None):
+        with self.__lock:
+            link = self.__links.get(key)
+            if link is None:
+                self.__misses += 1
+                return default
+            self.__hits += 1
+            self.__unlink(link)
+            self.__append(link)
+            return link[self.__VALUE]
+
+    def __setitem__(self, key, value):
+        with self.__lock:
+            link = self.__links.pop(key, None)
+            if link is not None:
+                self.__unlink(link)
+                self.__bytes -= link[self.__BYTES]
+            size = self.__sizeof(value) if self.__max_bytes is not None \
+                   else 0
+            link = [None, None, key, value, size]
+            self.__links[key] = link
+            self.__append(link)
+            self.__bytes += size
+
+            while (self.__max_size and
+                   len(self.__links) > self.__max_size) or \
+                    (self.__max_bytes is not None and
+                     self.__bytes > self.__max_bytes):
+                oldest = self.__root[self.__NEXT]
+                self.__unlink(oldest)
+                del self.__links[oldest[self.__KEY]]
+                self.__bytes -= oldest[self.__BYTES]
+                self.__evictions += 1
+
+    def clear(self):
         with self.__lock:
-            assert len(self) == len(self.__key_fifo) # invariant
+            self.__links.clear()
+            self.__root[:] = [self.__root, self.__root, None, None, 0]
+            self.__bytes = 0
+
+    def stats(self):
+        """returns dict with the number of entries (`size`), their `bytes`
+        (0 unless bounded by bytes), the bounds `max_size` and `max_bytes`
+        and the number of `hits`, `misses` and `evictions` so far
+        """
+        with self.__lock:
+            return {'size': len(self.__links), 'max_size': self.__max_size,
+                    'bytes': self.__bytes, 'max_bytes': self.__max_bytes,
+                    'hits': self.__hits, 'misses': self.__misses,
+                    'evictions': self.__evictions}
+
+    def __unlink(self, link):
+        link[self.__PREV][self.__NEXT] = link[self.__NEXT]
+        link[self.__NEXT][self.__PREV] = link[self.__PREV]
+
+    def __append(self, link):
+        last = self.__root[self.__PREV]
+        link[self.__PREV] = last
+        link[self.__NEXT] = self.__root
+        last[self.__NEXT] = self.__root[self.__PREV] = link
+
+
+class CommitGraph(object):
+    """Commit graph stored in a few flat arrays instead of a dict of tuples
+
+    Commits are numbered in the order of `rev_list`, an iterable of
+    [rev, parent1, parent2, ...] lists which names children before their
+    parents. Binary sha ids are stored consecutively, parents and children
+    as index arrays with offsets per commit. Sha ids sorted in `__order`
+    are used to look up commits by sha id or prefix with a binary search.
+
+    Supports the dict operations Storage uses on `RevCache.rev_dict`,
+    whose (children, parents, ordinal_id, rheads) entries are built on
+    access. `head_revs` are the sha ids of the branches.
+    """
+
+    def __init__(self, rev_list, head_revs):
+        index = {}
+        binary_shas = []
+        binary_parents = []
+        for revs in rev_list:
+            index[binascii.unhexlify(revs[0])] = len(binary_shas)
+            binary_shas.append(binascii.unhexlify(revs[0]))
+            binary_parents.append(map(binascii.unhexlify, revs[1:]))
+        count = len(binary_shas)
+        self.__shas = ''.join(binary_shas)
+
+        # parents and children of commit i are the indices from
+        # offsets[i] to offsets[i + 1]; commits missing in the history,
+        # for example in shallow clones, are left out
+        self.__parent_offsets = array('i', [0])
+        self.__parents = array('i')
+        child_counts = array('i', [0]) * count
+        for parents in binary_parents:
+            for parent in parents:
+                parent_index = index.get(parent)
+                if parent_index is not None:
+                    self.__parents.append(parent_index)
+                    child_counts[parent_index] += 1
+            self.__parent_offsets.append(len(self.__parents))
+        binary_parents = index = None
+
+        self.__child_offsets = array('i', [0]) * (count + 1)
+        for i, child_count in enumerate(child_counts):
+            self.__child_offsets[i + 1] = self.__child_offsets[i] + \
+                                          child_count
+        self.__children = array('i', [0]) * len(self.__parents)
+        next_child = array('i', self.__child_offsets[:count])
+        for i in xrange(count):
+            for parent_index in self.__parent_range(i):
+                self.__children[next_child[parent_index]] = i
+                next_child[parent_index] += 1
+
+        # short-rev index
+        self.__order = array('i', sorted(xrange(count),
+                                         key=binary_shas.__getitem__))
+        binary_shas = None
+
+        # distinct rheads tuples are few, so commits only refer to them;
+        # children come first, so their rheads are known for their parents
+        self.__rheads = [()]
+        self.__rhead_ids = array('i', [0]) * count
+        rhead_id_map = {(): 0}
+        for i in xrange(count):
+            rev = self.__hexsha(i)
+            rheads = [rev] if rev in head_revs else []
+            for child_index in self.__child_range(i):
+                for head in self.__rheads[self.__rhead_ids[child_index]]:
+                    if head not in rheads:
+                        rheads.append(head)
+            rheads = tuple(rheads)
+            rhead_id = rhead_id_map.get(rheads)
+            if rhead_id is None:
+                rhead_id = rhead_id_map[rheads] = len(self.__rheads)
+                self.__rheads.append(rheads)
+            self.__rhead_ids[i] = rhead_id
+
+    def __getstate__(self):
+        return (self.__shas, self.__parent_offsets.tostring(),
+                self.__parents.tostring(), self.__child_offsets.tostring(),
+                self.__children.tostring(), self.__order.tostring(),
+                self.__rheads, self.__rhead_ids.tostring())
+
+    def __setstate__(self, state):
+        (self.__shas, parent_offsets, parents, child_offsets, children, order,
+         self.__rheads, rhead_ids) = state
+        self.__parent_offsets = array('i', parent_offsets)
+        self.__parents = array('i', parents)
+        self.__child_offsets = array('i', child_offsets)
+        self.__children = array('i', children)
+        self.__order = array('i', order)
+        self.__rhead_ids = array('i', rhead_ids)
+
+    def __hexsha(self, i):
+        return binascii.hexlify(self.__shas[20 * i:20 * i + 20])
+
+    def __parent_range(self, i):
+        return self.__parents[self.__parent_offsets[i]:
+                              self.__parent_offsets[i + 1]]
+
+    def __child_range(self, i):
+        return self.__children[self.__child_offsets[i]:
+                               self.__child_offsets[i + 1]]
+
+    def __position(self, srev):
+        """returns the first position in `__order` whose sha id is not
+        smaller than the (possibly short) hex sha id `srev`
+        """
+        lo, hi = 0, len(self.__order)
+        srev_len = len(srev)
+        while lo < hi:
+            mid = (lo + hi) // 2
+            if self.__hexsha(self.__order[mid])[:srev_len] < srev:
+                lo = mid + 1
+            else:
+                hi = mid
+        return lo
 
-            if not self.__contains__(name):
-                self.__key_fifo.append(name)
+    def __index(self, rev):
+        """returns the number of commit `rev` or None if it is unknown"""
+        if not isinstance(rev, basestring) or len(rev) != 40:
+            return None
+        position = self.__position(rev)
+        if position < len(self.__order):
+            i = self.__order[position]
+            if self.__hexsha(i) == rev:
+                return i
+        return None
 
-            rc = dict.__setitem__(self, name, value)
+    def __entry(self, i):
+        return (tuple(map(self.__hexsha, self.__child_range(i))),
+                tuple(map(self.__hexsha, self.__parent_range(i))),
+                i + 1, self.__rheads[self.__rhead_ids[i]])
 
-            while len(self.__key_fifo) > self.__max_size:
-                self.__delitem__(self.__key_fifo.popleft())
+    def __len__(self):
+        return len(self.__order)
 
-            assert len(self) == len(self.__key_fifo) # invariant
+    def __contains__(self, rev):
+        return self.__index(rev) is not None
 
-            return rc
+    def __getitem__(self, rev):
+        i = self.__index(rev)
+        if i is None:
+            raise KeyError(rev)
+        return self.__entry(i)
+
+    def get(self, rev, default=None):
+        i = self.__index(rev)
+        return default if i is None else self.__entry(i)
+
+    def __iter__(self):
+        return self.iterkeys()
+
+    def iterkeys(self):
+        for i in xrange(len(self)):
+            yield self.__hexsha(i)
 
-    def setdefault(self, *_):
-        raise NotImplemented("SizedDict has no setdefault() method")
+    def iteritems(self):
+        for i in xrange(len(self)):
+            yield self.__hexsha(i), self.__entry(i)
+
+    def rev_at(self, ordinal_id):
+        """returns the sha id of the commit with `ordinal_id` or None"""
+        if 1 <= ordinal_id <= len(self):
+            return self.__hexsha(ordinal_id - 1)
+        return None
+
+    def heads(self):
+        """returns the sha ids of the commits without children"""
+        return [self.__hexsha(i) for i in xrange(len(self))
+                if self.__child_offsets[i] == self.__child_offsets[i + 1]]
+
+    def rev_list(self):
+        """returns iterator over [rev, parent1, ...] lists in the order of
+        the commits, suitable for creating another CommitGraph
+        """
+        for i in xrange(len(self)):
+            yield [self.__hexsha(i)] + map(self.__hexsha,
+                                           self.__parent_range(i))
+
+    def shortrev(self, rev, min_len):
+        """returns the shortest prefix of `rev` with at least `min_len`
+        characters which no other commit starts with
+        """
+        i = self.__index(rev)
+        if i is None:
+            return None
+        position = self.__position(rev)
+        common_len = 0
+        for neighbour in (position - 1, position + 1):
+            if 0 <= neighbour < len(self.__order):
+                other = self.__hexsha(self.__order[neighbour])
+                other_len = 0
+                while rev[other_len] == other[other_len]:
+                    other_len += 1
+                common_len = max(common_len, other_len)
+        return rev[:max(min_len, common_len + 1)]
+
+    def fullrev(self, srev):
+        """returns the sha id of the only commit starting with `srev` or
+        None"""
+        position = self.__position(srev)
+        order = self.__order
+        if position < len(order) and \
+                self.__hexsha(order[position]).startswith(srev) and \
+                (position + 1 == len(order) or
+                 not self.__hexsha(order[position + 1]).startswith(srev)):
+            return self.__hexsha(order[position])
+        return None
+
+
+class GitSvnRevMap(object):
+    """Map of svn revisions to commit sha ids read from a `.rev_map.<uuid>`
+    file of git-svn
+
+    The file consists of records sorted by revision, each with the revision
+    as 32 bit big-endian number followed by the binary sha id, which is
+    all zero for revisions without a commit. It is memory-mapped and
+    searched binary, and mapped again once git-svn has added revisions.
+    """
+
+    __RECORD_SIZE = 24
+
+    def __init__(self, path):
+        self.path = path
+        self.__data = None
+        self.__size = 0
+        self.__map()
+
+    def __map(self):
+        if self.__data is not None:
+            self.__data.close()
+            self.__data = None
+        with open(self.path, 'rb') as f:
+            self.__size = os.fstat(f.fileno()).st_size
+            if self.__size >= self.__RECORD_SIZE:
+                self.__data = mmap.mmap(f.fileno(), 0,
+                                        access=mmap.ACCESS_READ)
+
+    def __len__(self):
+        return self.__size // self.__RECORD_SIZE
+
+    def get(self, svn_rev):
+        """returns sha id of the commit for `svn_rev` or None"""
+        result = self.__find(svn_rev)
+        if result is None and os.path.getsize(self.path) != self.__size:
+            self.__map()
+            result = self.__find(svn_rev)
+        return result
+
+    def __find(self, svn_rev):
+        lo, hi = 0, len(self)
+        while lo < hi:
+            mid = (lo + hi) // 2
+            offset = mid * self.__RECORD_SIZE
+            [rev] = struct.unpack('>I', self.__data[offset:offset + 4])
+            if rev < svn_rev:
+                lo = mid + 1
+            elif rev > svn_rev:
+                hi = mid
+            else:
+                sha = self.__data[offset + 4:offset + self.__RECORD_SIZE]
+                if sha == '\0' * 20:
+                    return None
+                return binascii.hexlify(sha)
+        return None
+
+    def close(self):
+        if self.__data is not None:
+            self.__data.close()
+            self.__data = None
 
 
 class StorageFactory(object):
@@ -197,14 +612,16 @@ class StorageFactory(object):
     __dict_lock = Lock()
 
     def __init__(self, repo, log, weak=True, git_bin='git',
-                 git_fs_encoding=None):
+                 git_fs_encoding=None, rev_cache_path=None,
+                 compact_rev_cache=False):
         self.logger = log
 
         with StorageFactory.__dict_lock:
             try:
                 i = StorageFactory.__dict[repo]
             except KeyError:
-                i = Storage(repo, log, git_bin, git_fs_encoding)
+                i = Storage(repo, log, git_bin, git_fs_encoding,
+                            rev_cache_path, compact_rev_cache)
                 StorageFactory.__dict[repo] = i
 
                 # create or remove additional reference depending on 'weak'
@@ -233,6 +650,8 @@ class Storage(object):
 
     __SREV_MIN = 4 # minimum short-rev length
 
+    __REV_CACHE_VERSION = 1 # format of RevCache stored on disk
+
 
     class RevCache(tuple):
         """RevCache(youngest_rev, oldest_rev, rev_dict, tag_set, srev_dict,
@@ -338,7 +757,8 @@ class Storage(object):
                            "execute/parse '%s --version' but got %s)"
                            % (git_bin, repr(e)))
 
-    def __init__(self, git_dir, log, git_bin='git', git_fs_encoding=None):
+    def __init__(self, git_dir, log, git_bin='git', git_fs_encoding=None,
+                 rev_cache_path=None, compact_rev_cache=False):
         """Initialize PyGit.Storage instance
 
         `git_dir`: path to .git folder;
@@ -353,6 +773,15 @@ class Storage(object):
                 if `None`, no implicit decoding/encoding to/from
                 unicode objects is performed, and bytestrings are
                 returned instead
+
+        `rev_cache_path`: file to store the revision cache in, so that
+                later instances, even in other processes, only need to
+                add the commits created since; if `None`, the revision
+                cache is built from scratch once per instance
+
+        `compact_rev_cache`: store the commits of the revision cache in a
+                `CommitGraph` instead of a dict, which takes much less
+                memory for big repositories but more time per lookup
         """
 
         self.logger = log
@@ -361,15 +790,31 @@ class Storage(object):
 
         # caches
         self.__rev_cache = None
+        self.__rev_cache_base = None # to extend on next rebuild
+        self.__rev_cache_path = rev_cache_path
+        self.__compact_rev_cache = compact_rev_cache
         self.__rev_cache_lock = Lock()
 
-        # cache the last 200 commit messages
-        self.__commit_msg_cache = SizedDict(200)
+        # cache the last 200 commit messages, but not more than 4 MB of
+        # them
+        self.__commit_msg_cache = LRUCache(200, 4 * 1024 * 1024,
+                                           sizeof=lambda result: len(result[0]))
         self.__commit_msg_lock = Lock()
 
+        # git objects never change, so their sizes can be kept
+        self.__obj_size_cache = LRUCache(10000)
+
         self.__cat_file_pipe = None
         self.__cat_file_pipe_lock = Lock()
 
+        self.__cat_file_check_pipe = None
+        self.__cat_file_check_pipe_lock = Lock()
+
+        # svn revisions of git-svn commits by svn path
+        self.__svn_revs = {}
+        self.__svn_rev_maps = {}
+        self.__svn_revs_lock = Lock()
+
         if git_fs_encoding is not None:
             # validate encoding name
             codecs.lookup(git_fs_encoding)
@@ -395,15 +840,17 @@ class Storage(object):
                            "directory?")
 
         self.repo = GitCore(git_dir, git_bin=git_bin)
+        self.git_dir = git_dir
 
         self.logger.debug("PyGIT.Storage instance %d constructed" % id(self))
 
     def __del__(self):
         with self.__cat_file_pipe_lock:
             if self.__cat_file_pipe is not None:
-                self.__cat_file_pipe.stdin.close()
-                terminate(self.__cat_file_pipe)
-                self.__cat_file_pipe.wait()
+                close_pipe(self.__cat_file_pipe)
+        with self.__cat_file_check_pipe_lock:
+            if self.__cat_file_check_pipe is not None:
+                close_pipe(self.__cat_file_check_pipe)
 
     #
     # cache handling
@@ -425,6 +872,8 @@ class Storage(object):
                 need_update = True # almost NOOP
 
             if need_update:
+                if self.__rev_cache:
+                    self.__rev_cache_base = self.__rev_cache
                 self.__rev_cache = None
 
             return need_update
@@ -432,7 +881,9 @@ class Storage(object):
     def get_rev_cache(self):
         """Retrieve revision cache
 
-        may rebuild cache on the fly if required
+        may rebuild cache on the fly if required; a previous cache, either
+        from before the last sync or stored by an earlier process, is only
+        extended by the commits added since
 
         returns RevCache tuple
         """
@@ -440,115 +891,43 @@ class Storage(object):
         with self.__rev_cache_lock:
             if self.__rev_cache is None:
                 # can be cleared by Storage.__rev_cache_sync()
-                self.logger.debug("triggered rebuild of commit tree db "
-                                  "for %d" % id(self))
                 ts0 = time.time()
 
-                youngest = None
-                oldest = None
-                new_db = {} # db
-                new_sdb = {} # short_rev db
-
-                # helper for reusing strings
-                __rev_seen = {}
-                def __rev_reuse(rev):
-                    rev = str(rev)
-                    return __rev_seen.setdefault(rev, rev)
-
-                new_tags = set(__rev_reuse(rev.strip())
-                               for rev in self.repo.rev_parse('--tags')
-                                                   .splitlines())
-
-                new_branches = [(k, __rev_reuse(v))
-                                for k, v in self._get_branches()]
-                head_revs = set(v for _, v in new_branches)
-
-                rev = ord_rev = 0
-                for ord_rev, revs in enumerate(
-                                        self.repo.rev_list('--parents',
-                                                           '--topo-order',
-                                                           '--all')
-                                                 .splitlines()):
-                    revs = map(__rev_reuse, revs.strip().split())
-
-                    rev = revs[0]
-
-                    # first rev seen is assumed to be the youngest one
-                    if not ord_rev:
-                        youngest = rev
-
-                    # shortrev "hash" map
-                    srev_key = self.__rev_key(rev)
-                    new_sdb.setdefault(srev_key, []).append(rev)
-
-                    # parents
-                    parents = tuple(revs[1:])
-
-                    # new_db[rev] = (children(rev), parents(rev),
-                    #                ordinal_id(rev), rheads(rev))
-                    if rev in new_db:
-                        # (incomplete) entry was already created by children
-                        _children, _parents, _ord_rev, _rheads = new_db[rev]
-                        assert _children
-                        assert not _parents
-                        assert _ord_rev == 0
-
-                        if rev in head_revs and rev not in _rheads:
-                            _rheads.append(rev)
-
-                    else: # new entry
-                        _children = []
-                        _rheads = [rev] if rev in head_revs else []
-
-                    # create/update entry
-                    # transform lists into tuples since entry will be final
-                    new_db[rev] = tuple(_children), tuple(parents), \
-                                  ord_rev + 1, tuple(_rheads)
-
-                    # update parents(rev)s
-                    for parent in parents:
-                        # by default, a dummy ordinal_id is used
-                        # for the mean-time
-                        _children, _parents, _ord_rev, _rheads2 = \
-                            new_db.setdefault(parent, ([], [], 0, []))
-
-                        # update parent(rev)'s children
-                        if rev not in _children:
-                            _children.append(rev)
-
-                        # update parent(rev)'s rheads
-                        for rev in _rheads:
-                            if rev not in _rheads2:
-                                _rheads2.append(rev)
-
-                # last rev seen is assumed to be the oldest
-                # one (with highest ord_rev)
-                oldest = rev
-
-                __rev_seen = None
-
-                # convert sdb either to dict or array depending on size
-                tmp = [()]*(max(new_sdb.keys())+1) \
-                      if len(new_sdb) > 5000 else {}
-
-                try:
-                    while True:
-                        k, v = new_sdb.popitem()
-                        tmp[k] = tuple(v)
-                except KeyError:
-                    pass
-
-                assert len(new_sdb) == 0
-                new_sdb = tmp
+                new_cache = None
+                # the cache from before the last sync may still be in use
+                old_cache = self.__rev_cache_base
+                shared = old_cache is not None
+                if not shared:
+                    old_cache = self.__load_rev_cache()
+                if old_cache is not None and \
+                        isinstance(old_cache.rev_dict, CommitGraph) != \
+                        self.__compact_rev_cache:
+                    self.logger.debug("ignored commit tree db of other "
+                                      "format for %d" % id(self))
+                    old_cache = None
+                if old_cache is not None and old_cache.youngest_rev:
+                    self.logger.debug("triggered extension of commit tree db "
+                                      "for %d" % id(self))
+                    new_cache = self.__extended_rev_cache(old_cache, shared)
+                if new_cache is None:
+                    self.logger.debug("triggered rebuild of commit tree db "
+                                      "for %d" % id(self))
+                    if self.__compact_rev_cache:
+                        new_cache = self.__built_compact_rev_cache()
+                    else:
+                        new_cache = self.__built_rev_cache()
 
                 # atomically update self.__rev_cache
-                self.__rev_cache = Storage.RevCache(youngest, oldest, new_db,
-                                                    new_tags, new_sdb,
-                                                    new_branches)
+                self.__rev_cache = new_cache
+                self.__rev_cache_base = None
                 ts1 = time.time()
                 self.logger.debug("rebuilt commit tree db for %d with %d "
                                   "entries (took %.1f ms)"
-                                  % (id(self), len(new_db), 1000*(ts1-ts0)))
+                                  % (id(self), len(new_cache.rev_dict),
+                                     1000*(ts1-ts0)))
+
+                if new_cache is not old_cache:
+                    self.__save_rev_cache()
 
             assert all(e is not None for e in self.__rev_cache) \
                    or not any(self.__rev_cache)
@@ -556,6 +935,265 @@ class Storage(object):
             return self.__rev_cache
         # with self.__rev_cache_lock
 
+    def __built_rev_cache(self):
+        """returns RevCache built from the complete history"""
+
+        youngest = None
+        oldest = None
+        new_db = {} # db
+        new_sdb = {} # short_rev db
+
+        # helper for reusing strings
+        __rev_seen = {}
+        def __rev_reuse(rev):
+            rev = str(rev)
+            return __rev_seen.setdefault(rev, rev)
+
+        new_tags = set(__rev_reuse(rev.strip())
+                       for rev in self.repo.rev_parse('--tags')
+                                           .splitlines())
+
+        new_branches = [(k, __rev_reuse(v))
+                        for k, v in self._get_branches()]
+        head_revs = set(v for _, v in new_branches)
+
+        rev = ord_rev = 0
+        for ord_rev, revs in enumerate(
+                                self.repo.rev_list('--parents',
+                                                   '--topo-order',
+                                                   '--all')
+                                         .splitlines()):
+            revs = map(__rev_reuse, revs.strip().split())
+
+            rev = revs[0]
+
+            # first rev seen is assumed to be the youngest one
+            if not ord_rev:
+                youngest = rev
+
+            # shortrev "hash" map
+            srev_key = self.__rev_key(rev)
+            new_sdb.setdefault(srev_key, []).append(rev)
+
+            # parents
+            parents = tuple(revs[1:])
+
+            # new_db[rev] = (children(rev), parents(rev),
+            #                ordinal_id(rev), rheads(rev))
+            if rev in new_db:
+                # (incomplete) entry was already created by children
+                _children, _parents, _ord_rev, _rheads = new_db[rev]
+                assert _children
+                assert not _parents
+                assert _ord_rev == 0
+
+                if rev in head_revs and rev not in _rheads:
+                    _rheads.append(rev)
+
+            else: # new entry
+                _children = []
+                _rheads = [rev] if rev in head_revs else []
+
+            # create/update entry
+            # transform lists into tuples since entry will be final
+            new_db[rev] = tuple(_children), tuple(parents), \
+                          ord_rev + 1, tuple(_rheads)
+
+            # update parents(rev)s
+            for parent in parents:
+                # by default, a dummy ordinal_id is used
+                # for the mean-time
+                _children, _parents, _ord_rev, _rheads2 = \
+                    new_db.setdefault(parent, ([], [], 0, []))
+
+                # update parent(rev)'s children
+                if rev not in _children:
+                    _children.append(rev)
+
+                # update parent(rev)'s rheads
+                for rev in _rheads:
+                    if rev not in _rheads2:
+                        _rheads2.append(rev)
+
+        # last rev seen is assumed to be the oldest
+        # one (with highest ord_rev)
+        oldest = rev
+
+        __rev_seen = None
+
+        # convert sdb either to dict or array depending on size
+        tmp = [()]*(max(new_sdb.keys())+1) \
+              if len(new_sdb) > 5000 else {}
+
+        try:
+            while True:
+                k, v = new_sdb.popitem()
+                tmp[k] = tuple(v)
+        except KeyError:
+            pass
+
+        assert len(new_sdb) == 0
+        new_sdb = tmp
+
+        return Storage.RevCache(youngest, oldest, new_db, new_tags, new_sdb,
+                                new_branches)
+
+    def __built_compact_rev_cache(self):
+        """returns RevCache with a CommitGraph of the complete history as
+        both `rev_dict` and `srev_dict`
+        """
+
+        new_tags = set(rev.strip()
+                       for rev in self.repo.rev_parse('--tags').splitlines())
+        new_branches = self._get_branches()
+        new_db = CommitGraph((revs.split() for revs in
+                              self.repo.rev_list('--parents', '--topo-order',
+                                                 '--all').splitlines()),
+                             set(v for _, v in new_branches))
+        return Storage.RevCache(new_db.rev_at(1), new_db.rev_at(len(new_db)),
+                                new_db, new_tags, new_db, new_branches)
+
+    def __extended_rev_cache(self, old_cache, shared=True):
+        """returns RevCache which adds the commits created since `old_cache`
+        was built, or None if commits of `old_cache` are gone, for example
+        because a branch was rewritten or deleted
+
+        unless `shared`, the commits of `old_cache` are updated in place
+        """
+
+        old_db = old_cache.rev_dict
+
+        # commits without children are the heads of the old history
+        if isinstance(old_db, CommitGraph):
+            old_heads = old_db.heads()
+        else:
+            old_heads = [rev for rev, entry in old_db.iteritems()
+                         if not entry[0]]
+        try:
+            if self.repo.rev_list_stdin(old_heads, '--max-count=1',
+                                        '--not', '--all').strip():
+                return None
+            new_revs = self.repo.rev_list_stdin(['^' + rev
+                                                 for rev in old_heads],
+                                                '--parents', '--topo-order',
+                                                '--all').splitlines()
+        except GitError, e:
+            self.logger.debug("cannot extend commit tree db: %s" % e)
+            return None
+
+        new_tags = set(rev.strip()
+                       for rev in self.repo.rev_parse('--tags').splitlines())
+        new_branches = self._get_branches()
+        if not new_revs and new_tags == old_cache.tag_set \
+                and new_branches == old_cache.branch_dict:
+            return old_cache
+
+        if isinstance(old_db, CommitGraph):
+            # the arrays cannot grow, but rebuilding them from the old graph
+            # still saves reading the complete history from git
+            new_db = CommitGraph(itertools.chain((revs.split()
+                                                  for revs in new_revs),
+                                                 old_db.rev_list()),
+                                 set(v for _, v in new_branches))
+            return Storage.RevCache(new_db.rev_at(1), old_cache.oldest_rev,
+                                    new_db, new_tags, new_db, new_branches)
+
+        new_db = dict(old_db) if shared else old_db
+        new_sdb = old_cache.srev_dict
+        if shared:
+            new_sdb = list(new_sdb) if isinstance(new_sdb, list) \
+                      else dict(new_sdb)
+
+        # the new commits are younger than all old ones, so they get
+        # ordinals below the old ones and the old ordinals stay valid
+        youngest = old_cache.youngest_rev
+        ord_base = old_db[youngest][2] - len(new_revs)
+        for ord_rev, revs in enumerate(new_revs):
+            revs = revs.strip().split()
+            rev = revs[0]
+            if not ord_rev:
+                youngest = rev
+
+            srev_key = self.__rev_key(rev)
+            if isinstance(new_sdb, list):
+                if srev_key >= len(new_sdb):
+                    new_sdb.extend([()] * (srev_key + 1 - len(new_sdb)))
+                new_sdb[srev_key] += (rev,)
+            else:
+                new_sdb[srev_key] = new_sdb.get(srev_key, ()) + (rev,)
+
+            children = new_db.get(rev, ((),))[0]
+            new_db[rev] = children, tuple(revs[1:]), ord_base + ord_rev, ()
+            for parent in revs[1:]:
+                _children, _parents, _ord_rev, _rheads = \
+                    new_db.get(parent, ((), (), 0, ()))
+                new_db[parent] = _children + (rev,), _parents, _ord_rev, \
+                                 _rheads
+
+        # branches reaching a commit; only the ancestors of branches that
+        # moved change, and the new commits can only be reached from the
+        # new branch heads
+        old_head_revs = set(v for _, v in old_cache.branch_dict)
+        head_revs = set(v for _, v in new_branches)
+        for head in old_head_revs - head_revs:
+            pending = [head]
+            while pending:
+                rev = pending.pop()
+                _children, _parents, _ord_rev, _rheads = new_db[rev]
+                if head in _rheads:
+                    new_db[rev] = _children, _parents, _ord_rev, \
+                                  tuple(r for r in _rheads if r != head)
+                    pending.extend(_parents)
+        for head in head_revs - old_head_revs:
+            pending = [head]
+            while pending:
+                rev = pending.pop()
+                _children, _parents, _ord_rev, _rheads = new_db[rev]
+                if head not in _rheads:
+                    new_db[rev] = _children, _parents, _ord_rev, \
+                                  _rheads + (head,)
+                    pending.extend(_parents)
+
+        return Storage.RevCache(youngest, old_cache.oldest_rev, new_db,
+                                new_tags, new_sdb, new_branches)
+
+    def __load_rev_cache(self):
+        """returns RevCache stored by `__save_rev_cache()` or None"""
+
+        if not self.__rev_cache_path or \
+                not os.path.exists(self.__rev_cache_path):
+            return None
+        try:
+            with open(self.__rev_cache_path, 'rb') as f:
+                version, fields = cPickle.load(f)
+            if version != self.__REV_CACHE_VERSION:
+                return None
+            return Storage.RevCache._make(fields)
+        except Exception, e:
+            self.logger.warning("cannot read commit tree db from '%s': %s"
+                                % (self.__rev_cache_path, e))
+            return None
+
+    def __save_rev_cache(self):
+        """store the RevCache for later processes if a path was given"""
+
+        if not self.__rev_cache_path:
+            return
+        temp_path = '%s.%d.tmp' % (self.__rev_cache_path, os.getpid())
+        try:
+            with open(temp_path, 'wb') as f:
+                cPickle.dump((self.__REV_CACHE_VERSION,
+                              tuple(self.__rev_cache)), f,
+                             cPickle.HIGHEST_PROTOCOL)
+            if sys.platform == 'win32' and \
+                    os.path.exists(self.__rev_cache_path):
+                os.remove(self.__rev_cache_path)
+            os.rename(temp_path, self.__rev_cache_path)
+        except EnvironmentError, e:
+            self.logger.warning("cannot store commit tree db in '%s': %s"
+                                % (self.__rev_cache_path, e))
+
+
     # see RevCache namedtuple
     rev_cache = property(get_rev_cache)
 
@@ -609,7 +1247,8 @@ class Storage(object):
         return rheads
 
     def history_relative_rev(self, sha, rel_pos):
-        db = self.get_commits()
+        _rev_cache = self.rev_cache
+        db = _rev_cache.rev_dict
 
         if sha not in db:
             raise GitErrorSha()
@@ -619,7 +1258,13 @@ class Storage(object):
 
         lin_rev = db[sha][2] + rel_pos
 
-        if lin_rev < 1 or lin_rev > len(db):
+        if isinstance(db, CommitGraph):
+            return db.rev_at(lin_rev)
+
+        # ordinals are consecutive but start below 1 once new commits were
+        # added to the revision cache
+        if lin_rev < db[_rev_cache.youngest_rev][2] or \
+                lin_rev > db[_rev_cache.oldest_rev][2]:
             return None
 
         for k, v in db.iteritems():
@@ -676,11 +1321,50 @@ class Storage(object):
                 # consistent state (Otherwise it happens that next time we
                 # call cat_file we get payload from previous call)
                 self.logger.debug("closing cat_file pipe")
-                self.__cat_file_pipe.stdin.close()
-                terminate(self.__cat_file_pipe)
-                self.__cat_file_pipe.wait()
+                close_pipe(self.__cat_file_pipe)
                 self.__cat_file_pipe = None
-        
+
+    def cat_file_check(self, rev):
+        """returns (kind, size) of the object `rev` refers to or None if
+        there is no such object
+
+        All lookups share one `git cat-file --batch-check` process.
+        """
+        entry = self.__check_object(rev)
+        return entry and entry[1:]
+
+    def __check_object(self, rev):
+        """returns (sha, kind, size) for `cat_file_check()`"""
+        rev = str(rev)
+        if not rev or '\n' in rev:
+            return None
+
+        with self.__cat_file_check_pipe_lock:
+            if self.__cat_file_check_pipe is None:
+                self.__cat_file_check_pipe = self.repo.cat_file_batch_check()
+
+            try:
+                self.__cat_file_check_pipe.stdin.write(rev + '\n')
+                self.__cat_file_check_pipe.stdin.flush()
+
+                split_stdout_line = self.__cat_file_check_pipe.stdout \
+                                                              .readline() \
+                                                              .split()
+                if len(split_stdout_line) == 2 and \
+                   split_stdout_line[1] in ('missing', 'ambiguous'):
+                    return None
+                if len(split_stdout_line) != 3:
+                    raise GitError("internal error (could not split line "
+                                   "'%s')" % (split_stdout_line,))
+
+                _sha, _type, _size = split_stdout_line
+                return _sha, _type, int(_size)
+            except:
+                self.logger.debug("closing cat_file_check pipe")
+                close_pipe(self.__cat_file_check_pipe)
+                self.__cat_file_check_pipe = None
+                raise
+
     def verifyrev(self, rev):
         """verify/lookup given revision object and return a sha id or None
         if lookup failed
@@ -727,6 +1411,9 @@ class Storage(object):
         if rev not in _rev_cache.rev_dict:
             return None
 
+        if isinstance(_rev_cache.srev_dict, CommitGraph):
+            return _rev_cache.srev_dict.shortrev(rev, min_len)
+
         srev = rev[:min_len]
         srevs = set(_rev_cache.srev_dict[self.__rev_key(rev)])
 
@@ -757,6 +1444,9 @@ class Storage(object):
         if not GitCore.is_sha(srev):
             return None
 
+        if isinstance(_rev_cache.srev_dict, CommitGraph):
+            return _rev_cache.srev_dict.fullrev(srev)
+
         try:
             srevs = _rev_cache.srev_dict[self.__rev_key(srev)]
         except KeyError:
@@ -779,7 +1469,9 @@ class Storage(object):
         if path.startswith('/'):
             path = path[1:]
 
-        tree = self.repo.ls_tree('-z', '-l', rev, '--', path).split('\0')
+        # git >= 2.16 rejects an empty pathspec
+        path_args = path and ['--', path] or []
+        tree = self.repo.ls_tree('-z', '-l', rev, *path_args).split('\0')
 
         def split_ls_tree_line(l):
             """split according to '<mode> <type> <sha> <size>\t<fname>'"""
@@ -796,6 +1488,110 @@ class Storage(object):
 
         return [ split_ls_tree_line(e) for e in tree if e ]
 
+    def ls_trees(self, requests):
+        """returns iterator over ((rev, path), entries) pairs for the
+        (rev, path) pairs in `requests`, with entries as returned by
+        `ls_tree(rev, path)`
+
+        Trees and sizes are read from the `git cat-file` processes shared
+        by all lookups instead of running `git ls-tree` for each request.
+        """
+
+        for rev, path in requests:
+            yield (rev, path), self.__ls_tree_from_objects(rev, path)
+
+    def __ls_tree_from_objects(self, rev, path):
+        rev = rev and str(rev) or 'HEAD' # paranoia
+
+        path = self._fs_from_unicode(path)
+
+        if path.startswith('/'):
+            path = path[1:]
+
+        if not path or path.endswith('/'):
+            # list the content of the tree, like `git ls-tree rev dir/`
+            tree_path, name = path.rstrip('/'), None
+        else:
+            # list only the entry itself, like `git ls-tree rev dir/name`
+            tree_path, _, name = path.rpartition('/')
+
+        tree = self.__check_object('%s:%s' % (rev, tree_path))
+        if tree is None or tree[1] != 'tree':
+            return []
+        raw = self.cat_file('tree', tree[0])
+        if raw is None:
+            return []
+
+        prefix = tree_path and tree_path + '/'
+        result = []
+        for _mode, _type, _sha, fname in parse_tree(raw):
+            if name is not None and fname != name:
+                continue
+            _size = self.get_obj_size(_sha) if _type == 'blob' else None
+            result.append((_mode, _type, _sha, _size,
+                           self._fs_to_unicode(prefix + fname)))
+        return result
+
+    def diff_trees(self, requests, path='', find_renames=False):
+        """returns iterator over ((tree1, tree2), changes) pairs for the
+        commit pairs in `requests`, with changes as returned by
+        `diff_tree(tree1, tree2, path, find_renames)`
+
+        All requests are answered by one `git diff-tree --stdin` process,
+        whose output is parsed while it is produced.
+        """
+
+        requests = list(requests)
+        path = self._fs_from_unicode(path).strip('/')
+        diff_tree_args = ['--stdin', '--always', '-z', '-r', '--root']
+        if find_renames:
+            diff_tree_args.append('-M')
+        if path:
+            diff_tree_args.extend(['--', path])
+        p = self.repo.diff_tree_pipe(*diff_tree_args)
+
+        def write_requests():
+            # a commit followed by another one is compared to that one as
+            # if it was its parent
+            try:
+                for tree1, tree2 in requests:
+                    p.stdin.write('%s %s\n' % (tree2, tree1) if tree1
+                                  else '%s\n' % tree2)
+            except EnvironmentError:
+                pass # reader is gone
+            finally:
+                p.stdin.close()
+
+        writer = Thread(target=write_requests)
+        writer.start()
+        try:
+            fields = read_nul_separated(p.stdout)
+            pending = iter(requests)
+            request = None
+            changes = []
+            for field in fields:
+                if not field.startswith(':'):
+                    # with --always, each request starts with its commit id
+                    if request is not None:
+                        yield request, changes
+                    request = pending.next()
+                    changes = []
+                    continue
+                chg = field[1:].split()
+                assert len(chg) == 5
+                chg.append(self._fs_to_unicode(fields.next()))
+                if chg[4][0] in 'RC':
+                    chg.append(self._fs_to_unicode(fields.next()))
+                else:
+                    chg.append(None)
+                changes.append(tuple(chg))
+            if request is not None:
+                yield request, changes
+        finally:
+            p.stdout.close()
+            writer.join()
+            p.wait()
+
     def read_commit(self, commit_id):
         if not commit_id:
             raise GitError("read_commit called with empty commit_id")
@@ -809,9 +1605,9 @@ class Storage(object):
             raise GitErrorSha
 
         with self.__commit_msg_lock:
-            if self.__commit_msg_cache.has_key(commit_id):
+            result = self.__commit_msg_cache.get(commit_id)
+            if result is not None:
                 # cache hit
-                result = self.__commit_msg_cache[commit_id]
                 return result[0], dict(result[1])
 
             # cache miss
@@ -829,13 +1625,23 @@ class Storage(object):
     def get_obj_size(self, sha):
         sha = str(sha)
 
-        try:
-            obj_size = int(self.repo.cat_file('-s', sha).strip())
-        except ValueError:
-            raise GitErrorSha("object '%s' not found" % sha)
+        obj_size = self.__obj_size_cache.get(sha)
+        if obj_size is None:
+            obj = self.cat_file_check(sha)
+            if obj is None:
+                raise GitErrorSha("object '%s' not found" % sha)
+            obj_size = obj[1]
+            self.__obj_size_cache[sha] = obj_size
 
         return obj_size
 
+    def get_cache_stats(self):
+        """returns list of (name, stats) pairs for the caches of this
+        instance, see `LRUCache.stats()`
+        """
+        return [('commit_msg', self.__commit_msg_cache.stats()),
+                ('obj_size', self.__obj_size_cache.stats())]
+
     def children(self, sha):
         db = self.get_commits()
 
@@ -933,19 +1739,177 @@ class Storage(object):
     def last_change(self, sha, path, historian=None):
         if historian is not None:
             return historian(path)
+        path = self._fs_from_unicode(path)
+        # git >= 2.16 rejects an empty pathspec
+        path_args = path and ['--', path] or []
         return self.repo.rev_list('--max-count=1',
-                                  sha, '--',
-                                  self._fs_from_unicode(path)).strip() or None
+                                  sha, *path_args).strip() or None
 
     def history(self, sha, path, limit=None):
         if limit is None:
             limit = -1
 
-        tmp = self.repo.rev_list('--max-count=%d' % limit, str(sha), '--',
-                                 self._fs_from_unicode(path))
+        path = self._fs_from_unicode(path)
+        path_args = path and ['--', path] or []
+        tmp = self.repo.rev_list('--max-count=%d' % limit, str(sha),
+                                 *path_args)
 
         return [ rev.strip() for rev in tmp.splitlines() ]
 
+    def last_changes(self, sha, paths):
+        """returns dict mapping each of `paths` to its last change as
+        returned by `last_change(sha, path)`, from one `git log` process
+        """
+
+        return dict((path, revs[0] if revs else None)
+                    for path, revs in self.histories(sha, paths, 1)
+                                          .iteritems())
+
+    def histories(self, sha, paths, limit=None):
+        """returns dict mapping each of `paths` to its history as returned
+        by `history(sha, path, limit)`
+
+        All paths are answered by one `git log --raw -z` process, whose
+        output is parsed while it is read and which is stopped once each
+        path has `limit` commits. A merge changes a path if it differs from
+        each parent. History simplification at merges is done for all paths
+        together, so the commits of a path may differ from `history()`
+        where a merge takes the path from one parent but other paths from
+        another.
+        """
+
+        result = {}
+        pending = {} # path as in git -> commits changing it
+        for path in paths:
+            result[path] = pending.setdefault(
+                self._fs_from_unicode(path).strip('/'), [])
+        if not pending:
+            return result
+
+        # with -m, a merge is listed once for each parent, with the changes
+        # compared to that parent
+        p = self.repo.log_stdin_pipe('--raw', '-z', '-m', '--no-renames',
+                                     '--no-abbrev', '--format=%H', str(sha))
+        # git >= 2.16 rejects an empty pathspec, which includes all others
+        if '' not in pending:
+            p.stdin.write(''.join(['--\n'] +
+                                  [path + '\n' for path in pending]))
+        p.stdin.close()
+        def add_changes(rev, changed):
+            for path in changed:
+                revs = pending.get(path)
+                if revs is not None:
+                    revs.append(rev)
+                    if len(revs) == limit:
+                        del pending[path]
+
+        try:
+            fields = read_nul_separated(p.stdout)
+            rev = None
+            changed = None # requested paths changed compared to all parents
+            parent_changed = set()
+            for field in fields:
+                field = field.lstrip('\n')
+                if not field:
+                    continue
+                if field.startswith(':'):
+                    path = fields.next()
+                    while True:
+                        if path in pending:
+                            parent_changed.add(path)
+                        if not path:
+                            break
+                        path = path.rsplit('/', 1)[0] if '/' in path else ''
+                    continue
+                if field == rev:
+                    changed &= parent_changed
+                else:
+                    if rev is not None:
+                        add_changes(rev, changed & parent_changed)
+                        if not pending:
+                            break
+                    rev = field
+                    changed = set(pending)
+                # every commit changes the root
+                parent_changed = set([''])
+            else:
+                if rev is not None:
+                    add_changes(rev, changed & parent_changed)
+        finally:
+            p.stdout.close()
+            terminate(p)
+            p.wait()
+        return result
+
+    def get_svn_revs(self, path='trunk'):
+        """returns dict mapping the svn revisions of `path` to the sha ids
+        of the commits git-svn created for them
+
+        The history of HEAD is read once from a single `git log` process,
+        later calls use the result.
+        """
+
+        with self.__svn_revs_lock:
+            result = self.__svn_revs.get(path)
+            if result is None:
+                result = {}
+                git_svn_id_re = re.compile(r'git-svn-id: .*%s@(\d+) '
+                                           % re.escape(path))
+                p = self.repo.log_pipe('--no-color',
+                                       '--pretty=format:%x00%H%n%B', 'HEAD')
+                sha = None
+                for line in p.stdout:
+                    if line.startswith('\0'):
+                        sha = line[1:].strip()
+                    else:
+                        match = git_svn_id_re.search(line)
+                        if match:
+                            # the youngest commit wins like with log --grep
+                            result.setdefault(match.group(1), sha)
+                p.stdout.close()
+                p.wait()
+                self.__svn_revs[path] = result
+            return result
+
+    def get_svn_rev_maps(self, path='trunk'):
+        """returns list of GitSvnRevMap for the rev_map files git-svn keeps
+        for the refs tracking `path`, which is empty unless git-svn created
+        the repository
+        """
+
+        with self.__svn_revs_lock:
+            result = self.__svn_rev_maps.get(path)
+            if result is None:
+                result = []
+                for dir_path, _, file_names in \
+                        sorted(os.walk(os.path.join(self.git_dir, 'svn'))):
+                    if os.path.basename(dir_path) != path:
+                        continue
+                    for file_name in sorted(file_names):
+                        if file_name.startswith('.rev_map.'):
+                            result.append(GitSvnRevMap(
+                                os.path.join(dir_path, file_name)))
+                self.__svn_rev_maps[path] = result
+            return result
+
+    def get_svn_commit(self, svn_rev, path='trunk'):
+        """returns sha id of the commit git-svn created for the svn revision
+        `svn_rev` of `path` or None
+
+        The rev_map files of git-svn are searched without running git.
+        Repositories without them, for example converted by other tools,
+        fall back to `get_svn_revs()`.
+        """
+
+        rev_maps = self.get_svn_rev_maps(path)
+        if not rev_maps:
+            return self.get_svn_revs(path).get(str(svn_rev))
+        for rev_map in rev_maps:
+            sha = rev_map.get(int(svn_rev))
+            if sha:
+                return sha
+        return None
+
     def history_timerange(self, start, stop):
         return [ rev.strip() for rev in \
                      self.repo.rev_list('--reverse',
@@ -999,8 +1963,9 @@ class Storage(object):
         if find_renames:
             diff_tree_args.append('-M')
         diff_tree_args.extend([str(tree1) if tree1 else '--root',
-                               str(tree2),
-                               '--', path])
+                               str(tree2)])
+        if path: # git >= 2.16 rejects an empty pathspec
+            diff_tree_args.extend(['--', path])
 
         lines = self.repo.diff_tree(*diff_tree_args).split('\0')
 
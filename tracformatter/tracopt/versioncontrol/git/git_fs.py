@@ -15,23 +15,26 @@
 from __future__ import with_statement 
 
 from datetime import datetime
+import hashlib
 import os
 import sys
 
 from genshi.builder import tag
 
+from trac.admin import IAdminCommandProvider
 from trac.config import BoolOption, IntOption, PathOption, Option
 from trac.core import *
 from trac.util import TracError, shorten_line
 from trac.util.datefmt import FixedOffset, to_timestamp, format_datetime
-from trac.util.text import to_unicode
+from trac.util.text import print_table, to_unicode
 from trac.versioncontrol.api import Changeset, Node, Repository, \
                                     IRepositoryConnector, NoSuchChangeset, \
-                                    NoSuchNode, IRepositoryProvider
+                                    NoSuchNode, IRepositoryProvider, \
+                                    RepositoryManager
 from trac.versioncontrol.cache import CachedRepository, CachedChangeset
 from trac.versioncontrol.web_ui import IPropertyRenderer
 from trac.web.chrome import Chrome
-from trac.wiki import IWikiSyntaxProvider
+from trac.wiki.api import IWikiSyntaxProvider
 
 from tracopt.versioncontrol.git import PyGIT
 
@@ -106,7 +109,8 @@ def _parse_user_time(s):
 
 class GitConnector(Component):
 
-    implements(IRepositoryConnector, IWikiSyntaxProvider)
+    implements(IAdminCommandProvider, IRepositoryConnector,
+               IWikiSyntaxProvider)
 
     def __init__(self):
         self._version = None
@@ -125,6 +129,33 @@ class GitConnector(Component):
                                (self._version['v_str'],
                                 self._version['v_min_str']))
 
+    # IAdminCommandProvider methods
+
+    def get_admin_commands(self):
+        yield ('git cache stats', '',
+               'Show hits, misses and evictions of the caches of the git '
+               'repositories',
+               None, self._do_cache_stats)
+
+    def _do_cache_stats(self):
+        rows = []
+        for repos in RepositoryManager(self.env).get_real_repositories():
+            if isinstance(repos, CachedRepository):
+                repos = repos.repos
+            if not isinstance(repos, GitRepository):
+                continue
+            for name, stats in repos.git.get_cache_stats():
+                lookups = stats['hits'] + stats['misses']
+                rows.append((repos.reponame or '(default)', name,
+                             '%d/%d' % (stats['size'], stats['max_size']),
+                             stats['bytes'], stats['hits'], stats['misses'],
+                             stats['evictions'],
+                             '%.1f%%' % (100.0 * stats['hits'] / lookups)
+                             if lookups else '-'))
+        rows.sort()
+        print_table(rows, ['Repository', 'Cache', 'Entries', 'Bytes', 'Hits',
+                           'Misses', 'Evictions', 'Hit rate'])
+
     # IWikiSyntaxProvider methods
 
     def _format_sha_link(self, formatter, sha, label):
@@ -169,6 +200,17 @@ class GitConnector(Component):
     persistent_cache = BoolOption('git', 'persistent_cache', 'false',
         """Enable persistent caching of commit tree.""")
 
+    rev_cache_dir = PathOption('git', 'rev_cache_dir', '',
+        """Folder to store the commit tree of each repository in, so that
+        other processes only need to read the commits added since (relative
+        to the Trac configuration folder). If empty, each process reads the
+        complete commit tree.""")
+
+    compact_rev_cache = BoolOption('git', 'compact_rev_cache', 'false',
+        """Keep the commit tree in compact arrays, which takes much less
+        memory for repositories with many commits but makes each lookup
+        slower.""")
+
     cached_repository = BoolOption('git', 'cached_repository', 'false',
         """Wrap `GitRepository` in `CachedRepository`.""")
 
@@ -251,8 +293,16 @@ class GitConnector(Component):
             def rlookup_uid(_):
                 return None
 
+        rev_cache_path = None
+        if self.rev_cache_dir:
+            dir_hash = hashlib.sha1(to_unicode(dir).encode('utf-8'))
+            rev_cache_path = os.path.join(self.rev_cache_dir, '%s.revcache'
+                                          % dir_hash.hexdigest())
+
         repos = GitRepository(dir, params, self.log,
                               persistent_cache=self.persistent_cache,
+                              rev_cache_path=rev_cache_path,
+                              compact_rev_cache=self.compact_rev_cache,
                               git_bin=self.git_bin,
                               git_fs_encoding=self.git_fs_encoding,
                               shortrev_len=self.shortrev_len,
@@ -360,6 +410,8 @@ class GitRepository(Repository):
 
     def __init__(self, path, params, log,
                  persistent_cache=False,
+                 rev_cache_path=None,
+                 compact_rev_cache=False,
                  git_bin='git',
                  git_fs_encoding='utf-8',
                  shortrev_len=7,
@@ -379,7 +431,10 @@ class GitRepository(Repository):
         try:
             self.git = PyGIT.StorageFactory(path, log, not persistent_cache,
                                             git_bin=git_bin,
-                                            git_fs_encoding=git_fs_encoding) \
+                                            git_fs_encoding=git_fs_encoding,
+                                            rev_cache_path=rev_cache_path,
+                                            compact_rev_cache=
+                                                compact_rev_cache) \
                             .getInstance()
         except PyGIT.GitError, e:
             raise TracError("%s does not appear to be a Git "
@@ -578,11 +633,12 @@ class GitNode(Node):
         if not self.isdir:
             return
 
-        with self.repos.git.get_historian(self.rev,
-                                          self.path.strip('/')) as historian:
-            for ent in self.repos.git.ls_tree(self.rev, self.__git_path()):
-                yield GitNode(self.repos, ent[-1], self.rev, self.log, ent,
-                              historian)
+        entries = self.repos.git.ls_tree(self.rev, self.__git_path())
+        last_changes = self.repos.git.last_changes(
+            self.rev, [ent[-1] for ent in entries])
+        for ent in entries:
+            yield GitNode(self.repos, ent[-1], self.rev, self.log, ent,
+                          last_changes.get)
 
     def get_content_type(self):
         if self.isdir:
@@ -51,6 +51,13 @@ Be aware that Github issues and milestones cannot be deleted in case you mess up
 remove the whole repository and start anew. So make sure that tratihubis does what you want before you
 enable ``--really``.
 
+Before connecting to Github, tratihubis checks all CSV files and the mappings of users and labels and
+reports all problems it finds, for example rows with a wrong number of columns, tickets that are out of
+order or Trac users that are not mapped to a Github user. The rows are checked in parallel by one process
+per CPU. If there are errors, nothing is converted. To skip the check, use::
+
+  preflight = no
+
 Mapping users
 -------------
 
@@ -102,6 +109,10 @@ between quotes::
 
   labels = type="software defect": bug
 
+Before the first issue is created, tratihubis scans all tickets and creates the milestones and the labels
+used by ``labels`` and ``keywords`` that do not exist in the repository yet. New labels get a neutral
+color you might want to change afterwards.
+
 
 Attachments
 -----------
@@ -109,6 +120,127 @@ Attachments
 You can find some notes on this in `issue #19 <https://github.com/roskakori/tratihubis/issues/19>`: Add
 documentation for ``attachmentsprefix``.
 
+Instead of hosting the attachment files yourself, tratihubis can commit them to a branch of a local git
+repository, from where you push them to Github. For this, specify the folder of the Trac environment and
+the git repository::
+
+  attachments = /Users/me/mytool/attachments.csv
+  tracenv = /var/trac/mytool
+  attachmentsrepo = /Users/me/mytool
+  attachmentsbranch = trac-attachments
+
+``attachmentsrepo`` defaults to ``gitpath`` and ``attachmentsbranch`` to ``trac-attachments``. The files
+are stored as ``<ticket id>/<filename>``, with files of the same content stored only once, and the issues
+link to the branch on Github unless ``attachmentsprefix`` is specified. Once the branch is pushed, the
+links work::
+
+  $ git push origin trac-attachments
+
+With ``tracenv``, tratihubis first examines all attachment files in parallel. Issues then show the size
+of each attachment or mention that it is missing, and attachments with the same content as an earlier
+one link to the earlier one. To keep the results, for example to clean up the Trac environment, specify
+a CSV file for the manifest::
+
+  attachmentsmanifest = /Users/me/mytool/attachments-manifest.csv
+
+The manifest has the columns ``ticket``, ``filename``, ``size``, ``sha1``, ``missing`` and
+``duplicate_of``, with the latter referring to the original attachment as ``<ticket id>/<filename>``.
+
+
+Linking commits
+---------------
+
+If ``gitpath`` points to the git repository converted from the Trac repository, the issues can list the
+commits whose messages refer to the ticket, for example using ``#12``, ``ticket:12`` or ``refs #12``::
+
+  gitpath = /Users/me/mytool
+  commitlinks = yes
+
+The references are found in a single pass over the history of HEAD and stored in the file specified by
+``commitindex``, which defaults to ``commits.json``. Later runs read this file unless HEAD has changed.
+
+Svn revisions like ``r123`` in descriptions and comments link to the git commit created for them from the
+trunk. To share the commits found between runs and between several conversions from the same repository,
+specify a SQLite database with ``svncache``::
+
+  svncache = /Users/me/svncache.db
+  svncachettl = 3600
+
+Revisions without a commit are looked up again after ``svncachettl`` seconds, which defaults to 3600. All
+entries are discarded once HEAD of the repository has changed.
+
+
+Large ticket exports
+--------------------
+
+For exports with many tickets, the ``columnar`` option reads the tickets CSV once into compact columns
+instead of building a map for every ticket::
+
+  columnar = yes
+
+The default is ``no``.
+
+To resume an interrupted migration quickly, the ``index`` option stores the position of each ticket in
+the tickets and comments CSV in a file next to it with the suffix ``.index``::
+
+  index = yes
+
+A resumed run then skips the tickets that have an issue already without reading them. The index files
+are built anew whenever the CSV files change. With ``columnar``, only the comments are indexed.
+
+Closing issues costs one request per issue. With the ``graphql`` option, issues are closed using the
+Github GraphQL API, which allows to combine many changes in one request. Existing issues then are read
+100 at a time, and reading stops after the highest Trac ticket::
+
+  graphql = yes
+  graphqlbatchsize = 50
+
+``graphqlbatchsize`` sets how many changes are sent in one request and defaults to 50. The GraphQL API
+requires ``password`` to be a personal access token.
+
+Tickets deleted in Trac leave gaps in the ticket ids, which tratihubis fills with closed placeholder
+issues so issue numbers match ticket ids. Each placeholder costs a creation and a close. With the
+``importplaceholders`` option, placeholders are created already closed using the Github issue import
+API, which does not count against the limit for creations::
+
+  importplaceholders = yes
+
+Like ``graphql``, this requires ``password`` to be a personal access token.
+
+
+Syncing later changes
+---------------------
+
+In case Trac remains in use for a while after the migration, tratihubis can add later changes to the
+issues. For this, specify a journal file where tratihubis remembers the time of the latest ticket change
+and comment it migrated::
+
+  journal = /Users/me/mytool/tratihubis.journal
+
+After exporting the tickets and comments again, run::
+
+  $ tratihubis --really --delta ~/mytool/tratihubis.cfg
+
+This adds comments written after the previous run to the existing issues, closes or reopens issues whose
+ticket changed its state and creates issues for new tickets. Other changes of existing tickets, for
+example to their summary or milestone, are not synced. If the exports are large, you can restrict them to
+tickets and comments changed since the previous run by adding a condition on ``changetime`` and
+``time`` to the queries.
+
+
+Verifying the migration
+-----------------------
+
+To check that the issues match the Trac tickets, run::
+
+  $ tratihubis --verify ~/mytool/tratihubis.cfg
+
+This fetches all issues and their comments and compares title, state, number of comments and the
+contents of the description and comments with what tratihubis would create from the exports. Differences
+are logged and written to the CSV file specified with the ``mismatches`` option, which defaults to
+``mismatches.csv``. If a ``journal`` is specified, later verifications only fetch issues that changed on
+Github since the previous verification.
+
 
 Limitations
 ===========
@@ -120,6 +252,9 @@ Github issues and comments have the current time as time stamp instead if time f
 
 Github issue descriptions contains the raw Trac Wiki markup, there is no translation to Github markdown.
 
+Github limits issue descriptions and comments to 65536 characters. Longer texts are split into several
+parts, with all parts but the first one added as continuation comments.
+
 The due date of Trac milestones is not migrated to Github milestones, so when the conversion is done, you
 have to set it manually.
 
@@ -201,23 +336,41 @@ Version 0.1, 2012-05-01
 # CONTRACT, STRICT LIABILITY, OR TORT (INCLUDING NEGLIGENCE OR OTHERWISE)
 # ARISING IN ANY WAY OUT OF THE USE OF THIS SOFTWARE, EVEN IF ADVISED OF THE
 # POSSIBILITY OF SUCH DAMAGE.
+import array
+import base64
+import bisect
 import codecs
 import collections
 import ConfigParser
 import csv
 import github
+import hashlib
+import itertools
+import json
 import logging
+import mmap
+import multiprocessing.pool
 import optparse
 import os.path
+import shutil
 import StringIO
+import subprocess
 import sys
+import threading
 import token
 import tokenize
+import urllib2
 import datetime
 import time
 import collections
 import re
 
+try:
+    import resource
+except ImportError:
+    # Not available on Windows.
+    resource = None
+
 TIMESTAMP_FORMAT = "%b %-d, %Y, %-I:%M:%S %p"
 
 LEGACY_HEADER_TEMPLATE = u"""_Imported from trac ticket {id}.
@@ -225,6 +378,15 @@ Created by **{reporter}**
 Opened in trac: {createdtime}
 Last modified in trac: {modifiedtime}{freshdesk}_"""
 
+CONTINUATION_HEADER_TEMPLATE = u"""_Continued from trac ticket {id} (part {part})._
+
+"""
+
+# Github rejects issue and comment bodies with more characters than this.
+GITHUB_BODY_LIMIT = 65536
+GITHUB_TITLE_LIMIT = 256
+GITHUB_LABEL_NAME_LIMIT = 50
+
 DUMMYTYPE = ' _dummy_ '
 
 PLACEHOLDERTICKET = {
@@ -250,23 +412,44 @@ __version__ = "0.5"
 ALLOWED_PER_MIN = 36
 ALLOWED_PER_HR = 300
 LIMIT_BUFFER = 10
+PROVISIONING_THREAD_COUNT = 4
+GITHUB_API_URL = 'https://api.github.com'
+GITHUB_GRAPHQL_URL = GITHUB_API_URL + '/graphql'
+GITHUB_IMPORT_MEDIA_TYPE = 'application/vnd.github.golden-comet-preview+json'
+IMPORT_POLL_SECONDS = 2
+PREFLIGHT_CHUNK_ROWS = 5000
+ATTACHMENTS_BRANCH = 'trac-attachments'
+ATTACHMENT_BLOCK_SIZE = 1024 * 1024
+ATTACHMENT_SCAN_THREAD_COUNT = 8
+GRAPHQL_BATCH_SIZE = 50
+# Github returns this many items per page of the REST API by default.
+GITHUB_PAGE_SIZE = 30
+# Github returns at most this many nodes per GraphQL page.
+GRAPHQL_PAGE_SIZE = 100
+DEFAULT_LABEL_COLOR = 'ededed'
 _NOTSET = github.GithubObject.NotSet
 _SECTION = 'tratihubis'
 _OPTION_LABELS = 'labels'
 _OPTION_USERS = 'users'
 _OPTION_KEYWORDS = 'keywords'
+_BOOLEAN_OPTION_VALUES = {
+    '1': True, 'yes': True, 'true': True, 'on': True,
+    '0': False, 'no': False, 'false': False, 'off': False,
+}
 
 _validatedGithubUsers = {}
 _hub = None
 _gitpath = None
 _totalCreations = 0
 _totalIssues = 0
+_apiLock = threading.Lock()
 _lastMinCalls = collections.deque()
 _last40mCalls = collections.deque()
 
 
+_FakeLabel = collections.namedtuple('_FakeLabel', ['name'])
 _FakeMilestone = collections.namedtuple('_FakeMilestone', ['number', 'title'])
-_FakeIssue = collections.namedtuple('_FakeIssue', ['number', 'title', 'body', 'state', 'comments'])
+_FakeIssue = collections.namedtuple('_FakeIssue', ['number', 'title', 'state', 'comments'])
 
 
 class _ConfigError(Exception):
@@ -286,6 +469,10 @@ class _CsvDataError(Exception):
         Exception.__init__(self, u'%s:%d: %s' % (os.path.basename(csvPath), rowIndex + 1, message))
 
 
+class _ValidationError(Exception):
+    pass
+
+
 class _UTF8Recoder:
     """
     Iterator that reads an encoded stream and reencodes the input to UTF-8
@@ -307,6 +494,9 @@ class _UnicodeCsvReader:
     which is encoded in the given encoding.
     """
     def __init__(self, f, dialect=csv.excel, encoding="utf-8", **kwds):
+        # Descriptions exceeding Github's body limit are split later on, so they must not fail here.
+        if csv.field_size_limit() < sys.maxint:
+            csv.field_size_limit(sys.maxint)
         f = _UTF8Recoder(f, encoding)
         self.reader = csv.reader(f, dialect=dialect, **kwds)
 
@@ -318,12 +508,468 @@ class _UnicodeCsvReader:
         return self
 
 
+class _BodyAssembler(object):
+    """
+    Collects Markdown text line by line and splits it into parts that each fit into a Github issue or
+    comment body. The first part is the body itself, further parts are meant to be posted as continuation
+    comments in the given order.
+
+    Parts are preferably split after blank lines or complete code fences. A fence that does not fit into
+    a part on its own is closed at the end of the part and reopened with the same info string in the next
+    part, so no part ever ends inside a fence.
+    """
+    _FENCE_OPEN_REGEX = re.compile(r'^ {0,3}(`{3,})[^`]*$')
+    _FENCE_CLOSE_REGEX = re.compile(r'^ {0,3}(`{3,})\s*$')
+
+    def __init__(self, ticketId, limit=GITHUB_BODY_LIMIT):
+        assert ticketId is not None
+        assert limit > 0
+        self._ticketId = ticketId
+        self._limit = limit
+        self._parts = []
+        self._chunks = []
+        self._contentStart = 0
+        self._lastBreak = 0
+        self._size = 0
+        self._fenceOpening = None
+        self._fenceMarker = None
+        self._fenceChunks = []
+        self._fenceSize = 0
+
+    def write(self, text):
+        assert text is not None
+        for line in text.splitlines(True):
+            if self._fenceOpening is None:
+                self._addOutsideFence(line)
+            else:
+                self._addInsideFence(line)
+
+    def parts(self):
+        """
+        List of all parts; after calling this no more text can be written.
+        """
+        if self._fenceOpening is not None:
+            # Unterminated fence: keep it as is, Github closes it at the end of the body.
+            self._addUnit(u''.join(self._fenceChunks), True)
+            self._fenceOpening = None
+        if self._hasContent() or not self._parts:
+            self._finishPart()
+        return self._parts
+
+    def _addOutsideFence(self, line):
+        if self._FENCE_OPEN_REGEX.match(line.rstrip(u'\r\n')):
+            self._fenceOpening = line if line.endswith(u'\n') else line + u'\n'
+            self._fenceMarker = self._FENCE_OPEN_REGEX.match(line.rstrip(u'\r\n')).group(1)
+            self._fenceChunks = [self._fenceOpening]
+            self._fenceSize = len(self._fenceOpening)
+        else:
+            self._addUnit(line, not line.strip())
+
+    def _addInsideFence(self, line):
+        closeMatch = self._FENCE_CLOSE_REGEX.match(line.rstrip(u'\r\n'))
+        if closeMatch and len(closeMatch.group(1)) >= len(self._fenceMarker):
+            self._fenceChunks.append(line)
+            self._addUnit(u''.join(self._fenceChunks), True)
+            self._fenceOpening = None
+            self._fenceChunks = []
+            self._fenceSize = 0
+            return
+        closing = self._fenceMarker + u'\n'
+        budget = self._limit - len(self._nextHeader()) - len(closing)
+        while self._fenceSize + len(line) > budget:
+            # The fence does not even fit into a part of its own, so close it in the current part
+            # and reopen it in the next one.
+            room = budget - self._fenceSize
+            if room > 0 and len(line) > budget - len(self._fenceOpening):
+                cut = line[:room]
+                line = line[room:]
+                self._fenceChunks.append(cut if cut.endswith(u'\n') else cut + u'\n')
+            if self._hasContent():
+                self._finishPart()
+            self._appendChunk(u''.join(self._fenceChunks) + closing)
+            self._finishPart()
+            self._fenceChunks = [self._fenceOpening]
+            self._fenceSize = len(self._fenceOpening)
+            budget = self._limit - len(self._nextHeader()) - len(closing)
+        self._fenceChunks.append(line)
+        self._fenceSize += len(line)
+
+    def _addUnit(self, text, isBreak):
+        if self._size + len(text) > self._limit:
+            self._breakPart()
+            if (self._size + len(text) > self._limit) and self._hasContent():
+                self._finishPart()
+            while self._size + len(text) > self._limit:
+                cut = self._limit - self._size
+                self._appendChunk(text[:cut])
+                self._finishPart()
+                text = text[cut:]
+        self._appendChunk(text)
+        if isBreak:
+            self._lastBreak = len(self._chunks)
+
+    def _appendChunk(self, text):
+        self._chunks.append(text)
+        self._size += len(text)
+
+    def _hasContent(self):
+        return len(self._chunks) > self._contentStart
+
+    def _nextHeader(self):
+        return CONTINUATION_HEADER_TEMPLATE.format(id=self._ticketId, part=len(self._parts) + 2)
+
+    def _breakPart(self):
+        """
+        Finish the current part at the last break and move the text after it to the next part.
+        """
+        if self._contentStart < self._lastBreak < len(self._chunks):
+            tail = self._chunks[self._lastBreak:]
+            del self._chunks[self._lastBreak:]
+            self._finishPart()
+            for chunk in tail:
+                self._appendChunk(chunk)
+
+    def _finishPart(self):
+        self._parts.append(u''.join(self._chunks))
+        header = CONTINUATION_HEADER_TEMPLATE.format(id=self._ticketId, part=len(self._parts) + 1)
+        self._chunks = [header]
+        self._contentStart = 1
+        self._lastBreak = 0
+        self._size = len(header)
+
+
+def _splitBody(ticketId, text, limit=GITHUB_BODY_LIMIT):
+    """
+    List of parts ``text`` has to be split into to fit into Github bodies.
+    """
+    assembler = _BodyAssembler(ticketId, limit)
+    assembler.write(text)
+    return assembler.parts()
+
+
+class _IssueRegistry(object):
+    """
+    Number, title, state and comment count of the Github issues of the repository.
+
+    The fields are stored in parallel arrays indexed by issue number, so neither PyGithub `Issue` objects nor
+    issue bodies are retained for the whole run.
+    """
+    def __init__(self):
+        # Issue numbers start with 1, so index 0 stays unused.
+        self._titles = [None]
+        self._closed = bytearray(1)
+        self._comments = array.array('l', [0])
+        self._count = 0
+
+    def __len__(self):
+        return self._count
+
+    def __contains__(self, number):
+        return (0 < number < len(self._titles)) and (self._titles[number] is not None)
+
+    def add(self, number, title, state, comments=0):
+        assert number > 0
+        assert title is not None
+        assert state in ('open', 'closed'), u'state=%r' % state
+        missingCount = number + 1 - len(self._titles)
+        if missingCount > 0:
+            self._titles.extend([None] * missingCount)
+            self._closed.extend(bytearray(missingCount))
+            self._comments.extend([0] * missingCount)
+        if self._titles[number] is None:
+            self._count += 1
+        self._titles[number] = title
+        self._closed[number] = 1 if state == 'closed' else 0
+        self._comments[number] = comments
+
+    def title(self, number):
+        assert number in self
+        return self._titles[number]
+
+    def state(self, number):
+        assert number in self
+        return 'closed' if self._closed[number] else 'open'
+
+    def comments(self, number):
+        assert number in self
+        return self._comments[number]
+
+    def openNumbers(self):
+        """
+        Numbers of the open issues in ascending order.
+        """
+        return [number for number, isClosed in enumerate(self._closed)
+            if not isClosed and (self._titles[number] is not None)]
+
+    def close(self, number):
+        assert number in self
+        self._closed[number] = 1
+
+    def reopen(self, number):
+        assert number in self
+        self._closed[number] = 0
+
+    def addComments(self, number, count=1):
+        assert number in self
+        assert count >= 0
+        self._comments[number] += count
+
+    def memorySize(self):
+        """
+        Approximate number of bytes used by the registry.
+        """
+        titleSize = sum(sys.getsizeof(title) for title in self._titles if title is not None)
+        return sys.getsizeof(self._titles) + titleSize + sys.getsizeof(self._closed) \
+            + self._comments.itemsize * len(self._comments)
+
+
+class _MigrationJournal(object):
+    """
+    State of the migration that has to survive between runs, stored as JSON in ``path``.
+
+    Every `update()` rewrites the whole file using a temporary file, so an interrupted run leaves either
+    the old or the new state behind.
+    """
+    def __init__(self, path):
+        assert path is not None
+        self.path = path
+        self._data = {}
+        if os.path.exists(path):
+            _log.info(u'read migration journal from "%s"', path)
+            with open(path, 'rb') as journalFile:
+                self._data = json.load(journalFile)
+
+    def get(self, key, defaultValue=None):
+        return self._data.get(key, defaultValue)
+
+    def update(self, **values):
+        self._data.update(values)
+        temporaryPath = self.path + '.tmp'
+        with open(temporaryPath, 'wb') as journalFile:
+            json.dump(self._data, journalFile, indent=1, sort_keys=True)
+        if os.name == 'nt' and os.path.exists(self.path):
+            # Windows cannot rename to an existing file.
+            os.remove(self.path)
+        os.rename(temporaryPath, self.path)
+
+
+class _GraphQLError(Exception):
+    pass
+
+
+def _basicAuthorization(user, password):
+    assert user is not None
+    assert password is not None
+    credentials = u'%s:%s' % (user, password)
+    return 'Basic ' + base64.b64encode(credentials.encode('utf-8'))
+
+
+def _jsonRequest(url, authorization, data=None, accept=None):
+    """
+    The decoded JSON response to a request to the Github API at ``url``, which is a POST of ``data``
+    encoded as JSON or a GET if ``data`` is ``None``.
+    """
+    headers = {
+        'Authorization': authorization,
+        'User-Agent': 'tratihubis/%s' % __version__,
+    }
+    if data is not None:
+        headers['Content-Type'] = 'application/json'
+        data = json.dumps(data)
+    if accept is not None:
+        headers['Accept'] = accept
+    response = urllib2.urlopen(urllib2.Request(url, data, headers))
+    try:
+        return json.load(response)
+    finally:
+        response.close()
+
+
+class _GraphQLClient(object):
+    """
+    Minimal client for the Github GraphQL API.
+    """
+    def __init__(self, user, password, url=GITHUB_GRAPHQL_URL):
+        self._url = url
+        self._authorization = _basicAuthorization(user, password)
+
+    def execute(self, query):
+        """
+        The ``data`` of the response to ``query``.
+        """
+        assert query is not None
+        result = _jsonRequest(self._url, self._authorization, {'query': query})
+        errors = result.get('errors')
+        if errors:
+            raise _GraphQLError(u'; '.join(error.get('message', u'%r' % error) for error in errors))
+        return result['data']
+
+
+def _graphQLString(text):
+    # JSON string literals are valid GraphQL string literals.
+    return json.dumps(text)
+
+
+class _IssueImportError(Exception):
+    pass
+
+
+class _IssueImporter(object):
+    """
+    Client for the Github issue import API, which creates an issue that is already closed with a single
+    request that does not count against the limit for creations.
+
+    Github processes imports in the background, so `waitUntilImported()` has to be called before other
+    issues are created in order to keep issue numbers and ticket ids in sync.
+    """
+    def __init__(self, user, password, repoFullName, url=GITHUB_API_URL):
+        assert repoFullName is not None
+        self._importUrl = u'%s/repos/%s/import/issues' % (url, repoFullName)
+        self._authorization = _basicAuthorization(user, password)
+
+    def submit(self, title, body):
+        """
+        URL of the status of the import of a closed issue with ``title`` and ``body``.
+        """
+        _apiPauseIfNeeded()
+        status = _jsonRequest(self._importUrl, self._authorization, {
+            'issue': {'title': title, 'body': body, 'closed': True},
+        }, GITHUB_IMPORT_MEDIA_TYPE)
+        return status['url']
+
+    def waitUntilImported(self, statusUrls):
+        """
+        Numbers of the issues imported for ``statusUrls``.
+        """
+        result = []
+        for statusUrl in statusUrls:
+            status = {'status': 'pending'}
+            while status['status'] == 'pending':
+                _apiPauseIfNeeded()
+                status = _jsonRequest(statusUrl, self._authorization, accept=GITHUB_IMPORT_MEDIA_TYPE)
+                if status['status'] == 'pending':
+                    time.sleep(IMPORT_POLL_SECONDS)
+            if status['status'] != 'imported':
+                raise _IssueImportError(u'import %s must succeed but is %s: %r'
+                    % (statusUrl, status['status'], status.get('errors')))
+            result.append(long(status['issue_url'].rsplit('/', 1)[1]))
+        return result
+
+
+class _IssueMutationBatch(object):
+    """
+    Close, reopen and add label operations on existing issues, which are sent as aliased mutations of a single
+    GraphQL request once ``batchSize`` operations have been collected or `flush()` is called. Github runs
+    the mutations of a request one after another, so operations are performed in the order they were added.
+    """
+    def __init__(self, client, repoOwner, repoName, batchSize=GRAPHQL_BATCH_SIZE):
+        assert client is not None
+        assert repoOwner
+        assert repoName
+        assert batchSize > 0
+        self._client = client
+        self._repository = u'repository(owner: %s, name: %s)' % (
+            _graphQLString(repoOwner), _graphQLString(repoName))
+        self._batchSize = batchSize
+        self._operations = []
+        self._issueIds = {}
+        self._labelIds = {}
+        self.requestCount = 0
+
+    def __len__(self):
+        return len(self._operations)
+
+    def setIssueId(self, issueNumber, issueId):
+        """
+        Remember the GraphQL node id of issue ``issueNumber`` so it does not have to be looked up.
+        """
+        if issueId:
+            self._issueIds[issueNumber] = issueId
+
+    def close(self, issueNumber):
+        self._add(('close', issueNumber, None))
+
+    def reopen(self, issueNumber):
+        self._add(('reopen', issueNumber, None))
+
+    def addLabels(self, issueNumber, labelNames):
+        assert labelNames
+        self._add(('addLabels', issueNumber, tuple(labelNames)))
+
+    def _add(self, operation):
+        self._operations.append(operation)
+        if len(self._operations) >= self._batchSize:
+            self.flush()
+
+    def _execute(self, query):
+        _apiPauseIfNeeded()
+        self.requestCount += 1
+        return self._client.execute(query)
+
+    def _resolveIds(self):
+        """
+        Look up the node ids of all issues and labels of pending operations not known yet in one request.
+        """
+        issueNumbers = sorted(set(
+            issueNumber for _, issueNumber, _ in self._operations if issueNumber not in self._issueIds))
+        labelNames = sorted(set(
+            labelName for _, _, labelNames in self._operations for labelName in (labelNames or [])
+            if labelName not in self._labelIds))
+        if issueNumbers or labelNames:
+            fields = [u'i%d: issue(number: %d) { id }' % (issueNumber, issueNumber)
+                for issueNumber in issueNumbers]
+            fields += [u'l%d: label(name: %s) { id }' % (labelIndex, _graphQLString(labelName))
+                for labelIndex, labelName in enumerate(labelNames)]
+            repository = self._execute(u'query {\n  %s {\n    %s\n  }\n}' % (
+                self._repository, u'\n    '.join(fields)))['repository']
+            for issueNumber in issueNumbers:
+                issue = repository[u'i%d' % issueNumber]
+                if issue is None:
+                    raise _GraphQLError(u'issue #%d must exist' % issueNumber)
+                self._issueIds[issueNumber] = issue['id']
+            for labelIndex, labelName in enumerate(labelNames):
+                label = repository[u'l%d' % labelIndex]
+                if label is None:
+                    raise _GraphQLError(u'label "%s" must exist' % labelName)
+                self._labelIds[labelName] = label['id']
+
+    def flush(self):
+        if self._operations:
+            _log.info(u'  send batch of %d issue changes', len(self._operations))
+            self._resolveIds()
+            mutations = []
+            for operationIndex, (kind, issueNumber, labelNames) in enumerate(self._operations):
+                issueId = _graphQLString(self._issueIds[issueNumber])
+                if kind == 'close':
+                    mutation = u'closeIssue(input: {issueId: %s}) { clientMutationId }' % issueId
+                elif kind == 'reopen':
+                    mutation = u'reopenIssue(input: {issueId: %s}) { clientMutationId }' % issueId
+                else:
+                    assert kind == 'addLabels', u'kind=%r' % kind
+                    labelIds = u', '.join(_graphQLString(self._labelIds[labelName]) for labelName in labelNames)
+                    mutation = u'addLabelsToLabelable(input: {labelableId: %s, labelIds: [%s]}) ' \
+                        u'{ clientMutationId }' % (issueId, labelIds)
+                mutations.append(u'm%d: %s' % (operationIndex, mutation))
+            self._execute(u'mutation {\n  %s\n}' % u'\n  '.join(mutations))
+            for _, issueNumber, _ in self._operations:
+                self._issueIds.pop(issueNumber, None)
+            self._operations = []
+
+
 class _LabelTransformations(object):
-    def __init__(self, repo, definition, keywords):
-        assert repo is not None
+    """
+    Mapping of Trac fields and keywords to Github labels. Unless ``strict``, labels missing in the
+    repository are collected in ``missingLabelNames`` instead of raising a `_ConfigError`; they have to be
+    provided using `addLabel()` before being used.
+    """
+    def __init__(self, repo, definition, keywords, strict=True):
+        assert (repo is not None) or not strict
         self.repo = repo
+        self.missingLabelNames = set()
+        self._strict = strict
         self._transformations = []
         self._labelMap = {}
+        self._keywords = {}
         if definition or keywords:
             self._buildLabelMap()
             if definition:
@@ -332,8 +978,11 @@ class _LabelTransformations(object):
                 self._keywordSetUp(keywords)
 
     def _buildLabelMap(self):
-        _log.info(u'analyze existing labels')
         self._labelMap = {}
+        if self.repo is None:
+            # Without repository, all labels are considered missing.
+            return
+        _log.info(u'analyze existing labels')
         _apiPauseIfNeeded()
         for label in self.repo.get_labels():
             _log.debug(u'  found label "%s"', label.name)
@@ -378,9 +1027,11 @@ class _LabelTransformations(object):
             elif state == STATE_AT_LABEL:
                 labelValue = tokenText
                 if not labelValue in self._labelMap:
-                    raise _ConfigError(_OPTION_LABELS,
-                            u'unknown label "%s" must be replaced by one of: %s'
-                            % (labelValue, sorted(self._labelMap.keys())))
+                    if self._strict:
+                        raise _ConfigError(_OPTION_LABELS,
+                                u'unknown label "%s" must be replaced by one of: %s'
+                                % (labelValue, sorted(self._labelMap.keys())))
+                    self.missingLabelNames.add(labelValue)
                 self._transformations.append((tracField, tracValue, labelValue))
                 state = STATE_AT_COMMA
             elif state == STATE_AT_COMMA:
@@ -399,12 +1050,24 @@ class _LabelTransformations(object):
         keywords = filter(None, map(string.strip, keywords.split(',')))
         for kw in keywords:
             if kw not in self._labelMap:
-                raise _ConfigError(_OPTION_KEYWORDS,
-                    'unknown keyword "%s" must be manually '
-                    'added to repository as Label' % kw)
-            self._keywords[re.compile(r"\b%s\b" % kw)] = self._labelMap[kw]
-
-    def labelFor(self, tracField, tracValue):
+                if self._strict:
+                    raise _ConfigError(_OPTION_KEYWORDS,
+                        'unknown keyword "%s" must be manually '
+                        'added to repository as Label' % kw)
+                self.missingLabelNames.add(kw)
+            self._keywords[re.compile(r"\b%s\b" % kw)] = kw
+
+    def transformations(self):
+        """
+        List of triples of Trac field, Trac value and label name for each mapping of ``definition``.
+        """
+        return list(self._transformations)
+
+    def addLabel(self, label):
+        self._labelMap[label.name] = label
+        self.missingLabelNames.discard(label.name)
+
+    def labelNameFor(self, tracField, tracValue):
         assert tracField
         assert tracValue is not None
         result = None
@@ -413,14 +1076,20 @@ class _LabelTransformations(object):
             transformedField, transformedValueToCompareWith, transformedLabel = \
                     self._transformations[transformationIndex]
             if (transformedField == tracField) and (transformedValueToCompareWith == tracValue):
-                assert transformedLabel in self._labelMap
-                result = self._labelMap[transformedLabel]
+                result = transformedLabel
             else:
                 transformationIndex += 1
         return result
 
+    def labelFor(self, tracField, tracValue):
+        labelName = self.labelNameFor(tracField, tracValue)
+        if labelName is None:
+            return None
+        assert labelName in self._labelMap
+        return self._labelMap[labelName]
+
     def labelsForKeyWords(self, keywords):
-        return [label.name for regex, label in 
+        return [labelName for regex, labelName in 
             self._keywords.items() if 
             regex.search(keywords)]
 
@@ -436,6 +1105,32 @@ def _getConfigOption(config, name, required=True, defaultValue=None):
     return result
 
 
+def _getConfigBooleanOption(config, name, defaultValue=False):
+    text = _getConfigOption(config, name, False)
+    if text is None:
+        result = defaultValue
+    else:
+        result = _BOOLEAN_OPTION_VALUES.get(text.strip().lower())
+        if result is None:
+            raise _ConfigError(name, u'value must be one of %s but is: "%s"'
+                    % (sorted(_BOOLEAN_OPTION_VALUES.keys()), text))
+    return result
+
+
+def _getConfigIntegerOption(config, name, defaultValue, minimumValue=1):
+    text = _getConfigOption(config, name, False)
+    if text is None:
+        result = defaultValue
+    else:
+        try:
+            result = long(text)
+        except ValueError:
+            raise _ConfigError(name, u'value must be a number but is: "%s"' % text)
+        if result < minimumValue:
+            raise _ConfigError(name, u'value must be at least %d but is: %d' % (minimumValue, result))
+    return result
+
+
 def _shortened(text):
     assert text is not None
     # verbose ?
@@ -459,66 +1154,482 @@ def _convertWikiToMd(txt, currentticket):
     return trac_to_github(txt, _gitpath, currentticket)
 
 
-def _tracTicketMaps(ticketsCsvPath, existingIssues):
+_TICKET_COLUMN_COUNT = 13
+
+_FRESHDESK_TEMPLATE = u"\nFreshdesk: [{0}](https://retailarchitects.freshdesk.com/helpdesk/tickets/{0})"
+
+
+def _freshdeskInfo(freshdeskId):
+    return _FRESHDESK_TEMPLATE.format(freshdeskId) if freshdeskId else ''
+
+
+def _ticketsCsvRows(ticketsCsvPath, ticketsCsvIndex=None, firstTicketId=0):
     """
-    Sequence of maps where each items describes the relevant 
-    fields of each row from the tickets CSV exported
-    from Trac.
+    Pairs of ticket id and row for each ticket in the tickets CSV exported from Trac. With
+    ``ticketsCsvIndex``, tickets before ``firstTicketId`` are skipped without reading them.
     """
-    EXPECTED_COLUMN_COUNT = 13
     _log.info(u'read ticket details from "%s"', ticketsCsvPath)
-    lastHubIssue = len(existingIssues)
     with open(ticketsCsvPath, "rb") as ticketCsvFile:
+        firstRowIndex = 0
+        if ticketsCsvIndex is not None:
+            firstRowIndex = ticketsCsvIndex.seek(ticketCsvFile, firstTicketId)
         csvReader = _UnicodeCsvReader(ticketCsvFile)
-        hasReadHeader = False
-        for rowIndex, row in enumerate(csvReader):
+        hasReadHeader = firstRowIndex > 0
+        for rowIndex, row in enumerate(csvReader, firstRowIndex):
             columnCount = len(row)
-            if columnCount != EXPECTED_COLUMN_COUNT:
+            if columnCount != _TICKET_COLUMN_COUNT:
                 raise _CsvDataError(ticketsCsvPath, rowIndex,
                         u'ticket row must have %d columns but has %d: %r' %
-                        (EXPECTED_COLUMN_COUNT, columnCount, row))
+                        (_TICKET_COLUMN_COUNT, columnCount, row))
             if hasReadHeader:
-                ticketId = long(row[0])
-                if ticketId < lastHubIssue:
-                    continue
-                currentHubIssues = len(existingIssues)
-                if ticketId != lastHubIssue and \
-                   ticketId <= currentHubIssues:
-                    raise Exception("csv tickets out of order??: %d" % ticketId)
-                for i in range(ticketId - currentHubIssues - 1):
-                    # dummy ticket(s) needed to keep numbers in sync
-                    dummy = PLACEHOLDERTICKET.copy()
-                    dummy['id'] = currentHubIssues + i + 1
-                    yield dummy
-                ticketMap = {
-                    'id': ticketId,
-                    'type': row[1],
-                    'owner': row[2] and row[2].strip(),
-                    'reporter': row[3] and row[3].strip(),
-                    'milestone': row[4] and row[4].strip(),
-                    'status': row[5],
-                    'resolution': row[6],
-                    'summary': row[7],
-                    'description': _convertWikiToMd(row[8], ticketId),
-                    'createdtime': _timeFormatter(row[9]),
-                    'modifiedtime': _timeFormatter(row[10]),
-                    'freshdesk': u"\nFreshdesk: "
-                        "[{0}](https://retailarchitects.freshdesk.com/helpdesk/tickets/{0})".format(row[11]) 
-                            if row[11] else '',
-                    'keywords': row[12],
-                    'exists': False
-                }
-                if ticketId == lastHubIssue:
-                    # We may not have finished all comments
-                    ticketMap['exists'] = issue = existingIssues[ticketId]
-                    if issue.title != ticketMap['summary']:
-                        raise Exception("Last Git Hub Issue doesn't match [%s] != [%s]" %
-                            (issue.title, ticketMap['summary']))
-                yield ticketMap
+                yield long(row[0]), row
             else:
                 hasReadHeader = True
 
 
+def _indexedTicketsCsvRows(ticketsCsvPath, ticketsCsvIndex, ticketIds):
+    """
+    Pairs of ticket id and row for each of ``ticketIds`` in the tickets CSV. Each row is read after
+    moving to it using ``ticketsCsvIndex``, so no other rows are read.
+    """
+    with open(ticketsCsvPath, "rb") as ticketCsvFile:
+        for ticketId in ticketIds:
+            if ticketId in ticketsCsvIndex:
+                rowIndex = ticketsCsvIndex.seek(ticketCsvFile, ticketId)
+                row = _UnicodeCsvReader(ticketCsvFile).next()
+                columnCount = len(row)
+                if columnCount != _TICKET_COLUMN_COUNT:
+                    raise _CsvDataError(ticketsCsvPath, rowIndex,
+                            u'ticket row must have %d columns but has %d: %r' %
+                            (_TICKET_COLUMN_COUNT, columnCount, row))
+                yield ticketId, row
+
+
+def _ticketMapFromRow(ticketId, row):
+    return {
+        'id': ticketId,
+        'type': row[1],
+        'owner': row[2] and row[2].strip(),
+        'reporter': row[3] and row[3].strip(),
+        'milestone': row[4] and row[4].strip(),
+        'status': row[5],
+        'resolution': row[6],
+        'summary': row[7],
+        'description': _convertWikiToMd(row[8], ticketId),
+        'createdtime': _timeFormatter(row[9]),
+        'modifiedtime': _timeFormatter(row[10]),
+        'freshdesk': _freshdeskInfo(row[11]),
+        'keywords': row[12],
+        'exists': False
+    }
+
+
+def _placeholderTicketMap(ticketId):
+    result = PLACEHOLDERTICKET.copy()
+    result['id'] = ticketId
+    return result
+
+
+def _csvRowStarts(csvPath):
+    """
+    Triples of row index, byte offset and first line of each row in the CSV file ``csvPath``, which is
+    scanned memory mapped without parsing the rows.
+    """
+    with open(csvPath, 'rb') as csvFile:
+        if os.fstat(csvFile.fileno()).st_size == 0:
+            return
+        csvData = mmap.mmap(csvFile.fileno(), 0, access=mmap.ACCESS_READ)
+        try:
+            rowIndex = 0
+            rowOffset = 0
+            firstLine = None
+            quoteCount = 0
+            line = csvData.readline()
+            while line:
+                if firstLine is None:
+                    firstLine = line
+                # A row ends with the first line break outside of quotes, and escaped quotes come in pairs.
+                quoteCount += line.count('"')
+                if quoteCount % 2 == 0:
+                    yield rowIndex, rowOffset, firstLine
+                    rowIndex += 1
+                    rowOffset = csvData.tell()
+                    firstLine = None
+                    quoteCount = 0
+                line = csvData.readline()
+            if firstLine is not None:
+                # The last row lacks a closing quote.
+                yield rowIndex, rowOffset, firstLine
+        finally:
+            csvData.close()
+
+
+class _CsvIndex(object):
+    """
+    Byte offset and row index of the first row of each ticket in a CSV file exported from Trac, so rows
+    of tickets that are not needed can be skipped without parsing them.
+
+    The index is built by scanning the memory mapped CSV file once and stored in a sidecar file with the
+    suffix ``.index``, which is built anew once the CSV file changes.
+    """
+    _SUFFIX = '.index'
+
+    def __init__(self, csvPath):
+        assert csvPath is not None
+        self.csvPath = csvPath
+        self.indexPath = csvPath + self._SUFFIX
+        self._ids = array.array('l')
+        self._offsets = array.array('l')
+        self._rowIndexes = array.array('l')
+        self._rowCount = 0
+        if not self._read():
+            self._build()
+            self._write()
+
+    def __len__(self):
+        return len(self._ids)
+
+    def _csvStamp(self):
+        # The microseconds are kept apart from the seconds so that both fit into a 32 bit long.
+        csvStat = os.stat(self.csvPath)
+        mtimeSeconds = int(csvStat.st_mtime)
+        return [csvStat.st_size, mtimeSeconds, int(round((csvStat.st_mtime - mtimeSeconds) * 1000000))]
+
+    def _read(self):
+        """
+        ``True`` if the sidecar file exists and describes the current CSV file, in which case it has been
+        read.
+        """
+        if not os.path.exists(self.indexPath):
+            return False
+        values = array.array('l')
+        with open(self.indexPath, 'rb') as indexFile:
+            indexData = indexFile.read()
+        if len(indexData) % values.itemsize != 0:
+            return False
+        values.fromstring(indexData)
+        # The header is the CSV stamp followed by the number of rows and tickets.
+        csvStamp = self._csvStamp()
+        headerLength = len(csvStamp) + 2
+        if (len(values) < headerLength) or ((len(values) - headerLength) % 3 != 0) \
+                or (values[:len(csvStamp)].tolist() != csvStamp) \
+                or (values[headerLength - 1] != (len(values) - headerLength) // 3):
+            return False
+        self._rowCount = values[headerLength - 2]
+        self._ids = values[headerLength::3]
+        self._offsets = values[headerLength + 1::3]
+        self._rowIndexes = values[headerLength + 2::3]
+        _log.info(u'read index of %d tickets from "%s"', len(self._ids), self.indexPath)
+        return True
+
+    def _build(self):
+        _log.info(u'build index of "%s"', self.csvPath)
+        previousTicketId = None
+        for rowIndex, rowOffset, firstLine in _csvRowStarts(self.csvPath):
+            self._rowCount = rowIndex + 1
+            if rowIndex == 0:
+                continue
+            try:
+                ticketId = long(firstLine.split(',', 1)[0].strip().strip('"'))
+            except ValueError:
+                raise _CsvDataError(self.csvPath, rowIndex, u'row must start with a ticket id: %r' % firstLine)
+            if ticketId != previousTicketId:
+                if (previousTicketId is not None) and (ticketId < previousTicketId):
+                    raise _CsvDataError(self.csvPath, rowIndex,
+                        u'ticket ids must be in ascending order but %d follows %d' % (ticketId, previousTicketId))
+                self._ids.append(ticketId)
+                self._offsets.append(rowOffset)
+                self._rowIndexes.append(rowIndex)
+                previousTicketId = ticketId
+
+    def _write(self):
+        values = array.array('l', self._csvStamp() + [self._rowCount, len(self._ids)])
+        for ticketId, offset, rowIndex in itertools.izip(self._ids, self._offsets, self._rowIndexes):
+            values.extend((ticketId, offset, rowIndex))
+        temporaryPath = self.indexPath + '.tmp'
+        with open(temporaryPath, 'wb') as indexFile:
+            values.tofile(indexFile)
+        if os.name == 'nt' and os.path.exists(self.indexPath):
+            # Windows cannot rename to an existing file.
+            os.remove(self.indexPath)
+        os.rename(temporaryPath, self.indexPath)
+
+    def __contains__(self, ticketId):
+        position = bisect.bisect_left(self._ids, ticketId)
+        return (position < len(self._ids)) and (self._ids[position] == ticketId)
+
+    def lastTicketId(self):
+        return self._ids[-1] if self._ids else 0
+
+    def seek(self, csvFile, ticketId):
+        """
+        Move ``csvFile`` to the first row of the first ticket with an id of at least ``ticketId`` and
+        return the index of this row.
+        """
+        position = bisect.bisect_left(self._ids, ticketId)
+        if position < len(self._ids):
+            csvFile.seek(self._offsets[position])
+            result = self._rowIndexes[position]
+        else:
+            csvFile.seek(0, os.SEEK_END)
+            result = self._rowCount
+        return result
+
+
+class _CommitIndex(object):
+    """
+    Map of Trac ticket id to the sha ids of the git commits whose messages refer to it, oldest first.
+    References are found using the pattern of Trac's commit ticket updater, so for example ``#12``,
+    ``ticket:12`` and ``refs #12`` all refer to ticket 12.
+
+    The index is built from a single ``git log`` of HEAD and stored as JSON in ``indexPath``, which is
+    built anew once HEAD changes.
+    """
+    def __init__(self, gitRepoPath, indexPath):
+        assert gitRepoPath is not None
+        assert indexPath is not None
+        self.gitRepoPath = gitRepoPath
+        self.indexPath = indexPath
+        self._ticketToCommitsMap = {}
+        head = self._head()
+        if not self._read(head):
+            self._build(head)
+            self._write(head)
+
+    def __len__(self):
+        return len(self._ticketToCommitsMap)
+
+    def _head(self):
+        revParse = subprocess.Popen(['git', 'rev-parse', '--verify', '--quiet', 'HEAD'], cwd=self.gitRepoPath,
+            stdout=subprocess.PIPE)
+        result = revParse.communicate()[0].strip()
+        if revParse.returncode:
+            raise _ConfigError('gitpath', u'"%s" must be a git repository with at least one commit'
+                % self.gitRepoPath)
+        return result
+
+    def _read(self, head):
+        """
+        ``True`` if the index file exists and describes ``head``, in which case it has been read.
+        """
+        if not os.path.exists(self.indexPath):
+            return False
+        with open(self.indexPath, 'rb') as indexFile:
+            data = json.load(indexFile)
+        if data.get('head') != head:
+            return False
+        self._ticketToCommitsMap = dict((long(ticketId), shas) for ticketId, shas in data['tickets'].iteritems())
+        _log.info(u'read commits referring to %d tickets from "%s"', len(self), self.indexPath)
+        return True
+
+    def _build(self, head):
+        from tracopt.ticket.commit_updater import CommitTicketUpdater
+        from tracopt.versioncontrol.git.PyGIT import read_nul_separated
+
+        _log.info(u'find commits referring to tickets in "%s"', self.gitRepoPath)
+        commitCount = 0
+        gitLog = subprocess.Popen(['git', 'log', '--no-color', '-z', '--format=%H%n%B', head],
+            cwd=self.gitRepoPath, stdout=subprocess.PIPE)
+        try:
+            for commit in read_nul_separated(gitLog.stdout):
+                sha, _, message = commit.partition('\n')
+                for ticketId in set(CommitTicketUpdater.ticket_re.findall(message)):
+                    self._ticketToCommitsMap.setdefault(long(ticketId), []).append(sha)
+                commitCount += 1
+        finally:
+            gitLog.stdout.close()
+            gitLog.wait()
+        # git log starts with the youngest commit.
+        for shas in self._ticketToCommitsMap.itervalues():
+            shas.reverse()
+        _log.info(u'  found %d commits referring to %d tickets', commitCount, len(self))
+
+    def _write(self, head):
+        _log.info(u'write commit index to "%s"', self.indexPath)
+        temporaryPath = self.indexPath + '.tmp'
+        with open(temporaryPath, 'wb') as indexFile:
+            json.dump({'head': head, 'tickets': self._ticketToCommitsMap}, indexFile)
+        if os.name == 'nt' and os.path.exists(self.indexPath):
+            # Windows cannot rename to an existing file.
+            os.remove(self.indexPath)
+        os.rename(temporaryPath, self.indexPath)
+
+    def commits(self, ticketId):
+        return self._ticketToCommitsMap.get(ticketId, [])
+
+
+class _TicketTable(object):
+    """
+    The tickets CSV exported from Trac parsed once into one column per field.
+
+    Ids and time stamps are stored as integer arrays, and repeating values like users, milestones, types
+    and states are interned so all tickets share the same string. Rows are accessed through lightweight
+    `_TicketRow` views, and pre-passes can scan single columns using `column()`.
+    """
+    _INTERNED_COLUMNS = ('type', 'owner', 'reporter', 'milestone', 'status', 'resolution', 'keywords')
+    _TEXT_COLUMNS = ('summary', 'description', 'freshdesk')
+    _TIME_COLUMNS = ('createdtime', 'modifiedtime')
+
+    def __init__(self, ticketsCsvPath):
+        assert ticketsCsvPath is not None
+        self.ids = array.array('l')
+        self._columns = {}
+        for name in self._INTERNED_COLUMNS + self._TEXT_COLUMNS:
+            self._columns[name] = []
+        for name in self._TIME_COLUMNS:
+            self._columns[name] = array.array('l')
+        self._indexOfId = {}
+        internedStrings = {}
+
+        def interned(text):
+            return internedStrings.setdefault(text, text)
+
+        types = self._columns['type']
+        owners = self._columns['owner']
+        reporters = self._columns['reporter']
+        milestones = self._columns['milestone']
+        statuses = self._columns['status']
+        resolutions = self._columns['resolution']
+        keywords = self._columns['keywords']
+        summaries = self._columns['summary']
+        descriptions = self._columns['description']
+        freshdesks = self._columns['freshdesk']
+        createdTimes = self._columns['createdtime']
+        modifiedTimes = self._columns['modifiedtime']
+        for ticketId, row in _ticketsCsvRows(ticketsCsvPath):
+            self._indexOfId[ticketId] = len(self.ids)
+            self.ids.append(ticketId)
+            types.append(interned(row[1]))
+            owners.append(interned(row[2].strip()))
+            reporters.append(interned(row[3].strip()))
+            milestones.append(interned(row[4].strip()))
+            statuses.append(interned(row[5]))
+            resolutions.append(interned(row[6]))
+            summaries.append(row[7])
+            descriptions.append(row[8])
+            createdTimes.append(long(row[9]) if row[9] else 0)
+            modifiedTimes.append(long(row[10]) if row[10] else 0)
+            freshdesks.append(interned(row[11]))
+            keywords.append(interned(row[12]))
+        _log.info(u'  read %d tickets into columns', len(self.ids))
+
+    def __len__(self):
+        return len(self.ids)
+
+    def column(self, name):
+        """
+        All values of the field ``name`` in the same order as `ids`.
+        """
+        return self._columns[name]
+
+    def distinctValues(self, name):
+        return set(self._columns[name])
+
+    def row(self, ticketId):
+        return _TicketRow(self, self._indexOfId[ticketId], ticketId)
+
+    def placeholder(self, ticketId):
+        return _TicketRow(self, None, ticketId)
+
+    def tickets(self):
+        """
+        Pairs of ticket id and function creating the `_TicketRow` for this ticket.
+        """
+        for ticketId in self.ids:
+            yield ticketId, lambda ticketId=ticketId: self.row(ticketId)
+
+    def value(self, index, name):
+        result = self._columns[name][index]
+        if name in self._TIME_COLUMNS:
+            result = _timeFormatter(result)
+        elif name == 'description':
+            result = _convertWikiToMd(result, self.ids[index])
+        elif name == 'freshdesk':
+            result = _freshdeskInfo(result)
+        return result
+
+
+class _TicketRow(object):
+    """
+    View on a single ticket of a `_TicketTable` that can be used like the map of `_ticketMapFromRow()`.
+    Values are computed when accessed, except for the converted description, which is computed only once.
+    Without index, the view represents a placeholder ticket.
+    """
+    __slots__ = ('_table', '_index', '_id', '_exists', '_description')
+
+    _KEYS = ('id', 'exists') + _TicketTable._INTERNED_COLUMNS + _TicketTable._TEXT_COLUMNS \
+        + _TicketTable._TIME_COLUMNS
+
+    def __init__(self, table, index, ticketId):
+        self._table = table
+        self._index = index
+        self._id = ticketId
+        self._exists = False
+        self._description = None
+
+    def keys(self):
+        return list(self._KEYS)
+
+    def __getitem__(self, key):
+        if key == 'id':
+            result = self._id
+        elif key == 'exists':
+            result = self._exists
+        elif self._index is None:
+            result = PLACEHOLDERTICKET.get(key, u'')
+        elif key == 'description':
+            if self._description is None:
+                self._description = self._table.value(self._index, key)
+            result = self._description
+        elif key in self._KEYS:
+            result = self._table.value(self._index, key)
+        else:
+            raise KeyError(key)
+        return result
+
+    def __setitem__(self, key, value):
+        if key != 'exists':
+            raise KeyError(key)
+        self._exists = value
+
+
+def _tracTicketMaps(ticketsCsvPath, existingIssues, ticketTable=None, ticketsCsvIndex=None):
+    """
+    Sequence of maps where each items describes the relevant 
+    fields of each row from the tickets CSV exported
+    from Trac. With ``ticketTable``, the items are `_TicketRow`
+    views on this table instead. With ``ticketsCsvIndex``,
+    rows of tickets having an issue already are not read.
+    """
+    if ticketTable is None:
+        tickets = ((ticketId, lambda ticketId=ticketId, row=row: _ticketMapFromRow(ticketId, row))
+            for ticketId, row in _ticketsCsvRows(ticketsCsvPath, ticketsCsvIndex, len(existingIssues)))
+        createPlaceholder = _placeholderTicketMap
+    else:
+        tickets = ticketTable.tickets()
+        createPlaceholder = ticketTable.placeholder
+    lastHubIssue = len(existingIssues)
+    for ticketId, createTicketMap in tickets:
+        if ticketId < lastHubIssue:
+            continue
+        currentHubIssues = len(existingIssues)
+        if ticketId != lastHubIssue and \
+           ticketId <= currentHubIssues:
+            raise Exception("csv tickets out of order??: %d" % ticketId)
+        for i in range(ticketId - currentHubIssues - 1):
+            # dummy ticket(s) needed to keep numbers in sync
+            yield createPlaceholder(currentHubIssues + i + 1)
+        ticketMap = createTicketMap()
+        if ticketId == lastHubIssue:
+            # We may not have finished all comments
+            ticketMap['exists'] = True
+            issueTitle = existingIssues.title(ticketId)
+            if issueTitle != ticketMap['summary']:
+                raise Exception("Last Git Hub Issue doesn't match [%s] != [%s]" %
+                    (issueTitle, ticketMap['summary']))
+        yield ticketMap
+
+
 def _createMilestoneMap(repo):
     def addMilestones(targetMap, state):
         _apiPauseIfNeeded()
@@ -538,8 +1649,8 @@ def _createIssueMap(repo):
         _apiPauseIfNeeded()
         for issue in repo.get_issues(state=state):
             _log.debug(u'  %s: (%s) %s', issue.number, issue.state, issue.title)
-            targetMap[issue.number] = issue
-    result = {}
+            targetMap.add(issue.number, issue.title, issue.state, issue.comments)
+    result = _IssueRegistry()
     _log.info(u'analyze existing issues')
     addIssues(result, 'open')
     addIssues(result, 'closed')
@@ -547,15 +1658,80 @@ def _createIssueMap(repo):
     return result
 
 
-def _createTicketToCommentsMap(commentsCsvPath):
+_ISSUE_PAGE_QUERY = u'''query {
+  repository(owner: %(owner)s, name: %(name)s) {
+    %(connection)s(first: %(pageSize)d%(after)s, orderBy: {field: CREATED_AT, direction: ASC}) {
+      pageInfo { hasNextPage endCursor }
+      nodes { number title state comments { totalCount } }
+    }
+  }
+  rateLimit { cost remaining }
+}'''
+
+
+def _createIssueMapUsingGraphQL(repo, graphql, highestTicketId=None):
+    """
+    Like `_createIssueMap()` but reads only the fields needed, 100 issues per GraphQL request. Pull
+    requests are included because they share their numbers with issues. Once more than ``highestTicketId``
+    issues have been read, reading stops as later issues cannot belong to a Trac ticket.
+    """
+    repoOwner, repoName = repo.full_name.split('/', 1)
+    result = _IssueRegistry()
+    _log.info(u'analyze existing issues using GraphQL')
+    requestCount = 0
+    for connection in ('issues', 'pullRequests'):
+        cursor = None
+        hasNextPage = True
+        while hasNextPage:
+            _apiPauseIfNeeded()
+            data = graphql.execute(_ISSUE_PAGE_QUERY % {
+                'owner': _graphQLString(repoOwner),
+                'name': _graphQLString(repoName),
+                'connection': connection,
+                'pageSize': GRAPHQL_PAGE_SIZE,
+                'after': (u', after: %s' % _graphQLString(cursor)) if cursor else u'',
+            })
+            requestCount += 1
+            page = data['repository'][connection]
+            for node in page['nodes']:
+                state = 'open' if node['state'] == 'OPEN' else 'closed'
+                _log.debug(u'  %s: (%s) %s', node['number'], state, node['title'])
+                result.add(node['number'], node['title'], state, node['comments']['totalCount'])
+            _log.debug(u'  GraphQL rate limit: cost=%(cost)s, remaining=%(remaining)s', data['rateLimit'])
+            hasNextPage = page['pageInfo']['hasNextPage']
+            cursor = page['pageInfo']['endCursor']
+            if (highestTicketId is not None) and page['nodes'] and (page['nodes'][-1]['number'] > highestTicketId):
+                hasNextPage = False
+    _log.info(u'  found %d issues in %d requests', len(result), requestCount)
+    return result
+
+
+def _highestTicketId(ticketsCsvPath, ticketTable, ticketsCsvIndex=None):
+    if ticketsCsvIndex is not None:
+        ticketIds = [ticketsCsvIndex.lastTicketId()]
+    elif ticketTable is not None:
+        ticketIds = ticketTable.ids
+    else:
+        ticketIds = (ticketId for ticketId, _ in _ticketsCsvRows(ticketsCsvPath))
+    return max(itertools.chain([0], ticketIds))
+
+
+def _createTicketToCommentsMap(commentsCsvPath, commentsCsvIndex=None, firstTicketId=0):
+    """
+    Map of ticket id to the list of comments of this ticket. With ``commentsCsvIndex``, comments of tickets
+    before ``firstTicketId`` are skipped without reading them.
+    """
     EXPECTED_COLUMN_COUNT = 5
     result = {}
     if commentsCsvPath is not None:
         _log.info(u'read ticket comments from "%s"', commentsCsvPath)
         with open(commentsCsvPath, "rb") as commentsCsvFile:
+            firstRowIndex = 0
+            if commentsCsvIndex is not None:
+                firstRowIndex = commentsCsvIndex.seek(commentsCsvFile, firstTicketId)
             csvReader = _UnicodeCsvReader(commentsCsvFile)
-            hasReadHeader = False
-            for rowIndex, row in enumerate(csvReader):
+            hasReadHeader = firstRowIndex > 0
+            for rowIndex, row in enumerate(csvReader, firstRowIndex):
                 columnCount = len(row)
                 if columnCount != EXPECTED_COLUMN_COUNT:
                     raise _CsvDataError(commentsCsvPath, rowIndex,
@@ -564,6 +1740,7 @@ def _createTicketToCommentsMap(commentsCsvPath):
                 if hasReadHeader:
                     commentMap = {
                         'id': long(row[0]),
+                        'time': long(row[1]) if row[1] else 0,
                         'date': _timeFormatter(row[1]),
                         'author': row[2],
                         'type': row[3],
@@ -615,6 +1792,790 @@ def _createTicketsToAttachmentsMap(attachmentsCsvPath, attachmentsPrefix):
     return result
 
 
+class _AttachmentError(Exception):
+    pass
+
+
+def _attachmentFilePath(tracEnvPath, ticketId, filename):
+    """
+    Path of the file Trac stores the attachment ``filename`` of ticket ``ticketId`` in.
+    """
+    from trac.attachment import Attachment
+    return Attachment._get_path(tracEnvPath, 'ticket', unicode(ticketId), filename)
+
+
+def _gitBlobHash(size):
+    """
+    SHA-1 object to compute the id git gives a blob of ``size`` bytes.
+    """
+    return hashlib.sha1('blob %d\0' % size)
+
+
+def _fileBlobId(path):
+    result = _gitBlobHash(os.path.getsize(path))
+    with open(path, 'rb') as fileToHash:
+        for block in iter(lambda: fileToHash.read(ATTACHMENT_BLOCK_SIZE), ''):
+            result.update(block)
+    return result.hexdigest()
+
+
+def _fastImportPath(path):
+    """
+    ``path`` quoted for a ``git fast-import`` stream if necessary.
+    """
+    if any(character in path for character in '"\\\n'):
+        path = '"%s"' % path.replace('\\', '\\\\').replace('"', '\\"').replace('\n', '\\n')
+    return path
+
+
+def _scannedAttachmentFile(filePath):
+    """
+    Size, SHA-1 and git blob id of the file at ``filePath``, or ``None`` if there is no such file.
+    """
+    try:
+        size = os.path.getsize(filePath)
+    except OSError:
+        return None
+    contentHash = hashlib.sha1()
+    blobHash = _gitBlobHash(size)
+    if size > 0:
+        with open(filePath, 'rb') as attachmentFile:
+            attachmentData = mmap.mmap(attachmentFile.fileno(), 0, access=mmap.ACCESS_READ)
+            try:
+                # Hashing releases the GIL, so other threads can hash in the meantime.
+                contentHash.update(attachmentData)
+                blobHash.update(attachmentData)
+            finally:
+                attachmentData.close()
+    return size, contentHash.hexdigest(), blobHash.hexdigest()
+
+
+def scanAttachments(tracEnvPath, tracTicketToAttachmentsMap, manifestPath=None,
+        threadCount=ATTACHMENT_SCAN_THREAD_COUNT):
+    """
+    Add the file ``path``, ``size``, ``sha1`` and git ``blobId`` to each attachment in
+    ``tracTicketToAttachmentsMap``, with ``size`` being ``None`` for missing files. Attachments with the same content as a previous one
+    get the previous one as ``duplicateOf`` and link to its ``fullpath``.
+
+    Files are examined by ``threadCount`` threads. With ``manifestPath``, the results are also written to
+    a CSV file.
+    """
+    assert tracEnvPath is not None
+    assert tracTicketToAttachmentsMap is not None
+    assert threadCount > 0
+
+    attachments = []
+    for ticketId in sorted(tracTicketToAttachmentsMap):
+        for attachment in tracTicketToAttachmentsMap[ticketId]:
+            attachment['path'] = _attachmentFilePath(tracEnvPath, ticketId, attachment['filename'])
+            attachments.append((ticketId, attachment))
+    _log.info(u'scan %d attachments in "%s"', len(attachments), tracEnvPath)
+    threadPool = multiprocessing.pool.ThreadPool(threadCount)
+    try:
+        scannedFiles = threadPool.map(_scannedAttachmentFile, [attachment['path'] for _, attachment in attachments])
+    finally:
+        threadPool.close()
+        threadPool.join()
+    attachmentForHash = {}
+    missingCount = 0
+    duplicateCount = 0
+    totalSize = 0
+    for (ticketId, attachment), scannedFile in itertools.izip(attachments, scannedFiles):
+        attachment['duplicateOf'] = None
+        if scannedFile is None:
+            attachment['size'] = None
+            attachment['sha1'] = None
+            attachment['blobId'] = None
+            _log.warning(u'cannot find attachment "%s" of ticket #%d at "%s"', attachment['filename'], ticketId,
+                attachment['path'])
+            missingCount += 1
+        else:
+            attachment['size'], attachment['sha1'], attachment['blobId'] = scannedFile
+            originalAttachment = attachmentForHash.setdefault(attachment['sha1'], attachment)
+            if originalAttachment is not attachment:
+                attachment['duplicateOf'] = originalAttachment
+                attachment['fullpath'] = originalAttachment['fullpath']
+                duplicateCount += 1
+            else:
+                totalSize += attachment['size']
+    _log.info(u'  found %d missing and %d duplicate attachments; %d distinct files take %s', missingCount,
+        duplicateCount, len(attachmentForHash), _memorySizeText(totalSize))
+    if manifestPath is not None:
+        _log.info(u'write attachment manifest to "%s"', manifestPath)
+        with open(manifestPath, 'wb') as manifestFile:
+            manifestWriter = csv.writer(manifestFile)
+            manifestWriter.writerow(['ticket', 'filename', 'size', 'sha1', 'missing', 'duplicate_of'])
+            for ticketId, attachment in attachments:
+                originalAttachment = attachment['duplicateOf']
+                manifestWriter.writerow([
+                    ticketId,
+                    attachment['filename'].encode('utf-8'),
+                    attachment['size'] if attachment['size'] is not None else '',
+                    attachment['sha1'] or '',
+                    'yes' if attachment['size'] is None else 'no',
+                    (u'%d/%s' % (originalAttachment['id'], originalAttachment['filename'])).encode('utf-8')
+                        if originalAttachment is not None else '',
+                ])
+
+
+def publishAttachments(tracEnvPath, gitRepoPath, tracTicketToAttachmentsMap, branch=ATTACHMENTS_BRANCH,
+        pretend=True):
+    """
+    Commit the files of all attachments in ``tracTicketToAttachmentsMap`` to ``branch`` of the git
+    repository at ``gitRepoPath`` using a single ``git fast-import``, with each file stored as
+    ``<ticket id>/<filename>``. Files with the same content are stored only once. Attachments examined by
+    `scanAttachments()` are not read again to compute their hash, and duplicates are skipped.
+
+    Files already on ``branch`` with the same content are neither read nor streamed again, and if the
+    branch already holds exactly these files, no commit is made at all.
+
+    The result is a pair of the number of files and the number of distinct files published.
+    """
+    assert tracEnvPath is not None
+    assert gitRepoPath is not None
+    assert tracTicketToAttachmentsMap is not None
+    assert branch
+
+    attachmentFiles = []
+    for ticketId in sorted(tracTicketToAttachmentsMap):
+        for attachment in tracTicketToAttachmentsMap[ticketId]:
+            if 'size' in attachment:
+                # Missing files have been reported by scanAttachments() already.
+                if (attachment['size'] is not None) and (attachment['duplicateOf'] is None):
+                    attachmentFiles.append((u'%d/%s' % (ticketId, attachment['filename']), attachment['path'],
+                        attachment['blobId']))
+            else:
+                filePath = _attachmentFilePath(tracEnvPath, ticketId, attachment['filename'])
+                if os.path.isfile(filePath):
+                    attachmentFiles.append((u'%d/%s' % (ticketId, attachment['filename']), filePath, None))
+                else:
+                    _log.warning(u'cannot find attachment "%s" of ticket #%d at "%s"', attachment['filename'],
+                        ticketId, filePath)
+    _log.info(u'publish %d attachments to branch "%s" of "%s"', len(attachmentFiles), branch, gitRepoPath)
+    if pretend:
+        return len(attachmentFiles), len(set(contentHash or filePath for _, filePath, contentHash in attachmentFiles))
+    branchRef = 'refs/heads/%s' % branch
+    revParse = subprocess.Popen(['git', 'rev-parse', '--verify', '--quiet', branchRef], cwd=gitRepoPath,
+        stdout=subprocess.PIPE)
+    revParse.communicate()
+    hasBranch = revParse.returncode == 0
+    branchBlobIds = {}
+    if hasBranch:
+        lsTree = subprocess.check_output(['git', 'ls-tree', '-r', '-z', branchRef], cwd=gitRepoPath)
+        for entry in lsTree.rstrip('\0').split('\0') if lsTree else []:
+            entryInfo, entryPath = entry.split('\t', 1)
+            branchBlobIds[entryPath.decode('utf-8')] = entryInfo.split()[2]
+    fileBlobIds = []
+    for branchPath, filePath, blobId in attachmentFiles:
+        if blobId is None:
+            blobId = _fileBlobId(filePath)
+        fileBlobIds.append((branchPath, filePath, blobId))
+    distinctCount = len(set(blobId for _, _, blobId in fileBlobIds))
+    if dict((branchPath, blobId) for branchPath, _, blobId in fileBlobIds) == branchBlobIds:
+        _log.info(u'  branch "%s" already holds all %d attachments', branch, len(attachmentFiles))
+        return len(attachmentFiles), distinctCount
+    knownBlobIds = set(branchBlobIds.itervalues())
+    fastImport = subprocess.Popen(['git', 'fast-import', '--quiet'], cwd=gitRepoPath, stdin=subprocess.PIPE)
+    blobMarks = {}
+    try:
+        fileRefs = []
+        for branchPath, filePath, blobId in fileBlobIds:
+            if blobId in knownBlobIds:
+                fileRefs.append((branchPath, blobId))
+                continue
+            blobMark = blobMarks.get(blobId)
+            if blobMark is None:
+                blobMark = len(blobMarks) + 1
+                blobMarks[blobId] = blobMark
+                fastImport.stdin.write('blob\nmark :%d\ndata %d\n' % (blobMark, os.path.getsize(filePath)))
+                with open(filePath, 'rb') as attachmentFile:
+                    shutil.copyfileobj(attachmentFile, fastImport.stdin, ATTACHMENT_BLOCK_SIZE)
+                fastImport.stdin.write('\n')
+            fileRefs.append((branchPath, ':%d' % blobMark))
+        message = 'Add attachments of %d Trac tickets\n' % len(tracTicketToAttachmentsMap)
+        fastImport.stdin.write('commit %s\ncommitter tratihubis <tratihubis> %d +0000\ndata %d\n%s'
+            % (branchRef, int(time.time()), len(message), message))
+        if hasBranch:
+            fastImport.stdin.write('from %s^0\n' % branchRef)
+        fastImport.stdin.write('deleteall\n')
+        for branchPath, blobRef in fileRefs:
+            fastImport.stdin.write('M 100644 %s %s\n' % (blobRef, _fastImportPath(branchPath.encode('utf-8'))))
+        fastImport.stdin.write('\n')
+    finally:
+        fastImport.stdin.close()
+    if fastImport.wait() != 0:
+        raise _AttachmentError(u'git fast-import must store attachments in "%s" but exited with %d'
+            % (gitRepoPath, fastImport.returncode))
+    _log.info(u'  stored %d attachments in %d files with %d new; to publish them, run: git push origin %s',
+        len(attachmentFiles), distinctCount, len(blobMarks), branch)
+    return len(attachmentFiles), distinctCount
+
+
+# Column count and indexes of columns with time stamps for each kind of CSV file.
+_CSV_LAYOUTS = {
+    'tickets': (_TICKET_COLUMN_COUNT, (9, 10)),
+    'comments': (5, (1,)),
+    'attachments': (4, (2,)),
+}
+
+
+def _csvChunks(csvPath, rowsPerChunk=PREFLIGHT_CHUNK_ROWS):
+    """
+    Triples of byte offset, length in bytes and index of the first row for consecutive chunks of
+    ``csvPath`` each holding up to ``rowsPerChunk`` rows.
+    """
+    chunkStarts = [(rowOffset, rowIndex) for rowIndex, rowOffset, _ in _csvRowStarts(csvPath)
+        if rowIndex % rowsPerChunk == 0]
+    csvSize = os.path.getsize(csvPath)
+    for chunkIndex, (chunkOffset, firstRowIndex) in enumerate(chunkStarts):
+        if chunkIndex + 1 < len(chunkStarts):
+            chunkEnd = chunkStarts[chunkIndex + 1][0]
+        else:
+            chunkEnd = csvSize
+        yield chunkOffset, chunkEnd - chunkOffset, firstRowIndex
+
+
+def _validatedCsvChunk(chunk):
+    """
+    Findings for the rows of one chunk of a CSV file as described by `_csvChunks()`, which runs in a worker
+    process of `validateExports()`. ``chunk`` is a tuple of kind of CSV file, its path, and the chunk's
+    offset, length and first row index.
+    """
+    kind, csvPath, chunkOffset, chunkLength, firstRowIndex = chunk
+    columnCount, timeColumns = _CSV_LAYOUTS[kind]
+    result = {'errors': [], 'warnings': [], 'ids': [], 'values': {}}
+    with open(csvPath, 'rb') as csvFile:
+        csvFile.seek(chunkOffset)
+        chunkData = csvFile.read(chunkLength)
+
+    def addValue(name, value, rowIndex):
+        result['values'].setdefault(name, {}).setdefault(value, rowIndex)
+
+    rowIndex = firstRowIndex
+    try:
+        for rowIndex, row in enumerate(_UnicodeCsvReader(StringIO.StringIO(chunkData)), firstRowIndex):
+            if rowIndex == 0:
+                continue
+            if len(row) != columnCount:
+                result['errors'].append((rowIndex, u'row must have %d columns but has %d: %r'
+                    % (columnCount, len(row), row)))
+                continue
+            try:
+                result['ids'].append((rowIndex, long(row[0])))
+            except ValueError:
+                result['errors'].append((rowIndex, u'ticket id must be a number but is: %r' % row[0]))
+            for columnIndex in timeColumns:
+                if row[columnIndex] and not row[columnIndex].isdigit():
+                    result['errors'].append((rowIndex, u'time stamp in column %d must be a number but is: %r'
+                        % (columnIndex + 1, row[columnIndex])))
+            text = u''
+            if kind == 'tickets':
+                if len(row[7]) > GITHUB_TITLE_LIMIT:
+                    result['errors'].append((rowIndex, u'summary must have at most %d characters but has %d'
+                        % (GITHUB_TITLE_LIMIT, len(row[7]))))
+                addValue('owner', row[2].strip(), rowIndex)
+                addValue('milestone', row[4], rowIndex)
+                addValue('type', row[1], rowIndex)
+                addValue('resolution', row[6], rowIndex)
+                addValue('keywords', row[12], rowIndex)
+                text = row[8]
+            elif kind == 'comments':
+                text = row[4]
+            if len(text) > GITHUB_BODY_LIMIT:
+                result['warnings'].append((rowIndex, u'text has %d characters and will be split into several parts'
+                    % len(text)))
+    except (csv.Error, UnicodeError), error:
+        result['errors'].append((rowIndex, u'row must be valid CSV encoded in UTF-8: %s' % error))
+    return result
+
+
+def validateExports(ticketsCsvPath,
+        commentsCsvPath=None,
+        attachmentsCsvPath=None,
+        userMapping='*:*',
+        labelMapping=None,
+        keywords=None,
+        processCount=None):
+    """
+    Pair of lists with error and warning messages found by checking the exported CSV files and the mapping
+    of users and labels without accessing Github. The rows of the CSV files are checked in chunks by
+    ``processCount`` processes, which defaults to the number of CPUs.
+    """
+    assert ticketsCsvPath is not None
+    assert userMapping is not None
+
+    findings = {'errors': [], 'warnings': []}
+
+    def addFinding(kind, csvPath, rowIndex, message):
+        findings[kind].append((os.path.basename(csvPath), rowIndex, message))
+
+    def addConfigFinding(kind, option, message):
+        findings[kind].append((u'', 0, unicode(_ConfigError(option, message))))
+
+    csvPaths = [('tickets', ticketsCsvPath), ('comments', commentsCsvPath), ('attachments', attachmentsCsvPath)]
+    chunks = []
+    for csvKind, csvPath in csvPaths:
+        if csvPath is not None:
+            _log.info(u'check "%s"', csvPath)
+            for chunkOffset, chunkLength, firstRowIndex in _csvChunks(csvPath):
+                chunks.append((csvKind, csvPath, chunkOffset, chunkLength, firstRowIndex))
+    processPool = multiprocessing.Pool(processCount)
+    try:
+        chunkResults = processPool.map(_validatedCsvChunk, chunks)
+    finally:
+        processPool.close()
+        processPool.join()
+
+    ticketIds = set()
+    ticketValues = {}
+    previousTicketIds = {}
+    for (csvKind, csvPath, _, _, _), chunkResult in itertools.izip(chunks, chunkResults):
+        for kind in ('errors', 'warnings'):
+            for rowIndex, message in chunkResult[kind]:
+                addFinding(kind, csvPath, rowIndex, message)
+        for rowIndex, ticketId in chunkResult['ids']:
+            previousTicketId = previousTicketIds.get(csvKind)
+            if csvKind == 'tickets':
+                if (previousTicketId is not None) and (ticketId <= previousTicketId):
+                    addFinding('errors', csvPath, rowIndex,
+                        u'ticket ids must be in ascending order but %d follows %d' % (ticketId, previousTicketId))
+                ticketIds.add(ticketId)
+            elif csvKind == 'comments':
+                if (previousTicketId is not None) and (ticketId < previousTicketId):
+                    addFinding('errors', csvPath, rowIndex,
+                        u'comments must be ordered by ticket but ticket %d follows %d' % (ticketId, previousTicketId))
+            previousTicketIds[csvKind] = ticketId
+        for name, valueRows in chunkResult['values'].iteritems():
+            for value, rowIndex in valueRows.iteritems():
+                ticketValues.setdefault(name, {}).setdefault(value, rowIndex)
+    for csvKind, csvPath in csvPaths[1:]:
+        if csvPath is not None:
+            unknownTicketIds = set()
+            for (chunkKind, _, _, _, _), chunkResult in itertools.izip(chunks, chunkResults):
+                if chunkKind == csvKind:
+                    for rowIndex, ticketId in chunkResult['ids']:
+                        if (ticketId not in ticketIds) and (ticketId not in unknownTicketIds):
+                            addFinding('warnings', csvPath, rowIndex, u'ticket %d does not exist and will be ignored'
+                                % ticketId)
+                            unknownTicketIds.add(ticketId)
+
+    try:
+        tracToGithubUserMap = _createTracToGithubUserMap(userMapping, validate=False)
+    except _ConfigError, error:
+        findings['errors'].append((u'', 0, unicode(error)))
+    else:
+        for owner, rowIndex in sorted(ticketValues.get('owner', {}).iteritems()):
+            try:
+                _githubUserFor(tracToGithubUserMap, owner, validate=False)
+            except _ConfigError, error:
+                addFinding('errors', ticketsCsvPath, rowIndex, unicode(error))
+
+    milestoneTitles = {}
+    for milestone, rowIndex in sorted(ticketValues.get('milestone', {}).iteritems()):
+        otherMilestone = milestoneTitles.setdefault(milestone.strip(), milestone)
+        if otherMilestone != milestone:
+            addFinding('warnings', ticketsCsvPath, rowIndex, u'milestones %r and %r will be merged'
+                % (otherMilestone, milestone))
+    try:
+        labelTransformations = _LabelTransformations(None, labelMapping, keywords, strict=False)
+    except _ConfigError, error:
+        findings['errors'].append((u'', 0, unicode(error)))
+    else:
+        for tracField, tracValue, labelName in labelTransformations.transformations():
+            if tracField not in ('type', 'resolution'):
+                addConfigFinding('errors', _OPTION_LABELS,
+                    u'Trac field must be "type" or "resolution" but is: "%s"' % tracField)
+            elif tracValue not in ticketValues.get(tracField, {}):
+                addConfigFinding('warnings', _OPTION_LABELS,
+                    u'no ticket has %s "%s" to be mapped to label "%s"' % (tracField, tracValue, labelName))
+        for labelName in sorted(labelTransformations.missingLabelNames):
+            if len(labelName) > GITHUB_LABEL_NAME_LIMIT:
+                addConfigFinding('errors', _OPTION_LABELS, u'label "%s" must have at most %d characters'
+                    % (labelName, GITHUB_LABEL_NAME_LIMIT))
+    # Order by CSV file and row, with config findings at the end.
+    csvNameOrder = dict((os.path.basename(csvPath), csvIndex) for csvIndex, (_, csvPath) in enumerate(csvPaths)
+        if csvPath is not None)
+    csvNameOrder[u''] = len(csvPaths)
+    return tuple(
+        [u'%s:%d: %s' % (csvName, rowIndex + 1, message) if csvName else message
+            for csvName, rowIndex, message in sorted(findings[kind],
+                key=lambda finding: (csvNameOrder[finding[0]], finding[1]))]
+        for kind in ('errors', 'warnings'))
+
+
+def _issueBody(ticketMap, attachmentsToAdd, commits=None):
+    """
+    The Markdown body of the Github issue for ``ticketMap``, which still might exceed
+    `GITHUB_BODY_LIMIT` and consequently has to be split using `_splitBody()`. ``commits`` are the sha
+    ids of commits referring to the ticket.
+    """
+    body = ticketMap['description']
+    if ticketMap['type'] == DUMMYTYPE:
+        return body
+    if body and \
+       ticketMap['reporter'] and \
+       ticketMap['reporter'] != ticketMap['owner']:
+        body = u"_by %s:_\n%s" % (ticketMap['reporter'], body)
+    legacyInfo = LEGACY_HEADER_TEMPLATE.format(**ticketMap)
+    attachmentInfo = u''
+    if attachmentsToAdd:
+        for attachment in attachmentsToAdd:
+            attachmentInfo += u"* %s attached [%s](%s) on %s"  % (
+                attachment['author'],
+                attachment['filename'],
+                attachment['fullpath'].replace(' ','%20'),
+                attachment['date'])
+            if 'size' in attachment:
+                if attachment['size'] is not None:
+                    attachmentInfo += u' (%s)' % _memorySizeText(attachment['size'])
+                else:
+                    attachmentInfo += u' (missing)'
+            attachmentInfo += u'\n'
+            _log.info(u'  added attachment from %s',
+                attachment['author'])
+    commitInfo = u''.join(u"* referenced by commit [%s](../commit/%s)\n" % (sha[:7], sha)
+        for sha in commits or [])
+    # Add trac info, then body
+    body = legacyInfo + "\n***\n" + body
+    if attachmentInfo:
+        body += "\n***\n" + attachmentInfo
+    if commitInfo:
+        body += "\n***\n" + commitInfo
+    return body
+
+
+def _issueBodyParts(ticketMap, tracTicketToAttachmentsMap, commitIndex=None):
+    """
+    The `_issueBody()` of ``ticketMap`` split into parts using `_splitBody()`.
+    """
+    ticketId = ticketMap['id']
+    return _splitBody(ticketId, _issueBody(ticketMap, tracTicketToAttachmentsMap.get(ticketId),
+        commitIndex.commits(ticketId) if commitIndex is not None else None))
+
+
+def _commentBody(comment):
+    """
+    The Markdown body of the Github comment for the Trac comment ``comment``.
+    """
+    if comment['type'] == 'comment':
+        body = _convertWikiToMd(comment['body'], comment['id'])
+    else:
+        body = comment['body']
+    return u'_%strac %s on %s:_%s%s' % (
+        '**%s** ' % comment['author'] if comment['author'] else '',
+        comment['type'],
+        comment['date'],
+        comment['padding'],
+        body)
+
+
+def _githubComments(ticketId, bodyParts, comments):
+    """
+    List of pairs of kind and body of the Github comments for ticket ``ticketId``: the continuation parts
+    of its ``bodyParts`` followed by the parts of its Trac ``comments``.
+    """
+    result = [(u'continuation of description', part) for part in bodyParts[1:]]
+    for comment in comments:
+        for part in _splitBody(ticketId, _commentBody(comment)):
+            result.append((u'comment by %s' % comment['author'], part))
+    return result
+
+
+def _scannedTicketValues(ticketsCsvPath, ticketTable, ticketsCsvIndex=None, firstTicketId=0):
+    """
+    Distinct milestones, types, resolutions and keywords of all tickets as map of sets. With
+    ``ticketsCsvIndex``, only tickets starting with ``firstTicketId`` are scanned.
+    """
+    names = ('milestone', 'type', 'resolution', 'keywords')
+    if ticketTable is not None:
+        result = dict((name, ticketTable.distinctValues(name)) for name in names)
+    else:
+        result = dict((name, set()) for name in names)
+        for _, row in _ticketsCsvRows(ticketsCsvPath, ticketsCsvIndex, firstTicketId):
+            result['milestone'].add(row[4].strip())
+            result['type'].add(row[1])
+            result['resolution'].add(row[6])
+            result['keywords'].add(row[12])
+    result['milestone'].discard(u'')
+    return result
+
+
+def _createWithinCreationLimit(create):
+    """
+    Result of ``create()`` after waiting for and reserving one creation within the API limits. The
+    reservation is serialized so concurrent threads share the same budget.
+    """
+    with _apiLock:
+        _apiPauseIfNeeded(True)
+        _apiCreationIncrement()
+    return create()
+
+
+def _provisionMilestonesAndLabels(repo, ticketsCsvPath, ticketTable, existingMilestones, labelTransformations,
+        pretend=True, ticketsCsvIndex=None, firstTicketId=0):
+    """
+    Create all milestones and labels the tickets need but the repository lacks before any issue is created.
+    """
+    _log.info(u'scan tickets for milestones and labels')
+    ticketValues = _scannedTicketValues(ticketsCsvPath, ticketTable, ticketsCsvIndex, firstTicketId)
+    missingMilestoneTitles = sorted(
+        title for title in ticketValues['milestone'] if title not in existingMilestones)
+    requiredLabelNames = set()
+    for tracField in ('type', 'resolution'):
+        for tracValue in ticketValues[tracField]:
+            labelName = labelTransformations.labelNameFor(tracField, tracValue)
+            if labelName is not None:
+                requiredLabelNames.add(labelName)
+    for keywords in ticketValues['keywords']:
+        requiredLabelNames.update(labelTransformations.labelsForKeyWords(keywords))
+    missingLabelNames = sorted(labelTransformations.missingLabelNames & requiredLabelNames)
+    for milestoneTitle in missingMilestoneTitles:
+        _log.info(u'add milestone: %s', milestoneTitle)
+    for labelName in missingLabelNames:
+        _log.info(u'add label: %s', labelName)
+    if not pretend:
+        creations = [lambda title=title: repo.create_milestone(title) for title in missingMilestoneTitles] \
+            + [lambda name=name: repo.create_label(name, DEFAULT_LABEL_COLOR) for name in missingLabelNames]
+        threadPool = multiprocessing.pool.ThreadPool(PROVISIONING_THREAD_COUNT)
+        try:
+            created = threadPool.map(_createWithinCreationLimit, creations)
+        finally:
+            threadPool.close()
+            threadPool.join()
+        newMilestones = created[:len(missingMilestoneTitles)]
+        newLabels = created[len(missingMilestoneTitles):]
+    else:
+        newMilestones = [_FakeMilestone(len(existingMilestones) + index + 1, title)
+            for index, title in enumerate(missingMilestoneTitles)]
+        newLabels = [_FakeLabel(name) for name in missingLabelNames]
+    for milestone in newMilestones:
+        existingMilestones[milestone.title] = milestone
+    for label in newLabels:
+        labelTransformations.addLabel(label)
+    _log.info(u'  provided %d milestones and %d labels', len(newMilestones), len(newLabels))
+
+
+def _placeholderRuns(ticketIds, lastHubIssue):
+    """
+    Map of the first to the last number of each run of missing ticket ids after ``lastHubIssue``.
+    """
+    result = {}
+    previousTicketId = lastHubIssue
+    for ticketId in ticketIds:
+        if ticketId > previousTicketId + 1:
+            result[previousTicketId + 1] = ticketId - 1
+        previousTicketId = max(previousTicketId, ticketId)
+    return result
+
+
+def _rememberPlaceholders(journal, firstNumber, lastNumber):
+    """
+    Add the placeholder issues ``firstNumber`` to ``lastNumber`` to ``journal``.
+    """
+    placeholderRuns = journal.get('placeholders', [])
+    if placeholderRuns and (placeholderRuns[-1][1] + 1 == firstNumber):
+        placeholderRuns[-1][1] = lastNumber
+    else:
+        placeholderRuns.append([firstNumber, lastNumber])
+    journal.update(placeholders=placeholderRuns)
+
+
+def _importPlaceholders(issueImporter, firstNumber, lastNumber, journal, pretend):
+    """
+    Create closed placeholder issues ``firstNumber`` to ``lastNumber`` using the import API.
+    """
+    _log.info(u'import placeholders #%d to #%d', firstNumber, lastNumber)
+    if pretend:
+        return
+    placeholderMap = _placeholderTicketMap(firstNumber)
+    body = _issueBody(placeholderMap, None)
+    statusUrls = []
+    for _ in xrange(firstNumber, lastNumber + 1):
+        statusUrls.append(issueImporter.submit(placeholderMap['summary'], body))
+        if journal is not None:
+            journal.update(pendingImports=statusUrls)
+    importedNumbers = issueImporter.waitUntilImported(statusUrls)
+    if importedNumbers != range(firstNumber, lastNumber + 1):
+        raise Exception(u'imported placeholders must be #%d to #%d but are: %s'
+            % (firstNumber, lastNumber, importedNumbers))
+    if journal is not None:
+        journal.update(pendingImports=[])
+        _rememberPlaceholders(journal, firstNumber, lastNumber)
+
+
+def _closePlaceholdersMissedBefore(repo, journal, existingIssues, issueMutations, pretend):
+    """
+    Close the placeholder issues in ``journal`` that a previous run created but could not close anymore.
+    """
+    for firstNumber, lastNumber in journal.get('placeholders', []):
+        for issueNumber in xrange(firstNumber, lastNumber + 1):
+            if (issueNumber in existingIssues) and (existingIssues.state(issueNumber) != 'closed'):
+                _log.info(u'close placeholder #%d missed by previous run', issueNumber)
+                if issueMutations is not None:
+                    issueMutations.close(issueNumber)
+                elif not pretend:
+                    _apiPauseIfNeeded()
+                    repo.get_issue(issueNumber).edit(state='closed')
+                existingIssues.close(issueNumber)
+
+
+def _closeIssuesMissedBefore(ticketsCsvPath, ticketTable, existingIssues, issueMutations, ticketsCsvIndex=None):
+    """
+    Add closing the issues of closed tickets that are still open to ``issueMutations``. This happens if a
+    previous run stopped before it could send all its pending changes. With ``ticketsCsvIndex``, only the
+    rows of tickets whose issue is open are read.
+    """
+    lastHubIssue = len(existingIssues)
+    if ticketTable is not None:
+        tickets = itertools.izip(ticketTable.ids, ticketTable.column('status'))
+    elif ticketsCsvIndex is not None:
+        tickets = ((ticketId, row[5]) for ticketId, row in _indexedTicketsCsvRows(ticketsCsvPath, ticketsCsvIndex,
+            [number for number in existingIssues.openNumbers() if number < lastHubIssue]))
+    else:
+        tickets = ((ticketId, row[5]) for ticketId, row in _ticketsCsvRows(ticketsCsvPath))
+    for ticketId, status in tickets:
+        if ticketId >= lastHubIssue:
+            break
+        if (status == 'closed') and (ticketId in existingIssues) and (existingIssues.state(ticketId) != 'closed'):
+            _log.info(u'close issue #%d missed by previous run', ticketId)
+            issueMutations.close(ticketId)
+            existingIssues.close(ticketId)
+
+
+def _csvTimes(csvPath, columnIndex):
+    """
+    The Trac time stamps in column ``columnIndex`` of all rows in the CSV file ``csvPath``.
+    """
+    with open(csvPath, "rb") as csvFile:
+        csvReader = _UnicodeCsvReader(csvFile)
+        for rowIndex, row in enumerate(csvReader):
+            if (rowIndex > 0) and row[columnIndex]:
+                yield long(row[columnIndex])
+
+
+def _latestCsvTime(journal, csvPath, columnIndex):
+    """
+    The latest of the `_csvTimes()` of ``csvPath``. With ``journal``, it is remembered together with the
+    size and modification time of the file, so later runs only read the file again once it has changed.
+    """
+    if journal is None:
+        return max(itertools.chain([0], _csvTimes(csvPath, columnIndex)))
+    csvStat = os.stat(csvPath)
+    csvStamp = [csvStat.st_size, int(csvStat.st_mtime)]
+    latestCsvTimes = dict(journal.get('latestCsvTimes', {}))
+    latestCsvTime = latestCsvTimes.get(csvPath)
+    if (latestCsvTime is None) or (latestCsvTime[:2] != csvStamp):
+        latestCsvTime = csvStamp + [max(itertools.chain([0], _csvTimes(csvPath, columnIndex)))]
+        latestCsvTimes[csvPath] = latestCsvTime
+        journal.update(latestCsvTimes=latestCsvTimes)
+    return latestCsvTime[2]
+
+
+def _highWaterMark(ticketsCsvPath, ticketTable, tracTicketToCommentsMap, journal=None, commentsCsvPath=None,
+        commentsCsvIndex=None):
+    """
+    The latest Trac time stamp of all tickets and comments. The latest time stamps found in the CSV files
+    are remembered in ``journal``, so resuming with unchanged files reads no rows. With
+    ``commentsCsvIndex``, ``tracTicketToCommentsMap`` lacks the comments of earlier tickets, so the
+    comments are taken from ``commentsCsvPath`` instead.
+    """
+    if ticketTable is not None:
+        modifiedTimes = ticketTable.column('modifiedtime')
+    else:
+        modifiedTimes = [_latestCsvTime(journal, ticketsCsvPath, 10)]
+    if commentsCsvIndex is not None:
+        commentTimes = [_latestCsvTime(journal, commentsCsvPath, 1)]
+    else:
+        commentTimes = (comment['time'] for comments in tracTicketToCommentsMap.itervalues()
+            for comment in comments)
+    return max(itertools.chain([0], modifiedTimes, commentTimes))
+
+
+def _changedTicketMaps(ticketsCsvPath, ticketTable, since):
+    """
+    Like `_tracTicketMaps()` but only for tickets modified after the Trac time stamp ``since``, and without
+    placeholders.
+    """
+    if ticketTable is not None:
+        for ticketIndex, modifiedTime in enumerate(ticketTable.column('modifiedtime')):
+            if modifiedTime > since:
+                yield ticketTable.row(ticketTable.ids[ticketIndex])
+    else:
+        for ticketId, row in _ticketsCsvRows(ticketsCsvPath):
+            if row[10] and (long(row[10]) > since):
+                # Syncing does not need the description, so it is not converted.
+                yield {'id': ticketId, 'status': row[5], 'summary': row[7]}
+
+
+def _syncChangedTickets(repo, changedTickets, existingIssues, tracTicketToCommentsMap, since, journal,
+        issueMutations, pretend):
+    """
+    Add the comments written after the Trac time stamp ``since`` to the issues of ``changedTickets`` and
+    close or reopen issues whose ticket changed its state. Tickets without issue are left to the regular
+    migration.
+
+    Tickets whose comments have been added are remembered in ``journal``, so a run interrupted halfway
+    does not add them again. While a ticket is synced, the journal also holds the index of the next
+    comment and part to add as ``syncedComments``, so an interrupted ticket continues with the first part
+    not added yet. Only the comments actually added are converted.
+    """
+    lastHubIssue = len(existingIssues)
+    syncedTicketIds = set(journal.get('syncedTickets', []))
+    syncedComments = dict(journal.get('syncedComments', {}))
+    syncedCount = 0
+    for ticketMap in changedTickets:
+        ticketId = ticketMap['id']
+        if ticketId >= lastHubIssue:
+            break
+        commentsToAdd = []
+        if ticketId not in syncedTicketIds:
+            firstCommentIndex, firstPartIndex = syncedComments.get(str(ticketId), (0, 0))
+            commentsToAdd = [(commentIndex, comment) for commentIndex, comment
+                in enumerate(tracTicketToCommentsMap.get(ticketId, []))
+                if (commentIndex >= firstCommentIndex) and (comment['time'] > since)]
+        isClosed = ticketMap['status'] == 'closed'
+        hasStateChanged = isClosed != (existingIssues.state(ticketId) == 'closed')
+        if not (commentsToAdd or hasStateChanged):
+            continue
+        _log.info(u'sync ticket #%d: %s', ticketId, _shortened(ticketMap['summary']))
+        issue = None
+        if not pretend and (commentsToAdd or (issueMutations is None)):
+            _apiPauseIfNeeded()
+            issue = repo.get_issue(ticketId)
+        for commentIndex, comment in commentsToAdd:
+            commentParts = _splitBody(ticketId, _commentBody(comment))
+            startPartIndex = firstPartIndex if commentIndex == firstCommentIndex else 0
+            for partIndex in xrange(startPartIndex, len(commentParts)):
+                commentBody = commentParts[partIndex]
+                if not pretend:
+                    _addGitHubIssueComment(issue, commentBody)
+                    syncedComments[str(ticketId)] = [commentIndex, partIndex + 1]
+                    journal.update(syncedComments=syncedComments)
+                existingIssues.addComments(ticketId)
+                _log.info(u'  add comment: %r', _shortened(commentBody))
+        if commentsToAdd and not pretend:
+            syncedTicketIds.add(ticketId)
+            syncedComments.pop(str(ticketId), None)
+            journal.update(syncedTickets=sorted(syncedTicketIds), syncedComments=syncedComments)
+        if hasStateChanged:
+            if isClosed:
+                _log.info(u'  close issue')
+                existingIssues.close(ticketId)
+            else:
+                _log.info(u'  reopen issue')
+                existingIssues.reopen(ticketId)
+            if issueMutations is not None:
+                if isClosed:
+                    issueMutations.close(ticketId)
+                else:
+                    issueMutations.reopen(ticketId)
+            elif not pretend:
+                _apiPauseIfNeeded()
+                issue.edit(state=existingIssues.state(ticketId))
+        syncedCount += 1
+    _log.info(u'  synced %d changed tickets', syncedCount)
+
+
 def migrateTickets(repo, 
         ticketsCsvPath, 
         commentsCsvPath=None, 
@@ -623,20 +2584,61 @@ def migrateTickets(repo,
         userMapping="*:*", 
         attachmentsPrefix=None, 
         keywords=None,
+        columnar=False,
+        graphql=None,
+        graphqlBatchSize=GRAPHQL_BATCH_SIZE,
+        journal=None,
+        delta=False,
+        issueImporter=None,
+        indexed=False,
+        tracTicketToAttachmentsMap=None,
+        commitIndex=None,
         pretend=True):
     global _totalIssues
     assert _hub is not None
     assert repo is not None
     assert ticketsCsvPath is not None
     assert userMapping is not None
-    
-    tracTicketToCommentsMap = _createTicketToCommentsMap(commentsCsvPath)
-    tracTicketToAttachmentsMap = \
-        _createTicketsToAttachmentsMap(attachmentsCsvPath, attachmentsPrefix)
-    existingIssues = _createIssueMap(repo)
+    assert (journal is not None) or not delta
+
+    if delta:
+        since = journal.get('highWaterMark')
+        if since is None:
+            raise _ConfigError('journal', u'journal "%s" must contain the time of a previous migration '
+                u'in order to sync changes' % journal.path)
+        _log.info(u'sync changes since %s', _timeFormatter(since))
+    if tracTicketToAttachmentsMap is None:
+        tracTicketToAttachmentsMap = _createTicketsToAttachmentsMap(attachmentsCsvPath, attachmentsPrefix)
+    ticketTable = _TicketTable(ticketsCsvPath) if columnar else None
+    ticketsCsvIndex = None
+    commentsCsvIndex = None
+    if indexed:
+        if not columnar:
+            ticketsCsvIndex = _CsvIndex(ticketsCsvPath)
+        if (commentsCsvPath is not None) and not delta:
+            # Delta syncs need the comments of all tickets.
+            commentsCsvIndex = _CsvIndex(commentsCsvPath)
+    if (issueImporter is not None) and (journal is not None) and journal.get('pendingImports'):
+        _log.info(u'wait for placeholder imports of previous run')
+        if not pretend:
+            issueImporter.waitUntilImported(journal.get('pendingImports'))
+            journal.update(pendingImports=[])
+    if graphql is not None:
+        existingIssues = _createIssueMapUsingGraphQL(repo, graphql,
+            _highestTicketId(ticketsCsvPath, ticketTable, ticketsCsvIndex))
+    else:
+        existingIssues = _createIssueMap(repo)
+    # Without index, tickets before the last issue are read but skipped.
+    firstTicketId = len(existingIssues)
+    tracTicketToCommentsMap = _createTicketToCommentsMap(commentsCsvPath, commentsCsvIndex, firstTicketId)
+    if journal is not None:
+        highWaterMark = _highWaterMark(ticketsCsvPath, ticketTable, tracTicketToCommentsMap,
+            journal if not pretend else None, commentsCsvPath, commentsCsvIndex)
     existingMilestones = _createMilestoneMap(repo)
     tracToGithubUserMap = _createTracToGithubUserMap(userMapping)
-    labelTransformations = _LabelTransformations(repo, labelMapping, keywords)
+    labelTransformations = _LabelTransformations(repo, labelMapping, keywords, strict=False)
+    _provisionMilestonesAndLabels(repo, ticketsCsvPath, ticketTable, existingMilestones, labelTransformations,
+        pretend, ticketsCsvIndex, firstTicketId)
 
     def possiblyAddLabel(labels, tracField, tracValue):
         label = labelTransformations.labelFor(tracField, tracValue)
@@ -650,135 +2652,311 @@ def migrateTickets(repo,
             _log.info(u'  add label "%s" from keywords "%s"' % (l, keywords))
         labels.extend(kwlabels)
 
-    fakeIssueId = 1 + len(existingIssues)
-    for ticketMap in _tracTicketMaps(ticketsCsvPath, existingIssues):
-        ticketId = ticketMap['id']
-        title = ticketMap['summary']
-        if ticketMap['exists']:
-            # continuing on last ticket, may not have completed
-            issue = ticketMap['exists']
-            _log.info(u'***CONTINUING ticket #%d: %s', ticketId, _shortened(title))
+    if (graphql is not None) and not pretend:
+        repoOwner, repoName = repo.full_name.split('/', 1)
+        issueMutations = _IssueMutationBatch(graphql, repoOwner, repoName, graphqlBatchSize)
+        _closeIssuesMissedBefore(ticketsCsvPath, ticketTable, existingIssues, issueMutations, ticketsCsvIndex)
+    else:
+        issueMutations = None
+    if journal is not None:
+        _closePlaceholdersMissedBefore(repo, journal, existingIssues, issueMutations, pretend)
+    if issueImporter is not None:
+        if ticketTable is not None:
+            ticketIds = ticketTable.ids
         else:
-            #
-            # create issue
-            #
-            _log.info(u'convert ticket #%d: %s', ticketId, _shortened(title))
-            body = ticketMap['description']
-            tracOwner = ticketMap['owner']
-            milestone = None
-            milestoneNumber = 0
-            milestoneTitle = ticketMap['milestone']
-            labels = []
-            if ticketMap['type'] == DUMMYTYPE:
-                githubAssignee = _NOTSET
-            else:
-                if body and \
-                   ticketMap['reporter'] and \
-                   ticketMap['reporter'] != tracOwner:
-                    body = u"_by %s:_\n%s" % (ticketMap['reporter'], body)
-                githubAssignee = _githubUserFor(tracToGithubUserMap, tracOwner)
-                if githubAssignee:
-                    githubAssignee = _getGitHubUser(githubAssignee)
+            ticketIds = (ticketId for ticketId, _ in _ticketsCsvRows(ticketsCsvPath, ticketsCsvIndex, firstTicketId))
+        placeholderRuns = _placeholderRuns(ticketIds, len(existingIssues))
+        _log.info(u'  found %d missing tickets in %d runs',
+            sum(lastNumber - firstNumber + 1 for firstNumber, lastNumber in placeholderRuns.iteritems()),
+            len(placeholderRuns))
+    else:
+        placeholderRuns = {}
+
+    fakeIssueId = 1 + len(existingIssues)
+    try:
+        if delta:
+            _syncChangedTickets(repo, _changedTicketMaps(ticketsCsvPath, ticketTable, since), existingIssues,
+                tracTicketToCommentsMap, since, journal, issueMutations, pretend)
+        for ticketMap in _tracTicketMaps(ticketsCsvPath, existingIssues, ticketTable, ticketsCsvIndex):
+            ticketId = ticketMap['id']
+            title = ticketMap['summary']
+            if ticketId in placeholderRuns:
+                lastPlaceholderNumber = placeholderRuns.pop(ticketId)
+                _importPlaceholders(issueImporter, ticketId, lastPlaceholderNumber, journal, pretend)
+                for placeholderNumber in xrange(ticketId, lastPlaceholderNumber + 1):
+                    existingIssues.add(placeholderNumber, title, 'closed')
+                fakeIssueId = lastPlaceholderNumber + 1
+            if (issueImporter is not None) and (ticketMap['type'] == DUMMYTYPE):
+                continue
+            if ticketMap['exists']:
+                # continuing on last ticket, may not have completed; its body is only needed for the
+                # continuation comments that may still be missing
+                bodyParts = _issueBodyParts(ticketMap, tracTicketToAttachmentsMap, commitIndex)
+                if not pretend:
+                    _apiPauseIfNeeded()
+                    issue = repo.get_issue(ticketId)
                 else:
-                    githubAssignee = _NOTSET
-                if milestoneTitle:
-                    if milestoneTitle not in existingMilestones:
-                        if not pretend:
-                            _apiPauseIfNeeded(True)
-                            newMilestone = repo.create_milestone(milestoneTitle)
-                            _apiCreationIncrement()
-                        else:
-                            newMilestone = \
-                                _FakeMilestone(len(existingMilestones) + 1, 
-                                    milestoneTitle)
-                        _log.info(u'add milestone: %s', milestoneTitle)
-                        existingMilestones[milestoneTitle] = newMilestone
-                        _log.debug("%r" % existingMilestones)
-                    milestone = existingMilestones[milestoneTitle]
-                    milestoneNumber = milestone.number
-
-                legacyInfo = LEGACY_HEADER_TEMPLATE.format(**ticketMap)
-                attachmentInfo = u''
-                attachmentsToAdd = tracTicketToAttachmentsMap.get(ticketId)
-                if attachmentsToAdd:
-                    for attachment in attachmentsToAdd:
-                        attachmentInfo += u"* %s attached [%s](%s) on %s\n"  % (
-                            attachment['author'], 
-                            attachment['filename'], 
-                            attachment['fullpath'].replace(' ','%20'), 
-                            attachment['date'])
-                        _log.info(u'  added attachment from %s', 
-                            attachment['author'])
-                # Add trac info, then body
-                body = legacyInfo + "\n***\n" + body
-                if attachmentInfo:
-                    body += "\n***\n" + attachmentInfo
-
-                possiblyAddLabel(labels, 'type', ticketMap['type'])
-                possiblyAddLabel(labels, 'resolution', ticketMap['resolution'])
-                labelsFromKeywords(labels, ticketMap['keywords'])
-
-            if not pretend:
-                if not milestone:
-                    milestone = _NOTSET
-                if not labels:
-                    labels = _NOTSET
-                _apiPauseIfNeeded(True)
-                issue = repo.create_issue(
-                    title, 
-                    body, 
-                    githubAssignee, 
-                    milestone, 
-                    labels)
-                _apiCreationIncrement()
-                _totalIssues += 1
+                    issue = _FakeIssue(ticketId, title, existingIssues.state(ticketId),
+                        existingIssues.comments(ticketId))
+                _log.info(u'***CONTINUING ticket #%d: %s', ticketId, _shortened(title))
             else:
-                issue = _FakeIssue(fakeIssueId, title, body, 'open', 0)
-                fakeIssueId += 1
-            _log.info(u'  issue #%s: owner=%s-->%s; milestone=%s (%d)',
-                    issue.number, 
-                    tracOwner, 
-                    githubAssignee.login if 
-                        githubAssignee and 
-                        githubAssignee is not _NOTSET 
-                        else '',
-                    milestoneTitle, 
-                    milestoneNumber)
-            if issue.number != ticketId:
-                raise Exception("What happened? GitHub issue [%d] "
-                    "didn't sync with trac ticket [%d]" % 
-                    (issue.number, ticketId))
-            existingIssues[ticketId] = issue
-        #
-        # add comments
-        #
-        commentsToAdd = tracTicketToCommentsMap.get(ticketId)
-        if commentsToAdd is not None:
+                #
+                # create issue
+                #
+                _log.info(u'convert ticket #%d: %s', ticketId, _shortened(title))
+                bodyParts = _issueBodyParts(ticketMap, tracTicketToAttachmentsMap, commitIndex)
+                body = bodyParts[0]
+                tracOwner = ticketMap['owner']
+                milestone = None
+                milestoneNumber = 0
+                milestoneTitle = ticketMap['milestone']
+                labels = []
+                if ticketMap['type'] == DUMMYTYPE:
+                    githubAssignee = _NOTSET
+                else:
+                    githubAssignee = _githubUserFor(tracToGithubUserMap, tracOwner)
+                    if githubAssignee:
+                        githubAssignee = _getGitHubUser(githubAssignee)
+                    else:
+                        githubAssignee = _NOTSET
+                    if milestoneTitle:
+                        milestone = existingMilestones[milestoneTitle]
+                        milestoneNumber = milestone.number
+
+                    possiblyAddLabel(labels, 'type', ticketMap['type'])
+                    possiblyAddLabel(labels, 'resolution', ticketMap['resolution'])
+                    labelsFromKeywords(labels, ticketMap['keywords'])
+
+                if not pretend:
+                    if not milestone:
+                        milestone = _NOTSET
+                    if not labels:
+                        labels = _NOTSET
+                    _apiPauseIfNeeded(True)
+                    issue = repo.create_issue(
+                        title, 
+                        body, 
+                        githubAssignee, 
+                        milestone, 
+                        labels)
+                    _apiCreationIncrement()
+                    _totalIssues += 1
+                    if issueMutations is not None:
+                        issueMutations.setIssueId(issue.number, issue.raw_data.get('node_id'))
+                else:
+                    issue = _FakeIssue(fakeIssueId, title, 'open', 0)
+                    fakeIssueId += 1
+                _log.info(u'  issue #%s: owner=%s-->%s; milestone=%s (%d)',
+                        issue.number, 
+                        tracOwner, 
+                        githubAssignee.login if 
+                            githubAssignee and 
+                            githubAssignee is not _NOTSET 
+                            else '',
+                        milestoneTitle, 
+                        milestoneNumber)
+                if issue.number != ticketId:
+                    raise Exception("What happened? GitHub issue [%d] "
+                        "didn't sync with trac ticket [%d]" % 
+                        (issue.number, ticketId))
+                existingIssues.add(ticketId, title, issue.state)
+                if (ticketMap['type'] == DUMMYTYPE) and (journal is not None) and not pretend:
+                    _rememberPlaceholders(journal, ticketId, ticketId)
+            #
+            # add continuation parts of the body and comments
+            #
+            if len(bodyParts) > 1:
+                _log.info(u'  split body into %d parts', len(bodyParts))
+            githubComments = _githubComments(ticketId, bodyParts, tracTicketToCommentsMap.get(ticketId, []))
             # if continuing this issue from last run,
             # issue.comments probably won't be 0:
-            for comment in commentsToAdd[issue.comments:]:
-                if comment['type'] == 'comment':
-                    comment['body'] = _convertWikiToMd(comment['body'], comment['id'])
-                commentBody = u'_%strac %s on %s:_%s%s' % (
-                    '**%s** ' % comment['author'] if comment['author'] else '',
-                    comment['type'],
-                    comment['date'],
-                    comment['padding'],
-                    comment['body'])
+            for commentKind, commentBody in githubComments[existingIssues.comments(ticketId):]:
                 if not pretend:
                     _addGitHubIssueComment(issue, commentBody)
-                _log.info(u'  add comment by %s: %r', 
-                    comment['author'], 
+                existingIssues.addComments(ticketId)
+                _log.info(u'  add %s: %r', 
+                    commentKind, 
                     _shortened(commentBody))
-        #
-        # close ticket if needed
-        #
-        if ticketMap['status'] == 'closed' and \
-           issue.state != 'closed':
-            _log.info(u'  close issue')
-            if not pretend:
-                _apiPauseIfNeeded()
-                issue.edit(state='closed')
+            #
+            # close ticket if needed
+            #
+            if ticketMap['status'] == 'closed' and \
+               existingIssues.state(ticketId) != 'closed':
+                _log.info(u'  close issue')
+                if issueMutations is not None:
+                    issueMutations.close(ticketId)
+                elif not pretend:
+                    _apiPauseIfNeeded()
+                    issue.edit(state='closed')
+                existingIssues.close(ticketId)
+    finally:
+        if issueMutations is not None:
+            issueMutations.flush()
+            _log.info(u'  sent issue changes in %d GraphQL requests', issueMutations.requestCount)
+    if (journal is not None) and not pretend:
+        journal.update(highWaterMark=highWaterMark, syncedTickets=[], syncedComments={})
+    _log.info(u'issue registry holds %d issues in %s', len(existingIssues),
+        _memorySizeText(existingIssues.memorySize()))
+
+
+def _bodyDigest(text):
+    """
+    SHA-1 of ``text`` ignoring line endings and white space at the end of lines, which Github does not
+    preserve reliably.
+    """
+    lines = [line.rstrip() for line in text.replace(u'\r\n', u'\n').split(u'\n')]
+    return hashlib.sha1(u'\n'.join(lines).strip().encode('utf-8')).hexdigest()
+
+
+def _issueDigest(title, state, body, commentBodies):
+    """
+    Map describing an issue by its title, state, comment count and the digests of its body and comments.
+    """
+    commentDigests = u''.join(_bodyDigest(commentBody) for commentBody in commentBodies)
+    return {
+        'title': title,
+        'state': state,
+        'comments': len(commentBodies),
+        'body': _bodyDigest(body),
+        'commentBodies': hashlib.sha1(commentDigests.encode('ascii')).hexdigest(),
+    }
+
+
+def _expectedIssueDigests(ticketsCsvPath, ticketTable, tracTicketToCommentsMap, tracTicketToAttachmentsMap,
+        commitIndex=None):
+    """
+    Map of issue number to the `_issueDigest()` of the issue the migration creates for it, including
+    placeholders.
+    """
+    result = {}
+    convertedIssues = _IssueRegistry()
+    for ticketMap in _tracTicketMaps(ticketsCsvPath, convertedIssues, ticketTable):
+        ticketId = ticketMap['id']
+        bodyParts = _issueBodyParts(ticketMap, tracTicketToAttachmentsMap, commitIndex)
+        githubComments = _githubComments(ticketId, bodyParts, tracTicketToCommentsMap.get(ticketId, []))
+        state = 'closed' if ticketMap['status'] == 'closed' else 'open'
+        result[ticketId] = _issueDigest(ticketMap['summary'], state, bodyParts[0],
+            [commentBody for _, commentBody in githubComments])
+        convertedIssues.add(ticketId, ticketMap['summary'], state)
+    return result
+
+
+def _fetchedIssueDigest(repo, issueNumber):
+    """
+    The `_issueDigest()` of issue ``issueNumber`` as stored on Github, or ``None`` if there is no such
+    issue.
+    """
+    with _apiLock:
+        _apiPauseIfNeeded()
+    try:
+        issue = repo.get_issue(issueNumber)
+    except github.UnknownObjectException:
+        return None
+    commentBodies = []
+    if issue.comments:
+        comments = iter(issue.get_comments())
+        while True:
+            if len(commentBodies) % GITHUB_PAGE_SIZE == 0:
+                # The next comment requires fetching another page.
+                with _apiLock:
+                    _apiPauseIfNeeded()
+            try:
+                comment = comments.next()
+            except StopIteration:
+                break
+            commentBodies.append(comment.body)
+    return _issueDigest(issue.title, issue.state, issue.body or u'', commentBodies)
+
+
+def _issueMismatches(issueNumber, expectedDigest, actualDigest):
+    """
+    List of tuples (issue number, field, expected value, actual value) for each field of ``actualDigest``
+    that differs from ``expectedDigest``.
+    """
+    if actualDigest is None:
+        return [(issueNumber, u'issue', u'exists', u'missing')]
+    return [(issueNumber, field, expectedDigest[field], actualDigest[field])
+        for field in ('title', 'state', 'comments', 'body', 'commentBodies')
+        if expectedDigest[field] != actualDigest[field]]
+
+
+def verifyMigration(repo,
+        ticketsCsvPath,
+        commentsCsvPath=None,
+        attachmentsCsvPath=None,
+        attachmentsPrefix=None,
+        columnar=False,
+        journal=None,
+        reportPath=None,
+        tracTicketToAttachmentsMap=None,
+        commitIndex=None):
+    """
+    List of mismatches as described by `_issueMismatches()` between the Github issues and the issues the
+    migration would create from the Trac exports. With ``reportPath``, the mismatches are also written to
+    a CSV file.
+
+    Issues are fetched concurrently. With ``journal``, the digests of fetched issues are remembered, and
+    later verifications only fetch issues changed on Github since. Attachments examined by
+    `scanAttachments()` can be passed as ``tracTicketToAttachmentsMap`` and the commits referring to
+    tickets as ``commitIndex``.
+    """
+    assert _hub is not None
+    assert repo is not None
+    assert ticketsCsvPath is not None
+
+    tracTicketToCommentsMap = _createTicketToCommentsMap(commentsCsvPath)
+    if tracTicketToAttachmentsMap is None:
+        tracTicketToAttachmentsMap = _createTicketsToAttachmentsMap(attachmentsCsvPath, attachmentsPrefix)
+    ticketTable = _TicketTable(ticketsCsvPath) if columnar else None
+    _log.info(u'compute expected issues')
+    expectedDigests = _expectedIssueDigests(ticketsCsvPath, ticketTable, tracTicketToCommentsMap,
+        tracTicketToAttachmentsMap, commitIndex)
+    verifiedDigests = {}
+    verifiedTime = None
+    if journal is not None:
+        verifiedDigests = dict((long(issueNumber), digest)
+            for issueNumber, digest in journal.get('verifiedIssues', {}).iteritems())
+        verifiedTime = journal.get('verifiedTime')
+    checkTime = datetime.datetime.utcnow()
+    if verifiedTime is not None:
+        _log.info(u'find issues changed since previous verification at %s UTC', verifiedTime)
+        _apiPauseIfNeeded()
+        changedIssueNumbers = set(issue.number for issue in repo.get_issues(state='all',
+            since=datetime.datetime.strptime(verifiedTime, '%Y-%m-%dT%H:%M:%S')))
+    else:
+        changedIssueNumbers = set(expectedDigests)
+    issueNumbersToFetch = sorted(issueNumber for issueNumber in expectedDigests
+        if (issueNumber in changedIssueNumbers) or (issueNumber not in verifiedDigests))
+    _log.info(u'fetch %d of %d issues', len(issueNumbersToFetch), len(expectedDigests))
+    threadPool = multiprocessing.pool.ThreadPool(PROVISIONING_THREAD_COUNT)
+    try:
+        fetchedDigests = threadPool.map(lambda issueNumber: _fetchedIssueDigest(repo, issueNumber),
+            issueNumbersToFetch)
+    finally:
+        threadPool.close()
+        threadPool.join()
+    for issueNumber, actualDigest in itertools.izip(issueNumbersToFetch, fetchedDigests):
+        if actualDigest is not None:
+            verifiedDigests[issueNumber] = actualDigest
+        else:
+            verifiedDigests.pop(issueNumber, None)
+    result = []
+    for issueNumber in sorted(expectedDigests):
+        result.extend(_issueMismatches(issueNumber, expectedDigests[issueNumber],
+            verifiedDigests.get(issueNumber)))
+    for issueNumber, field, expectedValue, actualValue in result:
+        _log.warning(u'issue #%d: %s must be %r but is %r', issueNumber, field, expectedValue, actualValue)
+    _log.info(u'found %d mismatches in %d issues', len(result), len(expectedDigests))
+    if journal is not None:
+        journal.update(verifiedIssues=verifiedDigests, verifiedTime=checkTime.strftime('%Y-%m-%dT%H:%M:%S'))
+    if reportPath is not None:
+        _log.info(u'write mismatches to "%s"', reportPath)
+        with open(reportPath, 'wb') as reportFile:
+            reportWriter = csv.writer(reportFile)
+            reportWriter.writerow(['issue', 'field', 'expected', 'actual'])
+            for mismatch in result:
+                reportWriter.writerow([unicode(value).encode('utf-8') for value in mismatch])
+    return result
 
 
 def _addGitHubIssueComment(issue, commentBody):
@@ -798,6 +2976,10 @@ def _parsedOptions(arguments):
     )
     parser.add_option("-R", "--really", action="store_true", dest="really",
                       help="really perform the conversion")
+    parser.add_option("-d", "--delta", action="store_true", dest="delta",
+                      help="only sync tickets and comments changed since the previous run")
+    parser.add_option("-V", "--verify", action="store_true", dest="verify",
+                      help="compare existing issues with Trac tickets instead of converting them")
     parser.add_option("-v", "--verbose", action="store_true", dest="verbose",
                       help="log all actions performed in console")
     (options, others) = parser.parse_args(arguments)
@@ -823,7 +3005,7 @@ def _validateGithubUser(tracUser, githubUser):
                 % (tracUser, githubUser))
 
 
-def _createTracToGithubUserMap(definition):
+def _createTracToGithubUserMap(definition, validate=True):
     result = {}
     for mapping in definition.split(','):
         words = [word.strip() for word in mapping.split(':')]
@@ -846,7 +3028,7 @@ def _createTracToGithubUserMap(definition):
                     u'Trac user "%s" must be mapped to only one Github user instead of "%s" and "%s"'
                      % (tracUser, existingMappedGithubUser, githubUser))
             result[tracUser] = githubUser
-            if githubUser not in ('*', ''):
+            if validate and (githubUser not in ('*', '')):
                 _validateGithubUser(tracUser, githubUser)
     return result
 
@@ -939,6 +3121,28 @@ def _apiCreationIncrement(cnt=1):
     _totalCreations += 1
 
 
+def _memorySizeText(byteCount):
+    assert byteCount >= 0
+    if byteCount < 1024:
+        return u'%d bytes' % byteCount
+    if byteCount < 1024 * 1024:
+        return u'%.1f KB' % (byteCount / 1024.0)
+    return u'%.1f MB' % (byteCount / 1024.0 / 1024.0)
+
+
+def _peakMemorySize():
+    """
+    Maximum resident memory of the process in bytes, or ``None`` if the platform does not tell.
+    """
+    result = None
+    if resource is not None:
+        result = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+        # Linux reports kilobytes, Mac OS X bytes.
+        if sys.platform != 'darwin':
+            result *= 1024
+    return result
+
+
 def main(argv=None):
     if argv is None:
         argv = sys.argv
@@ -953,8 +3157,32 @@ def main(argv=None):
         _gitpath = _getConfigOption(config, 'gitpath', False)
         attachmentsCsvPath = _getConfigOption(config, 'attachments', False)
         attachmentsPrefix = _getConfigOption(config, 'attachmentsprefix', False)
+        tracEnvPath = _getConfigOption(config, 'tracenv', False)
+        attachmentsRepoPath = _getConfigOption(config, 'attachmentsrepo', False, _gitpath)
+        attachmentsBranch = _getConfigOption(config, 'attachmentsbranch', False, ATTACHMENTS_BRANCH)
+        attachmentsManifestPath = _getConfigOption(config, 'attachmentsmanifest', False)
+        linkCommits = _getConfigBooleanOption(config, 'commitlinks')
+        if linkCommits and not _gitpath:
+            raise _ConfigError('gitpath', u'must be specified in order to link commits using commitlinks')
+        commitIndexPath = _getConfigOption(config, 'commitindex', False, 'commits.json')
+        svnCachePath = _getConfigOption(config, 'svncache', False)
+        if svnCachePath:
+            from trac.wiki.formatter import set_svn_cache, SVN_CACHE_NEGATIVE_TTL
+            set_svn_cache(svnCachePath,
+                _getConfigIntegerOption(config, 'svncachettl', SVN_CACHE_NEGATIVE_TTL, 0))
+        if (tracEnvPath is not None) and (attachmentsRepoPath is None):
+            raise _ConfigError('attachmentsrepo', u'must be specified in order to publish attachments from '
+                u'"%s" unless gitpath is specified' % tracEnvPath)
         labelMapping = _getConfigOption(config, _OPTION_LABELS, False)
         keywords = _getConfigOption(config, _OPTION_KEYWORDS, False)
+        columnar = _getConfigBooleanOption(config, 'columnar')
+        useGraphQL = _getConfigBooleanOption(config, 'graphql')
+        graphqlBatchSize = _getConfigIntegerOption(config, 'graphqlbatchsize', GRAPHQL_BATCH_SIZE)
+        importPlaceholders = _getConfigBooleanOption(config, 'importplaceholders')
+        indexed = _getConfigBooleanOption(config, 'index')
+        journalPath = _getConfigOption(config, 'journal', False)
+        if options.delta and not journalPath:
+            raise _ConfigError('journal', u'must be specified in order to sync changes using --delta')
         try:
             password = config.get(_SECTION, 'password')
         except ConfigParser.NoOptionError:
@@ -967,7 +3195,23 @@ def main(argv=None):
         ticketsCsvPath = _getConfigOption(config, 'tickets', False, 'tickets.csv')
         user = _getConfigOption(config, 'user')
         userMapping = _getConfigOption(config, _OPTION_USERS, False, '*:*')
-        if not options.really:
+        if _getConfigBooleanOption(config, 'preflight', True):
+            errors, warnings = validateExports(ticketsCsvPath,
+                commentsCsvPath,
+                attachmentsCsvPath,
+                userMapping=userMapping,
+                labelMapping=labelMapping,
+                keywords=keywords)
+            for warning in warnings:
+                _log.warning(warning)
+            for error in errors:
+                _log.error(error)
+            if errors:
+                raise _ValidationError(u'%d errors in exports and config must be fixed before the migration'
+                    % len(errors))
+            _log.info(u'  found no errors and %d warnings', len(warnings))
+        commitIndex = _CommitIndex(_gitpath, commitIndexPath) if linkCommits else None
+        if not (options.really or options.verify):
             _log.warning(u'no actions are performed unless command line option --really is specified')
         _log.info(u'log on to github as user "%s"', user)
         _hub = github.Github(user, password)
@@ -980,17 +3224,50 @@ def main(argv=None):
         _apiPauseIfNeeded()
         repo = owner.get_repo(repoName)
         _log.info(u'connected to %r', repo)
-        migrateTickets(repo, 
-            ticketsCsvPath, 
-            commentsCsvPath, 
-            attachmentsCsvPath, 
-            userMapping=userMapping,
-            labelMapping=labelMapping, 
-            attachmentsPrefix=attachmentsPrefix, 
-            keywords=keywords,
-            pretend=not options.really)
-        exitCode = 0
-    except (EnvironmentError, OSError, _ConfigError, _CsvDataError), error:
+        tracTicketToAttachmentsMap = None
+        if (tracEnvPath is not None) and (attachmentsCsvPath is not None):
+            if attachmentsPrefix is None:
+                attachmentsPrefix = u'https://github.com/%s/raw/%s' % (repo.full_name, attachmentsBranch)
+            tracTicketToAttachmentsMap = _createTicketsToAttachmentsMap(attachmentsCsvPath, attachmentsPrefix)
+            scanAttachments(tracEnvPath, tracTicketToAttachmentsMap, attachmentsManifestPath)
+            if not options.verify:
+                publishAttachments(tracEnvPath, attachmentsRepoPath, tracTicketToAttachmentsMap,
+                    attachmentsBranch,
+                    pretend=not options.really)
+        if options.verify:
+            mismatches = verifyMigration(repo,
+                ticketsCsvPath,
+                commentsCsvPath,
+                attachmentsCsvPath,
+                attachmentsPrefix=attachmentsPrefix,
+                columnar=columnar,
+                journal=_MigrationJournal(journalPath) if journalPath else None,
+                reportPath=_getConfigOption(config, 'mismatches', False, 'mismatches.csv'),
+                tracTicketToAttachmentsMap=tracTicketToAttachmentsMap,
+                commitIndex=commitIndex)
+            exitCode = 1 if mismatches else 0
+        else:
+            migrateTickets(repo, 
+                ticketsCsvPath, 
+                commentsCsvPath, 
+                attachmentsCsvPath, 
+                userMapping=userMapping,
+                labelMapping=labelMapping, 
+                attachmentsPrefix=attachmentsPrefix, 
+                keywords=keywords,
+                columnar=columnar,
+                graphql=_GraphQLClient(user, password) if useGraphQL else None,
+                graphqlBatchSize=graphqlBatchSize,
+                journal=_MigrationJournal(journalPath) if journalPath else None,
+                delta=options.delta,
+                issueImporter=_IssueImporter(user, password, repo.full_name) if importPlaceholders else None,
+                indexed=indexed,
+                tracTicketToAttachmentsMap=tracTicketToAttachmentsMap,
+                commitIndex=commitIndex,
+                pretend=not options.really)
+            exitCode = 0
+    except (EnvironmentError, OSError, _ConfigError, _CsvDataError, _IssueImportError, _ValidationError,
+            _AttachmentError), error:
         _log.error(error)
     except KeyboardInterrupt:
         _log.warning(u"interrupted by user")
@@ -999,6 +3276,9 @@ def main(argv=None):
     finally:
         _log.info("total issues created: %d" % _totalIssues)
         _log.info("total content creations: %d" % _totalCreations)
+        peakMemorySize = _peakMemorySize()
+        if peakMemorySize is not None:
+            _log.info("peak memory used: %s" % _memorySizeText(peakMemorySize))
     return exitCode
 
 